@@ -4,15 +4,24 @@ import asyncio
 import sys
 from pathlib import Path
 
-from aiogram import Bot, Dispatcher, executor, types
+from aiogram import Dispatcher, executor, types
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
 from aiogram.types import BotCommand
 from aiogram.dispatcher import FSMContext
 
-from config import BOT_TOKEN, DATABASE_PATH
+from config import BOT_TOKEN, DATABASE_PATH, METRICS_HOST, METRICS_PORT, SHUTDOWN_TIMEOUT, ATTENDANCE_WARMUP
 from database.db import db
-from modules import registration, schedule, grades, notifications, attendance
+from modules import (
+    registration, schedule, grades, notifications, attendance, announcements, quiet_hours, delivery_stats
+)
 from modules.keyboards import BUTTON_COMMANDS
+from modules.throttling import ThrottlingMiddleware
+from modules.metrics import MetricsMiddleware, start_metrics_server
+from modules.outbox import outbox
+from modules.qr_decoder import qr_decoder
+from modules.checkin import checkin_pipeline
+from modules.outgoing import ScheduledBot
+from modules import shutdown, callbacks, reachability, attendance_sessions
 from localization.kz_text import MESSAGES
 
 # Настройка логирования
@@ -24,16 +33,32 @@ logger = logging.getLogger(__name__)
 
 # Создание экземпляров бота и диспетчера
 def setup_bot():
-    bot = Bot(token=BOT_TOKEN)
+    # Все исходящие запросы идут через планировщик с приоритетами
+    bot = ScheduledBot(token=BOT_TOKEN)
     storage = MemoryStorage()
     dp = Dispatcher(bot, storage=storage)
     
+    # Учет выполняемых обработчиков для корректной остановки
+    dp.middleware.setup(shutdown.DrainMiddleware())
+    # Защита от флуда (лимиты на пользователя и на обработчик)
+    dp.middleware.setup(ThrottlingMiddleware())
+    # Время работы, ошибки и количество выполняемых обработчиков
+    dp.middleware.setup(MetricsMiddleware())
+    # Снятие отметки о недоступности, когда пользователь снова пишет боту
+    dp.middleware.setup(reachability.ReachabilityMiddleware())
+    
     # Регистрация обработчиков из модулей
     registration.register_handlers(dp)
     schedule.register_handlers(dp)
     grades.register_handlers(dp)
     notifications.register_handlers(dp)
     attendance.register_handlers(dp)
+    announcements.register_handlers(dp)
+    quiet_hours.register_handlers(dp)
+    delivery_stats.register_handlers(dp)
+    
+    # Единый обработчик callback-запросов по таблице типов
+    callbacks.setup(dp)
     
     # Обработчики для кнопок меню
     @dp.message_handler(lambda message: message.text == "📊 Сабақ кестесі", state="*")
@@ -138,9 +163,12 @@ async def set_commands(bot):
         BotCommand(command="/schedule", description="Сабақ кестесі"),
         BotCommand(command="/grades", description="Менің бағаларым"),
         BotCommand(command="/notifications", description="Хабарламалар"),
+        BotCommand(command="/quiet_hours", description="Тыныш сағаттар (хабарламалар кейін жеткізіледі)"),
         BotCommand(command="/requests", description="Тіркеуге өтініштер (оқытушылар үшін)"),
         BotCommand(command="/manage_groups", description="Топтарды басқару (оқытушылар үшін)"),
         BotCommand(command="/qr", description="Қатысуды белгілеу үшін QR-код жасау (оқытушылар үшін)"),
+        BotCommand(command="/announce", description="Хабарландыру жіберу (оқытушылар үшін)"),
+        BotCommand(command="/delivery_stats", description="Таратулар статистикасы (оқытушылар үшін)"),
         BotCommand(command="/delete_profile", description="Профильді өшіру (студенттер үшін)")
     ]
     await bot.set_my_commands(commands)
@@ -161,8 +189,46 @@ async def on_startup(dispatcher):
     # Установка команд бота
     bot = dispatcher.bot
     await set_commands(bot)
+    
+    # Недоступные получатели и их периодическая проверка
+    await reachability.load()
+    shutdown.spawn(reachability.run_probes(bot), "reachability_probe")
+    
+    # Активные сессии посещаемости (QR-коды, которые еще действуют)
+    await attendance_sessions.load()
+    
+    # Тихие часы пользователей и отложенные до их окончания сообщения
+    await quiet_hours.load()
+    
+    # Фоновая доставка уведомлений из очереди
+    await outbox.start(bot)
+    
+    # Конвейер отметки посещаемости
+    checkin_pipeline.start()
+    
+    # Эндпоинт для сбора метрик
+    if METRICS_PORT:
+        await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    
+    # Фоновая загрузка библиотек для QR-кодов и запуск процессов распознавания,
+    # чтобы первая отметка не ждала импорта
+    if ATTENDANCE_WARMUP:
+        loop = asyncio.get_running_loop()
+        shutdown.spawn(loop.run_in_executor(None, attendance.warm_up), "attendance_warm_up")
+        shutdown.spawn(qr_decoder.start(), "qr_decoder_start")
+    
+    # Корректная остановка по SIGTERM
+    shutdown.install_signal_handlers()
+    
     logger.info("Бот сәтті іске қосылды")
 
+# Функция остановки бота
+async def on_shutdown(dispatcher):
+    # Дожидаемся обработчиков и очередей отправки, сбрасываем буферы
+    await shutdown.drain(dispatcher, SHUTDOWN_TIMEOUT)
+    # Процессы распознавания QR-кодов больше не нужны
+    qr_decoder.close()
+
 # Точка входа
 if __name__ == '__main__':
     # Проверяем аргументы командной строки
@@ -172,7 +238,27 @@ if __name__ == '__main__':
         from modules.fake_data import run_fake_data_generation
         asyncio.run(run_fake_data_generation())
         logger.info("Тестілік деректерді генерациялау командасы аяқталды")
+    elif len(sys.argv) > 1 and sys.argv[1] == "--startup-profile":
+        # Разбивка времени холодного старта; ненулевой код выхода при превышении бюджета
+        from modules.startup_profile import run_startup_profile
+        sys.exit(run_startup_profile())
+    elif len(sys.argv) > 1 and sys.argv[1] == "--qr-benchmark":
+        # Пропускная способность и p99 отметки при одновременной отправке фото
+        from modules.qr_benchmark import run_qr_benchmark
+        sys.exit(run_qr_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 100))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--qr-corpus-benchmark":
+        # Доля распознанных снимков и объем скачивания при прогрессивном выборе размера фото
+        from modules.qr_benchmark import run_qr_corpus_benchmark
+        sys.exit(run_qr_corpus_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 200))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--checkin-benchmark":
+        # Замер отметки посещаемости при одновременных отметках: python bot.py --checkin-benchmark [отметок]
+        from modules.checkin_benchmark import run_checkin_benchmark
+        sys.exit(run_checkin_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 500))
+    elif len(sys.argv) > 1 and sys.argv[1] == "--qr-payload-benchmark":
+        # Версия QR-кода и время распознавания: прежний JSON против подписанного токена
+        from modules.qr_benchmark import run_qr_payload_benchmark
+        sys.exit(run_qr_payload_benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 50))
     else:
         # Запускаем бота
         bot, dp = setup_bot()
-        executor.start_polling(dp, on_startup=on_startup, skip_updates=True)
+        executor.start_polling(dp, on_startup=on_startup, on_shutdown=on_shutdown, skip_updates=True)
@@ -10,9 +10,107 @@ BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_CODE = os.getenv("ADMIN_CODE", "admin123")
 TEACHER_CODE = os.getenv("TEACHER_CODE", "teacher123")
 DATABASE_PATH = os.getenv("DATABASE_PATH", "database/school.db")
+# Telegram ID администраторов через запятую (могут делать объявления для всех пользователей)
+ADMIN_IDS = {int(admin_id) for admin_id in os.getenv("ADMIN_IDS", "").split(",") if admin_id.strip()}
 
 # Импорт локализации
 from localization.kz_text import ROLES, STATUSES, WEEKDAYS, SUBJECTS
 
 # Настройки модуля посещаемости
 QR_CODE_VALIDITY_MINUTES = 10
+# Ключ подписи токенов в QR-кодах (если не задан, генерируется при каждом запуске)
+ATTENDANCE_SECRET = os.getenv("ATTENDANCE_SECRET", "")
+# Через сколько секунд после истечения QR-кода сессия закрывается и записываются
+# отсутствующие: отметки, проверенные до истечения, успевают дойти до БД
+ATTENDANCE_CLOSE_DELAY = int(os.getenv("ATTENDANCE_CLOSE_DELAY", "60"))
+# Живой QR-код: каждые QR_ROTATION_SECONDS секунд показывается новый код (0 - один код на всю сессию),
+# код действует до конца своего окна плюс QR_ROTATION_GRACE секунд на отправку фото
+QR_ROTATION_SECONDS = int(os.getenv("QR_ROTATION_SECONDS", "20"))
+QR_ROTATION_GRACE = int(os.getenv("QR_ROTATION_GRACE", "15"))
+# Счетчик "отметились X / Y" в подписи QR-кода обновляется не чаще раза в LIVE_COUNTER_INTERVAL секунд
+LIVE_COUNTER_INTERVAL = float(os.getenv("LIVE_COUNTER_INTERVAL", "3"))
+
+# Настройки защиты от флуда
+THROTTLE_USER_RATE = float(os.getenv("THROTTLE_USER_RATE", "3"))          # обновлений в секунду на пользователя
+THROTTLE_USER_BURST = int(os.getenv("THROTTLE_USER_BURST", "10"))
+THROTTLE_HANDLER_RATE = float(os.getenv("THROTTLE_HANDLER_RATE", "1"))    # вызовов обработчика в секунду по умолчанию
+THROTTLE_HANDLER_BURST = int(os.getenv("THROTTLE_HANDLER_BURST", "5"))
+THROTTLE_NOTICE_INTERVAL = float(os.getenv("THROTTLE_NOTICE_INTERVAL", "10"))  # не чаще одного предупреждения за интервал
+THROTTLE_MAX_TRACKED_USERS = int(os.getenv("THROTTLE_MAX_TRACKED_USERS", "10000"))
+
+# Метрики обработчиков (0 - HTTP-эндпоинт /metrics отключен)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Сколько секунд ждать завершения обработчиков и очередей при остановке
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "8"))
+
+# Загружать библиотеки для QR-кодов в фоне сразу после запуска
+ATTENDANCE_WARMUP = os.getenv("ATTENDANCE_WARMUP", "1") == "1"
+
+# Распознавание QR-кодов в пуле процессов: число процессов, таймаут одного фото (в секундах)
+# и сколько фото может ждать в очереди, прежде чем новые начнут отклоняться
+QR_DECODE_WORKERS = int(os.getenv("QR_DECODE_WORKERS", "2"))
+QR_DECODE_TIMEOUT = float(os.getenv("QR_DECODE_TIMEOUT", "10"))
+QR_DECODE_MAX_PENDING = int(os.getenv("QR_DECODE_MAX_PENDING", "100"))
+# Прогрессивное распознавание: сначала скачивается копия фото со стороной не меньше
+# QR_DECODE_MIN_SIDE, полный размер - только если код не найден; перед распознаванием
+# фото уменьшается до QR_DECODE_MAX_SIDE
+QR_DECODE_MIN_SIDE = int(os.getenv("QR_DECODE_MIN_SIDE", "640"))
+QR_DECODE_MAX_SIDE = int(os.getenv("QR_DECODE_MAX_SIDE", "1280"))
+# Сколько результатов распознавания хранить по file_unique_id для повторно отправленных фото
+QR_DECODE_CACHE_SIZE = int(os.getenv("QR_DECODE_CACHE_SIZE", "2000"))
+
+# Конвейер отметки посещаемости (см. modules/checkin.py): число отметок в работе, после которого
+# новые отклоняются, и после которого студент сразу получает "принято"; размер очередей между этапами
+CHECKIN_MAX_PENDING = int(os.getenv("CHECKIN_MAX_PENDING", "1000"))
+CHECKIN_ACK_THRESHOLD = int(os.getenv("CHECKIN_ACK_THRESHOLD", "30"))
+CHECKIN_STAGE_QUEUE_SIZE = int(os.getenv("CHECKIN_STAGE_QUEUE_SIZE", "50"))
+CHECKIN_DOWNLOAD_WORKERS = int(os.getenv("CHECKIN_DOWNLOAD_WORKERS", "8"))
+CHECKIN_VALIDATE_WORKERS = int(os.getenv("CHECKIN_VALIDATE_WORKERS", "4"))
+CHECKIN_REPLY_WORKERS = int(os.getenv("CHECKIN_REPLY_WORKERS", "8"))
+CHECKIN_COMMIT_BATCH_SIZE = int(os.getenv("CHECKIN_COMMIT_BATCH_SIZE", "50"))
+
+# Бюджет времени холодного старта (импорт + инициализация) для --startup-profile
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS", "3"))
+
+# Общий лимит исходящих запросов к Telegram (~30 сообщений в секунду) и веса очередей:
+# при нагрузке ответы пользователям получают в 4 раза больше запросов, чем рассылки
+OUTGOING_RATE = float(os.getenv("OUTGOING_RATE", "25"))
+OUTGOING_LANE_WEIGHTS = {"interactive": 4, "bulk": 1}
+
+# Настройки рассылок (лимит Telegram ~1 сообщение в секунду в один чат)
+BROADCAST_PER_CHAT_RATE = float(os.getenv("BROADCAST_PER_CHAT_RATE", "1"))
+BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", "10"))
+BROADCAST_MAX_RETRIES = int(os.getenv("BROADCAST_MAX_RETRIES", "3"))
+
+# Настройки фоновой доставки уведомлений (outbox)
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "8"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+
+# Объединение уведомлений в дайджесты: уведомления этих типов, пришедшие
+# одному пользователю за окно, отправляются одним сообщением (0 - выключено)
+NOTIFICATION_COALESCE_SECONDS = float(os.getenv("NOTIFICATION_COALESCE_SECONDS", "30"))
+NOTIFICATION_COALESCE_TYPES = ("schedule", "grade")
+
+# Проверка недоступных получателей: как часто и с какой скоростью (запросов в секунду)
+# бот проверяет, не разблокировали ли его пользователи
+REACHABILITY_PROBE_INTERVAL = int(os.getenv("REACHABILITY_PROBE_INTERVAL", str(6 * 60 * 60)))
+REACHABILITY_PROBE_RATE = float(os.getenv("REACHABILITY_PROBE_RATE", "5"))
+
+# Входящие уведомления: сколько уведомлений на странице и максимальная длина одного
+INBOX_PAGE_SIZE = int(os.getenv("INBOX_PAGE_SIZE", "5"))
+INBOX_ITEM_MAX_LENGTH = 600
+
+# Объявления: как часто (в секундах) обновляется сообщение с ходом рассылки
+ANNOUNCEMENT_PROGRESS_INTERVAL = float(os.getenv("ANNOUNCEMENT_PROGRESS_INTERVAL", "3"))
+
+# Сколько последних ключей идемпотентности уведомлений помнить в памяти
+NOTIFICATION_DEDUP_CACHE_SIZE = int(os.getenv("NOTIFICATION_DEDUP_CACHE_SIZE", "10000"))
+
+# Тихие часы: отложенные сообщения переводятся в очередь отправки пачками
+# не больше QUIET_RELEASE_BATCH_SIZE раз в QUIET_RELEASE_INTERVAL секунд
+QUIET_RELEASE_BATCH_SIZE = int(os.getenv("QUIET_RELEASE_BATCH_SIZE", "100"))
+QUIET_RELEASE_INTERVAL = float(os.getenv("QUIET_RELEASE_INTERVAL", "5"))
@@ -1,9 +1,46 @@
 import os
 import aiosqlite
 import asyncio
+from datetime import datetime
 from pathlib import Path
 from config import DATABASE_PATH
 
+# Столбцы, добавленные после первой версии схемы: (таблица, столбец, определение).
+# В существующие базы они добавляются при init() до выполнения schema.sql,
+# потому что индексы в схеме могут ссылаться на них
+COLUMN_MIGRATIONS = [
+    ("notifications", "notification_type", "TEXT DEFAULT 'general'"),
+    ("notifications", "dedup_key", "TEXT"),
+    ("notifications", "merged_into", "INTEGER"),
+    ("users", "reachable", "BOOLEAN DEFAULT TRUE"),
+    ("users", "unreachable_reason", "TEXT"),
+    ("users", "unreachable_at", "TIMESTAMP"),
+    ("users", "quiet_start", "INTEGER"),
+    ("users", "quiet_end", "INTEGER"),
+    ("notification_outbox", "job_id", "INTEGER"),
+    ("attendance", "session_id", "INTEGER"),
+    ("attendance_sessions", "closed_at", "INTEGER"),
+    ("attendance_sessions", "present_count", "INTEGER"),
+    ("attendance_sessions", "absent_count", "INTEGER"),
+]
+
+async def add_missing_columns(db):
+    """
+    Добавляет недостающие столбцы из COLUMN_MIGRATIONS в существующие таблицы
+    Returns:
+        list: Добавленные столбцы в виде "таблица.столбец"
+    """
+    added = []
+    for table, column, definition in COLUMN_MIGRATIONS:
+        async with db.execute(f"PRAGMA table_info({table})") as cursor:
+            column_names = [row[1] for row in await cursor.fetchall()]
+        # Таблицы еще нет - ее целиком создаст schema.sql
+        if column_names and column not in column_names:
+            await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+            added.append(f"{table}.{column}")
+    await db.commit()
+    return added
+
 class Database:
     def __init__(self, db_path=DATABASE_PATH):
         self.db_path = db_path
@@ -19,6 +56,7 @@ class Database:
             
         # Подключение к БД и создание таблиц
         async with aiosqlite.connect(self.db_path) as db:
+            await add_missing_columns(db)
             await db.executescript(schema)
             await db.commit()
             
@@ -50,6 +88,54 @@ class Database:
             )
             await db.commit()
             
+    async def set_user_reachable(self, telegram_id, reachable, reason=None):
+        """
+        Сохраняет, может ли бот писать пользователю
+        Args:
+            telegram_id (int): ID пользователя
+            reachable (bool): Доступен ли пользователь
+            reason (str): Класс ошибки Telegram, если недоступен
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            if reachable:
+                await db.execute(
+                    "UPDATE users SET reachable = TRUE, unreachable_reason = NULL, unreachable_at = NULL "
+                    "WHERE telegram_id = ?",
+                    (telegram_id,)
+                )
+            else:
+                await db.execute(
+                    "UPDATE users SET reachable = FALSE, unreachable_reason = ?, unreachable_at = CURRENT_TIMESTAMP "
+                    "WHERE telegram_id = ?",
+                    (reason, telegram_id)
+                )
+            await db.commit()
+
+    async def get_unreachable_users(self):
+        """Список (telegram_id, unreachable_reason) пользователей, которым бот не может писать"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT telegram_id, unreachable_reason FROM users WHERE reachable = FALSE"
+            ) as cursor:
+                return await cursor.fetchall()
+
+    async def set_quiet_hours(self, telegram_id, quiet_start, quiet_end):
+        """Сохраняет тихие часы пользователя (None, None - отключить)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.execute(
+                "UPDATE users SET quiet_start = ?, quiet_end = ?, updated_at = CURRENT_TIMESTAMP WHERE telegram_id = ?",
+                (quiet_start, quiet_end, telegram_id)
+            )
+            await db.commit()
+
+    async def get_quiet_hours(self):
+        """Тройки (telegram_id, начало, конец) для всех пользователей с тихими часами"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT telegram_id, quiet_start, quiet_end FROM users WHERE quiet_start IS NOT NULL"
+            ) as cursor:
+                return await cursor.fetchall()
+
     async def delete_user(self, telegram_id):
         """Удаление пользователя из базы данных"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -104,6 +190,31 @@ class Database:
             ) as cursor:
                 return await cursor.fetchall()
                 
+    async def get_announcement_recipients(self, teacher_telegram_id=None, exclude_id=None):
+        """
+        Получатели объявления одним запросом
+        Args:
+            teacher_telegram_id (int): Студенты всех групп этого преподавателя;
+                                       None - все подтвержденные пользователи
+            exclude_id (int): Кого не включать (автора объявления)
+        Returns:
+            list: Telegram ID получателей
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            if teacher_telegram_id:
+                query = """
+                SELECT u.telegram_id FROM users u
+                JOIN groups g ON g.group_code = u.group_code
+                WHERE g.teacher_telegram_id = ? AND u.role = 'student' AND u.status = 'approved'
+                """
+                params = [teacher_telegram_id]
+            else:
+                query = "SELECT telegram_id FROM users WHERE status = 'approved'"
+                params = []
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+        return [row[0] for row in rows if row[0] != exclude_id]
+
     # Методы для работы с расписанием
     async def add_schedule_item(self, group_code, weekday, time, subject):
         """Добавление элемента расписания"""
@@ -125,7 +236,11 @@ class Database:
             return schedule_id
             
     async def update_schedule_item(self, id, weekday, time, subject):
-        """Обновление элемента расписания"""
+        """
+        Обновление элемента расписания
+        Returns:
+            int: ID записи в истории изменений (schedule_changes) или None, если урока нет
+        """
         async with aiosqlite.connect(self.db_path) as db:
             # Получаем информацию о текущем элементе расписания для log
             db.row_factory = aiosqlite.Row
@@ -133,7 +248,7 @@ class Database:
                 schedule_item = await cursor.fetchone()
                 
             if not schedule_item:
-                return False
+                return None
                 
             # Обновляем элемент расписания
             await db.execute(
@@ -142,13 +257,13 @@ class Database:
             )
             
             # Добавляем запись в историю изменений
-            await db.execute(
+            cursor = await db.execute(
                 "INSERT INTO schedule_changes (schedule_id, group_code, change_type, weekday, time, subject) VALUES (?, ?, ?, ?, ?, ?)",
                 (id, schedule_item["group_code"], "update", weekday, time, subject)
             )
             
             await db.commit()
-            return True
+            return cursor.lastrowid
             
     async def delete_schedule_item(self, id):
         """Удаление элемента расписания"""
@@ -197,13 +312,14 @@ class Database:
                 
     # Методы для работы с оценками
     async def add_grade(self, student_id, subject, date, grade, comment=None):
-        """Добавление оценки"""
+        """Добавление оценки. Возвращает ID оценки"""
         async with aiosqlite.connect(self.db_path) as db:
-            await db.execute(
+            cursor = await db.execute(
                 "INSERT INTO grades (student_id, subject, date, grade, comment) VALUES (?, ?, ?, ?, ?)",
                 (student_id, subject, date, grade, comment)
             )
             await db.commit()
+            return cursor.lastrowid
             
     async def get_student_grades(self, student_id):
         """Получение всех оценок студента"""
@@ -265,6 +381,15 @@ class Database:
             )
             await db.commit()
             
+    async def add_notifications(self, user_ids, message, notification_type="general"):
+        """Добавление одного уведомления нескольким пользователям одним запросом"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                "INSERT INTO notifications (user_id, message, notification_type) VALUES (?, ?, ?)",
+                [(user_id, message, notification_type) for user_id in user_ids]
+            )
+            await db.commit()
+            
     async def mark_notification_as_read(self, notification_id):
         """Отметка уведомления как прочитанного"""
         async with aiosqlite.connect(self.db_path) as db:
@@ -293,16 +418,529 @@ class Database:
                 (user_id, notification_type)
             ) as cursor:
                 return await cursor.fetchall()
-    
+
+    async def count_unread_notifications(self, user_id):
+        """Количество непрочитанных уведомлений (покрывается индексом idx_notifications_inbox)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT COUNT(*) FROM notifications WHERE user_id = ? AND is_read = FALSE",
+                (user_id,)
+            ) as cursor:
+                return (await cursor.fetchone())[0]
+
+    async def get_unread_notifications_page(self, user_id, limit, anchor_id=None, newer=False):
+        """
+        Страница непрочитанных уведомлений, от новых к старым.
+        Пагинация по ключу (created_at, id) без OFFSET
+        Args:
+            user_id (int): ID пользователя
+            limit (int): Размер страницы
+            anchor_id (int): Уведомление, от которого листаем (None - первая страница)
+            newer (bool): True - страница перед anchor_id (новее), False - после него (старше)
+        Returns:
+            tuple: (список уведомлений, есть ли еще уведомления в этом направлении)
+        """
+        query = "SELECT * FROM notifications WHERE user_id = ? AND is_read = FALSE"
+        params = [user_id]
+        if anchor_id is not None:
+            sign = ">" if newer else "<"
+            query += f" AND (created_at, id) {sign} (SELECT created_at, id FROM notifications WHERE id = ?)"
+            params.append(anchor_id)
+        order = "ASC" if newer else "DESC"
+        query += f" ORDER BY created_at {order}, id {order} LIMIT ?"
+        params.append(limit + 1)
+
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(query, params) as cursor:
+                rows = await cursor.fetchall()
+
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if newer:
+            rows.reverse()
+        return rows, has_more
+
+    async def mark_notifications_range_as_read(self, user_id, first_id, last_id):
+        """
+        Отмечает прочитанными уведомления страницы одним запросом:
+        все непрочитанные от last_id (самого старого) до first_id (самого нового)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "UPDATE notifications SET is_read = TRUE "
+                "WHERE user_id = ? AND is_read = FALSE "
+                "AND (created_at, id) >= (SELECT created_at, id FROM notifications WHERE id = ?) "
+                "AND (created_at, id) <= (SELECT created_at, id FROM notifications WHERE id = ?)",
+                (user_id, last_id, first_id)
+            )
+            await db.commit()
+            return cursor.rowcount
+
+    async def mark_all_notifications_as_read(self, user_id):
+        """Отмечает прочитанными все уведомления пользователя"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "UPDATE notifications SET is_read = TRUE WHERE user_id = ? AND is_read = FALSE",
+                (user_id,)
+            )
+            await db.commit()
+            return cursor.rowcount
+
+    # Методы для работы с очередью отправки (outbox)
+    async def enqueue_notifications(self, user_ids, message, notification_type, text, dedup_key=None,
+                                    deliver_at=None, group_code=None, coalesce_window=None):
+        """
+        Сохраняет уведомления и ставит их в очередь отправки в одной транзакции
+        Args:
+            user_ids (list): Получатели
+            message (str): Текст уведомления для таблицы notifications
+            notification_type (str): Тип уведомления
+            text (str): Готовый текст сообщения для отправки
+            dedup_key (str): Ключ идемпотентности события-источника. Повторное уведомление
+                             с тем же ключом тому же пользователю отбрасывается уникальным индексом
+            deliver_at (dict): user_id -> время UTC ('YYYY-MM-DD HH:MM:SS'), раньше которого
+                               сообщение отправлять нельзя (тихие часы); такие строки получают состояние 'deferred'
+            group_code (str): Группа; для рассылки по группе заводится запись в delivery_jobs
+            coalesce_window (float): Если задано, строки получают состояние 'coalescing' и ждут
+                                     coalesce_window секунд слияния в дайджест (см. merge_coalesced_outbox);
+                                     deliver_at в этом случае не используется
+        Returns:
+            list: Пары (ID в очереди, user_id) для добавленных сообщений
+        """
+        deliver_at = deliver_at or {}
+        async with aiosqlite.connect(self.db_path) as db:
+            job_id = None
+            if group_code is not None:
+                cursor = await db.execute(
+                    "INSERT INTO delivery_jobs (kind, group_code) VALUES (?, ?)",
+                    (notification_type, group_code)
+                )
+                job_id = cursor.lastrowid
+
+            queued = []
+            for user_id in user_ids:
+                cursor = await db.execute(
+                    "INSERT OR IGNORE INTO notifications (user_id, message, notification_type, dedup_key) "
+                    "VALUES (?, ?, ?, ?)",
+                    (user_id, message, notification_type, dedup_key)
+                )
+                if not cursor.rowcount:
+                    continue
+                notification_id = cursor.lastrowid
+                if coalesce_window is not None:
+                    cursor = await db.execute(
+                        "INSERT INTO notification_outbox (notification_id, user_id, message, job_id, state, next_attempt_at) "
+                        "VALUES (?, ?, ?, ?, 'coalescing', datetime('now', '+' || ? || ' seconds'))",
+                        (notification_id, user_id, text, job_id, coalesce_window)
+                    )
+                elif user_id in deliver_at:
+                    cursor = await db.execute(
+                        "INSERT INTO notification_outbox (notification_id, user_id, message, job_id, state, next_attempt_at) "
+                        "VALUES (?, ?, ?, ?, 'deferred', ?)",
+                        (notification_id, user_id, text, job_id, deliver_at[user_id])
+                    )
+                else:
+                    cursor = await db.execute(
+                        "INSERT INTO notification_outbox (notification_id, user_id, message, job_id) VALUES (?, ?, ?, ?)",
+                        (notification_id, user_id, text, job_id)
+                    )
+                queued.append((cursor.lastrowid, user_id))
+
+            if job_id is not None:
+                if queued:
+                    await db.execute("UPDATE delivery_jobs SET total = ? WHERE id = ?", (len(queued), job_id))
+                else:
+                    # Все уведомления оказались повторами - рассылки не было
+                    await db.execute("DELETE FROM delivery_jobs WHERE id = ?", (job_id,))
+            await db.commit()
+            return queued
+
+    async def claim_outbox_batch(self, limit):
+        """
+        Забирает из очереди пачку сообщений, которые пора отправлять,
+        и переводит их в состояние 'sending'
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                "SELECT id, user_id, message, attempts, job_id FROM notification_outbox "
+                "WHERE state = 'queued' AND next_attempt_at <= CURRENT_TIMESTAMP "
+                "ORDER BY id LIMIT ?",
+                (limit,)
+            ) as cursor:
+                rows = await cursor.fetchall()
+            if rows:
+                await db.executemany(
+                    "UPDATE notification_outbox SET state = 'sending', attempts = attempts + 1, "
+                    "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    [(row["id"],) for row in rows]
+                )
+                await db.commit()
+            return rows
+
+    async def complete_outbox(self, results, receipts=None):
+        """
+        Записывает результаты отправки одним запросом
+        Args:
+            results (list): Кортежи (id, state, last_error, retry_delay_seconds).
+                            Если retry_delay_seconds не None, сообщение возвращается в очередь
+            receipts (list): Квитанции для статистики рассылок, см. record_deliveries
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                "UPDATE notification_outbox SET state = ?, last_error = ?, "
+                "next_attempt_at = datetime('now', '+' || ? || ' seconds'), "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                [
+                    ("queued" if delay is not None else state, error, int(delay or 0), outbox_id)
+                    for outbox_id, state, error, delay in results
+                ]
+            )
+            if receipts:
+                await self._record_deliveries(db, receipts)
+            await db.commit()
+
+    async def requeue_outbox(self, outbox_ids=None):
+        """
+        Возвращает в очередь сообщения в состоянии 'sending'.
+        Без аргументов - все такие сообщения (после падения процесса)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            if outbox_ids is None:
+                cursor = await db.execute(
+                    "UPDATE notification_outbox SET state = 'queued', updated_at = CURRENT_TIMESTAMP "
+                    "WHERE state = 'sending'"
+                )
+            else:
+                cursor = await db.executemany(
+                    "UPDATE notification_outbox SET state = 'queued', updated_at = CURRENT_TIMESTAMP "
+                    "WHERE id = ? AND state = 'sending'",
+                    [(outbox_id,) for outbox_id in outbox_ids]
+                )
+            await db.commit()
+            return cursor.rowcount
+
+    async def get_coalescing_outbox(self):
+        """
+        Строки очереди, ждущие слияния в дайджест, с текстом и типом их уведомлений.
+        remaining - сколько секунд осталось до конца окна строки (0 и меньше - окно закончилось)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                "SELECT o.id, o.user_id, o.job_id, o.notification_id, n.message, n.notification_type, "
+                "(julianday(o.next_attempt_at) - julianday('now')) * 86400 AS remaining "
+                "FROM notification_outbox o JOIN notifications n ON n.id = o.notification_id "
+                "WHERE o.state = 'coalescing' ORDER BY o.id"
+            ) as cursor:
+                return await cursor.fetchall()
+
+    async def merge_coalesced_outbox(self, merges):
+        """
+        Сливает строки 'coalescing' в дайджесты и ставит их в очередь в одной транзакции
+        Args:
+            merges (list): Кортежи (ID строки-дайджеста, ID ее уведомления, текст дайджеста для входящих,
+                           текст сообщения, время UTC окончания тихих часов или None,
+                           список (ID, job_id, ID уведомления) поглощенных строк). Если текст None,
+                           поглощенных строк нет и тексты не меняются.
+                           Поглощенные строки очереди удаляются, а их рассылки теряют по одному получателю.
+                           Уведомление дайджеста получает его текст, а поглощенные уведомления помечаются
+                           merged_into и скрываются из входящих; строки остаются, чтобы их ключи
+                           идемпотентности продолжали отбрасывать повторы событий
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            jobs = set()
+            for outbox_id, notification_id, message, text, deliver_at, absorbed in merges:
+                cursor = await db.execute(
+                    "UPDATE notification_outbox SET message = COALESCE(?, message), state = ?, "
+                    "next_attempt_at = COALESCE(?, CURRENT_TIMESTAMP), updated_at = CURRENT_TIMESTAMP "
+                    "WHERE id = ? AND state = 'coalescing'",
+                    (text, "deferred" if deliver_at else "queued", deliver_at, outbox_id)
+                )
+                if not cursor.rowcount:
+                    continue
+                if message is not None:
+                    await db.execute("UPDATE notifications SET message = ? WHERE id = ?", (message, notification_id))
+                for absorbed_id, job_id, absorbed_notification_id in absorbed:
+                    cursor = await db.execute(
+                        "DELETE FROM notification_outbox WHERE id = ? AND state = 'coalescing'", (absorbed_id,)
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    await db.execute(
+                        "UPDATE notifications SET merged_into = ?, is_read = TRUE WHERE id = ?",
+                        (notification_id, absorbed_notification_id)
+                    )
+                    if job_id is not None:
+                        await db.execute("UPDATE delivery_jobs SET total = total - 1 WHERE id = ?", (job_id,))
+                        jobs.add(job_id)
+            # Рассылки, все сообщения которых вошли в чужие дайджесты
+            await db.executemany(
+                "DELETE FROM delivery_jobs WHERE id = ? AND total <= 0", [(job_id,) for job_id in jobs]
+            )
+            await db.commit()
+
+    async def get_deferred_outbox(self):
+        """Отложенные сообщения: пары (ID в очереди, время UTC, когда их можно отправить)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT id, next_attempt_at FROM notification_outbox WHERE state = 'deferred'"
+            ) as cursor:
+                return await cursor.fetchall()
+
+    async def release_deferred_outbox(self, outbox_ids):
+        """Переводит отложенные сообщения в обычную очередь отправки"""
+        async with aiosqlite.connect(self.db_path) as db:
+            await db.executemany(
+                "UPDATE notification_outbox SET state = 'queued', next_attempt_at = CURRENT_TIMESTAMP, "
+                "updated_at = CURRENT_TIMESTAMP WHERE id = ? AND state = 'deferred'",
+                [(outbox_id,) for outbox_id in outbox_ids]
+            )
+            await db.commit()
+
+    # Методы для статистики рассылок
+    async def create_delivery_job(self, kind, total, group_code=None, author_id=None):
+        """Заводит рассылку и возвращает ее ID"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "INSERT INTO delivery_jobs (kind, group_code, author_id, total) VALUES (?, ?, ?, ?)",
+                (kind, group_code, author_id, total)
+            )
+            await db.commit()
+            return cursor.lastrowid
+
+    async def _record_deliveries(self, db, receipts):
+        """
+        Добавляет квитанции и сразу обновляет счетчики их рассылок.
+        Повторная квитанция для того же получателя игнорируется и в счетчики не попадает
+        """
+        # job_id -> [sent, blocked, failed, skipped, сумма задержек, максимум задержки]
+        totals = {}
+        for job_id, user_id, outcome, latency_ms in receipts:
+            cursor = await db.execute(
+                "INSERT OR IGNORE INTO delivery_receipts (job_id, user_id, outcome, latency_ms) VALUES (?, ?, ?, ?)",
+                (job_id, user_id, outcome, latency_ms)
+            )
+            if not cursor.rowcount:
+                continue
+            job = totals.setdefault(job_id, [0, 0, 0, 0, 0, 0])
+            job[outcome] += 1
+            if outcome == 0:
+                job[4] += latency_ms
+                job[5] = max(job[5], latency_ms)
+
+        await db.executemany(
+            "UPDATE delivery_jobs SET sent = sent + ?, blocked = blocked + ?, failed = failed + ?, "
+            "skipped = skipped + ?, latency_ms_total = latency_ms_total + ?, "
+            "latency_ms_max = MAX(latency_ms_max, ?), last_delivery_at = strftime('%Y-%m-%d %H:%M:%f', 'now') "
+            "WHERE id = ?",
+            [(*job, job_id) for job_id, job in totals.items()]
+        )
+
+    async def record_deliveries(self, receipts):
+        """
+        Записывает квитанции о доставке
+        Args:
+            receipts (list): Кортежи (job_id, user_id, код результата, задержка в мс)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            await self._record_deliveries(db, receipts)
+            await db.commit()
+
+    async def get_delivery_jobs(self, group_codes=None, author_id=None, limit=5):
+        """
+        Последние рассылки с их счетчиками
+        Args:
+            group_codes (list): Рассылки по этим группам
+            author_id (int): и объявления этого автора; если оба None - все рассылки
+        """
+        query = (
+            "SELECT *, (julianday(last_delivery_at) - julianday(created_at)) * 86400 AS duration "
+            "FROM delivery_jobs"
+        )
+        params = []
+        if group_codes is not None or author_id is not None:
+            group_codes = list(group_codes or [])
+            placeholders = ", ".join("?" * len(group_codes)) or "NULL"
+            query += f" WHERE group_code IN ({placeholders}) OR author_id = ?"
+            params = group_codes + [author_id]
+        query += " ORDER BY id DESC LIMIT ?"
+        params.append(limit)
+
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def get_delivery_stats_by_group(self, group_codes=None):
+        """Суммарная статистика рассылок по группам (из счетчиков delivery_jobs)"""
+        query = (
+            "SELECT group_code, COUNT(*) AS jobs, SUM(total) AS total, SUM(sent) AS sent, "
+            "SUM(blocked) AS blocked, SUM(failed) AS failed, SUM(skipped) AS skipped, "
+            "SUM(latency_ms_total) AS latency_ms_total, MAX(latency_ms_max) AS latency_ms_max "
+            "FROM delivery_jobs WHERE group_code IS NOT NULL"
+        )
+        params = []
+        if group_codes is not None:
+            group_codes = list(group_codes)
+            placeholders = ", ".join("?" * len(group_codes)) or "NULL"
+            query += f" AND group_code IN ({placeholders})"
+            params = group_codes
+        query += " GROUP BY group_code ORDER BY group_code"
+
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(query, params) as cursor:
+                return await cursor.fetchall()
+
+    async def get_outbox_stats(self):
+        """Количество сообщений в очереди по состояниям"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                "SELECT state, COUNT(*) FROM notification_outbox GROUP BY state"
+            ) as cursor:
+                return dict(await cursor.fetchall())
+
     # Методы для работы с посещаемостью
-    async def add_attendance_record(self, student_id, subject, qr_timestamp, submission_timestamp, status, group_id):
-        """Добавляет запись о посещаемости"""
+    async def add_attendance_record(self, student_id, subject, qr_timestamp, submission_timestamp, status, group_id,
+                                    session_id=None):
+        """
+        Добавляет запись о посещаемости
+        Returns:
+            bool: False, если студент уже отмечен в этой сессии (уникальный индекс idx_attendance_present)
+        """
+        async with aiosqlite.connect(self.db_path) as db:
+            try:
+                await db.execute(
+                    "INSERT INTO attendance (student_id, subject, qr_timestamp, submission_timestamp, status, group_id, session_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (student_id, subject, qr_timestamp, submission_timestamp, status, group_id, session_id)
+                )
+            except aiosqlite.IntegrityError:
+                return False
+            await db.commit()
+            return True
+    
+    async def add_attendance_records(self, records):
+        """
+        Записывает пачку отметок одной транзакцией.
+        Если отметка PRESENT отклонена уникальным индексом, вместо нее записывается ERROR_DUPLICATE
+        Args:
+            records (list): Кортежи (student_id, subject, qr_timestamp, submission_timestamp, status, group_id, session_id)
+        Returns:
+            list: Для каждой записи False, если студент уже отмечен в этой сессии
+        """
+        saved = []
+        async with aiosqlite.connect(self.db_path) as db:
+            for record in records:
+                try:
+                    await db.execute(
+                        "INSERT INTO attendance (student_id, subject, qr_timestamp, submission_timestamp, status, group_id, session_id) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        record
+                    )
+                    saved.append(True)
+                except aiosqlite.IntegrityError:
+                    await db.execute(
+                        "INSERT INTO attendance (student_id, subject, qr_timestamp, submission_timestamp, status, group_id, session_id) "
+                        "VALUES (?, ?, ?, ?, 'ERROR_DUPLICATE', ?, ?)",
+                        record[:4] + record[5:]
+                    )
+                    saved.append(False)
+            await db.commit()
+        return saved
+    
+    async def create_attendance_session(self, group_id, subject, teacher_id, created_at, expires_at):
+        """Создает сессию посещаемости и возвращает ее ID"""
+        async with aiosqlite.connect(self.db_path) as db:
+            cursor = await db.execute(
+                "INSERT INTO attendance_sessions (group_id, subject, teacher_id, created_at, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (group_id, subject, teacher_id, created_at, expires_at)
+            )
+            await db.commit()
+            return cursor.lastrowid
+    
+    async def get_active_attendance_sessions(self, now):
+        """Сессии посещаемости, срок которых еще не истек (now - Unix-время)"""
+        async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                "SELECT * FROM attendance_sessions WHERE expires_at > ?", (now,)
+            ) as cursor:
+                return await cursor.fetchall()
+    
+    async def get_unclosed_attendance_sessions(self, now):
+        """ID и срок действия истекших сессий, для которых еще не записаны отсутствующие"""
         async with aiosqlite.connect(self.db_path) as db:
+            db.row_factory = aiosqlite.Row
+            async with db.execute(
+                "SELECT id, expires_at FROM attendance_sessions WHERE closed_at IS NULL AND expires_at <= ?", (now,)
+            ) as cursor:
+                return await cursor.fetchall()
+    
+    async def close_attendance_session(self, session_id, closed_at):
+        """
+        Закрывает сессию одной транзакцией: подтвержденным студентам группы без отметки
+        PRESENT записывается ABSENT (разность множеств в одном запросе), итоги
+        сохраняются в сессии
+        Args:
+            session_id (int): ID сессии
+            closed_at (int): Время закрытия (Unix-время)
+        Returns:
+            tuple: (присутствовали, отсутствовали) или None, если сессия уже закрыта
+        """
+        closed_iso = datetime.fromtimestamp(closed_at).isoformat()
+        async with aiosqlite.connect(self.db_path) as db:
+            # Отметка о закрытии первой: повторный вызов ничего не запишет дважды
+            cursor = await db.execute(
+                "UPDATE attendance_sessions SET closed_at = ? WHERE id = ? AND closed_at IS NULL",
+                (closed_at, session_id)
+            )
+            if cursor.rowcount == 0:
+                await db.rollback()
+                return None
+            
+            cursor = await db.execute(
+                """
+                INSERT INTO attendance (student_id, subject, qr_timestamp, submission_timestamp, status, group_id, session_id)
+                SELECT absent.student_id, s.subject, s.created_at, ?, 'ABSENT', s.group_id, s.id
+                FROM attendance_sessions s, (
+                    SELECT u.telegram_id AS student_id FROM users u
+                    JOIN groups g ON g.group_code = u.group_code
+                    WHERE g.rowid = (SELECT group_id FROM attendance_sessions WHERE id = ?)
+                      AND u.role = 'student' AND u.status = 'approved'
+                    EXCEPT
+                    SELECT student_id FROM attendance WHERE session_id = ? AND status = 'PRESENT'
+                ) AS absent
+                WHERE s.id = ?
+                """,
+                (closed_iso, session_id, session_id, session_id)
+            )
+            absent = cursor.rowcount
+            async with db.execute(
+                "SELECT COUNT(*) FROM attendance WHERE session_id = ? AND status = 'PRESENT'", (session_id,)
+            ) as count_cursor:
+                present = (await count_cursor.fetchone())[0]
             await db.execute(
-                "INSERT INTO attendance (student_id, subject, qr_timestamp, submission_timestamp, status, group_id) VALUES (?, ?, ?, ?, ?, ?)",
-                (student_id, subject, qr_timestamp, submission_timestamp, status, group_id)
+                "UPDATE attendance_sessions SET present_count = ?, absent_count = ? WHERE id = ?",
+                (present, absent, session_id)
             )
             await db.commit()
+            return present, absent
+    
+    async def get_group_student_ids(self, group_id):
+        """Telegram ID подтвержденных студентов группы по ее ID"""
+        async with aiosqlite.connect(self.db_path) as db:
+            async with db.execute(
+                """
+                SELECT u.telegram_id FROM users u
+                JOIN groups g ON g.group_code = u.group_code
+                WHERE g.rowid = ? AND u.role = 'student' AND u.status = 'approved'
+                """,
+                (group_id,)
+            ) as cursor:
+                return [row[0] for row in await cursor.fetchall()]
     
     async def check_if_already_attended(self, student_id, subject, qr_timestamp):
         """Проверяет, есть ли уже отметка PRESENT для данного студента, предмета и сессии"""
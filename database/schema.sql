@@ -5,6 +5,11 @@ CREATE TABLE IF NOT EXISTS users (
     role TEXT NOT NULL,
     group_code TEXT,
     status TEXT DEFAULT 'pending',
+    reachable BOOLEAN DEFAULT TRUE,    -- FALSE, если бот не может писать пользователю
+    unreachable_reason TEXT,           -- Класс ошибки Telegram (BotBlocked, ChatNotFound...)
+    unreachable_at TIMESTAMP,
+    quiet_start INTEGER,               -- Начало тихих часов (час 0-23), NULL - не заданы
+    quiet_end INTEGER,                 -- Конец тихих часов (час 0-23)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -45,10 +50,18 @@ CREATE TABLE IF NOT EXISTS notifications (
     message TEXT NOT NULL,
     notification_type TEXT DEFAULT 'general',
     is_read BOOLEAN DEFAULT FALSE,
+    dedup_key TEXT,                    -- Ключ идемпотентности события-источника (grade:15, schedule:add:7)
+    merged_into INTEGER,               -- Дайджест, в который вошло уведомление (такие уведомления скрыты из входящих)
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(telegram_id)
 );
 
+-- Индекс для входящих: счетчик непрочитанных и постраничный вывод по (created_at, id)
+CREATE INDEX IF NOT EXISTS idx_notifications_inbox ON notifications (user_id, is_read, created_at, id);
+
+-- Одно уведомление на пользователя для каждого события-источника
+CREATE UNIQUE INDEX IF NOT EXISTS idx_notifications_dedup ON notifications (user_id, dedup_key) WHERE dedup_key IS NOT NULL;
+
 -- Таблица истории изменений расписания
 CREATE TABLE IF NOT EXISTS schedule_changes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -69,7 +82,75 @@ CREATE TABLE IF NOT EXISTS attendance (
     subject TEXT NOT NULL,             -- Название предмета
     qr_timestamp TEXT NOT NULL,        -- Время из QR-кода (метка сессии, ISO формат)
     submission_timestamp TEXT NOT NULL,-- Время фактической отметки студентом (ISO формат)
-    status TEXT NOT NULL,              -- Статус: 'PRESENT', 'ERROR_EXPIRED', 'ERROR_DUPLICATE', 'ERROR_GROUP_MISMATCH', 'ERROR_INVALID_QR'
+    status TEXT NOT NULL,              -- Статус: 'PRESENT', 'ABSENT', 'ERROR_EXPIRED', 'ERROR_DUPLICATE', 'ERROR_GROUP_MISMATCH', 'ERROR_INVALID_QR'
     group_id INTEGER,                  -- ID группы из QR-кода (для сверки и отчетности)
+    session_id INTEGER,                -- ID сессии посещаемости (QR-кода), NULL у старых записей
     FOREIGN KEY (student_id) REFERENCES users(telegram_id)
-);
\ No newline at end of file
+);
+-- Повторная отметка в той же сессии отклоняется самим INSERT
+CREATE UNIQUE INDEX IF NOT EXISTS idx_attendance_present
+    ON attendance(session_id, student_id) WHERE status = 'PRESENT' AND session_id IS NOT NULL;
+-- Сессии посещаемости: одна на каждый QR-код, созданный преподавателем
+CREATE TABLE IF NOT EXISTS attendance_sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    group_id INTEGER NOT NULL,         -- ID группы (rowid в таблице groups)
+    subject TEXT NOT NULL,             -- Название предмета
+    teacher_id INTEGER,                -- Telegram ID преподавателя
+    created_at TEXT NOT NULL,          -- Время создания (ISO формат), записывается в qr_timestamp отметок
+    expires_at INTEGER NOT NULL,       -- Срок действия QR-кода (Unix-время)
+    closed_at INTEGER,                 -- Когда записаны отсутствующие (Unix-время), NULL - сессия не закрыта
+    present_count INTEGER,             -- Итоги сессии, заполняются при закрытии
+    absent_count INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_attendance_sessions_expires ON attendance_sessions(expires_at);
+CREATE INDEX IF NOT EXISTS idx_attendance_sessions_open ON attendance_sessions(expires_at) WHERE closed_at IS NULL;
+-- Очередь исходящих уведомлений (outbox): обработчик только добавляет строку,
+-- а доставкой занимается фоновый воркер
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    notification_id INTEGER,           -- ID уведомления в таблице notifications
+    user_id INTEGER NOT NULL,          -- Получатель
+    message TEXT NOT NULL,             -- Готовый текст сообщения
+    state TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'coalescing', 'deferred', 'sending', 'sent', 'failed', 'blocked', 'skipped'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, -- Для 'deferred' - конец тихих часов получателя, для 'coalescing' - конец окна дайджеста (UTC)
+    job_id INTEGER,                    -- Рассылка, к которой относится сообщение (delivery_jobs)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (notification_id) REFERENCES notifications(id),
+    FOREIGN KEY (user_id) REFERENCES users(telegram_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_outbox_state ON notification_outbox (state, next_attempt_at);
+
+-- Рассылки (уведомления группе, объявления) с агрегированной статистикой доставки.
+-- Счетчики обновляются вместе с записью квитанций, поэтому статистика не требует
+-- пересчета delivery_receipts
+CREATE TABLE IF NOT EXISTS delivery_jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,                -- Тип уведомления или 'announcement'
+    group_code TEXT,                   -- Группа, если рассылка по группе
+    author_id INTEGER,                 -- Автор объявления
+    total INTEGER NOT NULL DEFAULT 0,  -- Сколько получателей
+    sent INTEGER NOT NULL DEFAULT 0,
+    blocked INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    latency_ms_total INTEGER NOT NULL DEFAULT 0, -- Сумма задержек доставленных сообщений
+    latency_ms_max INTEGER NOT NULL DEFAULT 0,
+    -- Время с миллисекундами: по нему считается пропускная способность рассылки
+    created_at TIMESTAMP DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now')),
+    last_delivery_at TIMESTAMP         -- Время последней квитанции
+);
+
+CREATE INDEX IF NOT EXISTS idx_delivery_jobs_group ON delivery_jobs (group_code, id);
+
+-- Квитанции о доставке: одна короткая строка на получателя
+CREATE TABLE IF NOT EXISTS delivery_receipts (
+    job_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    outcome INTEGER NOT NULL,          -- 0 - доставлено, 1 - заблокировано, 2 - ошибка, 3 - пропущено
+    latency_ms INTEGER NOT NULL,
+    PRIMARY KEY (job_id, user_id)
+) WITHOUT ROWID;
@@ -34,6 +34,7 @@ MESSAGES = {
     "cancel": "Болдырмау",
     "back": "Артқа",
     "continue": "Жалғастыру",
+    "button_expired": "⌛ Бұл батырма ескірген. Мәзірді қайта ашыңыз.",
     
     # Ошибки доступа
     "no_access": "Бұл функцияға қолжетімділігіңіз жоқ.",
@@ -128,8 +129,10 @@ SCHEDULE_MESSAGES = {
     "choose_subject": "Пәнді таңдаңыз:",
     "invalid_time": "Уақытты ЧЧ:ММ форматында енгізіңіз (мысалы, 09:30):",
     "confirm_add_lesson": "Сіз сабақ қосуды жоспарлап отырсыз:\nТоп: {group_code}\nКүн: {weekday}\nУақыт: {time}\nПән: {subject}\n\nҚосуды растаңыз:",
-    "lesson_added": "Сабақ {group_code} тобының кестесіне сәтті қосылды.\nХабарламалар {students_count} студентке жіберілді.",
+    "lesson_added": "Сабақ {group_code} тобының кестесіне сәтті қосылды.\nХабарламалар {students_count} студентке жіберіледі.",
     "choose_lesson_edit": "Өңдеу үшін сабақты таңдаңыз:",
+    "choose_weekday_edit": "{lesson} сабағының жаңа апта күнін таңдаңыз:",
+    "confirm_edit_lesson": "Сіз сабақты өзгертуді жоспарлап отырсыз:\nТоп: {group_code}\nКүн: {weekday}\nУақыт: {time}\nПән: {subject}\n\nӨзгертуді растаңыз:",
     "schedule_updated": "{group_code} тобының кестесі сәтті жаңартылды.\nХабарламалар {students_count} студентке жіберілді.",
     "lesson_deleted": "{weekday}, {time} - {subject} сабағы {group_code} тобының кестесінен өшірілді.\nХабарламалар {students_count} студентке жіберілді.",
     "no_groups_assigned": "Сізге бекітілген топтар жоқ. Кем дегенде бір студентті растаңыз немесе жаңа топ қосыңыз.",
@@ -171,6 +174,50 @@ NOTIFICATION_MESSAGES = {
     "marked_as_read": "Хабарлама оқылған деп белгіленді",
     "notification_from": "(Хабарлама {date} күнінен)",
     "not_registered": "Сіз жүйеде тіркелмегенсіз немесе өтінішіңіз әлі расталмаған.",
+    "digest_header": "{count} жаңа хабарлама:",
+    "inbox_header": "📬 Оқылмаған хабарламалар: {count}",
+    "newer": "◀️ Жаңалары",
+    "older": "Ескілері ▶️",
+    "mark_page_as_read": "✅ Бетті оқылды деп белгілеу",
+    "mark_all_as_read": "✅ Барлығын оқылды деп белгілеу",
+    "all_marked_as_read": "Барлық хабарламалар оқылды деп белгіленді",
+}
+
+# Сообщения для объявлений
+ANNOUNCEMENT_MESSAGES = {
+    "no_access": "Бұл команда тек оқытушылар мен әкімшілер үшін қолжетімді.",
+    "enter_text_teacher": "Хабарландыру мәтінін жазыңыз. Ол сіздің топтарыңыздағы барлық студенттерге жіберіледі.",
+    "enter_text_admin": "Хабарландыру мәтінін жазыңыз. Ол барлық тіркелген пайдаланушыларға жіберіледі.",
+    "no_recipients": "Хабарландыруды алатын пайдаланушылар жоқ.",
+    "started": "Хабарландыру {total} алушыға фондық режимде жіберіледі.",
+    "progress": "📣 Хабарландыру жіберілуде: {done} / {total}",
+    "finished": "✅ Хабарландыру жіберілді: {sent} / {total}\nБотты бұғаттағандар: {blocked}\nҚателер: {failed}",
+    "cancelled": "⛔ Хабарландыру тоқтатылды: {sent} / {total} жіберілді",
+    "cancel_button": "⛔ Тоқтату",
+    "cancelling": "Хабарландыру тоқтатылуда...",
+    "already_finished": "Хабарландыру жіберіліп қойған.",
+}
+
+# Сообщения для статистики рассылок
+DELIVERY_STATS_MESSAGES = {
+    "no_access": "Бұл команда тек оқытушылар мен әкімшілер үшін қолжетімді.",
+    "no_jobs": "Әзірге таратулар болған жоқ.",
+    "recent_jobs": "📊 Соңғы таратулар:",
+    "by_group": "📊 Топтар бойынша:",
+    "announcement": "📣 Хабарландыру",
+    "outcomes": "Жеткізілді: {sent} / {total}, бұғаттағандар: {blocked}, қателер: {failed}, өткізілді: {skipped}",
+    "latency": "Орташа кідіріс: {average} мс, ең үлкені: {max} мс, жылдамдық: {rate:.1f} хабарлама/с",
+    "group_line": "{group_code}: {jobs} тарату, жеткізілді {sent} / {total}, бұғаттағандар {blocked}, қателер {failed}, орташа кідіріс {average} мс",
+}
+
+# Сообщения для тихих часов
+QUIET_HOURS_MESSAGES = {
+    "current": "🌙 Тыныш сағаттар: {start:02d}:00 – {end:02d}:00. Бұл уақытта келген хабарламалар кейін жеткізіледі.",
+    "not_set": "🌙 Тыныш сағаттар орнатылмаған.",
+    "usage": "Орнату үшін: /quiet_hours 22-7\nӨшіру үшін: /quiet_hours off",
+    "saved": "✅ Тыныш сағаттар сақталды: {start:02d}:00 – {end:02d}:00",
+    "disabled": "✅ Тыныш сағаттар өшірілді",
+    "invalid": "Қате формат. Мысалы: /quiet_hours 22-7",
 }
 
 # Типы уведомлений
@@ -190,7 +237,10 @@ ATTENDANCE_MESSAGES = {
     "choose_group_qr": "QR-код жасау үшін топты таңдаңыз:",
     "no_subjects_group": "Бұл топ үшін кестеде пәндер табылмады. Алдымен кесте қосыңыз.",
     "choose_subject_qr": "Пәнді таңдаңыз:",
-    "qr_generated": "🧾 Бұл QR-кодты студенттерге экранда көрсетіңіз.\nСтуденттер оны суретке түсіріп, осы ботқа жіберуі керек.\nQR-код {minutes} минут бойы жарамды.",
+    "qr_generated": "🧾 Бұл QR-кодты студенттерге экранда көрсетіңіз.\nСтуденттер оны телефон камерасымен сканерлеп, ашылған сілтеме арқылы белгіленеді.\nQR-код {minutes} минут бойы жарамды.",
+    "qr_live": "🧾 Бұл QR-кодты студенттерге экранда көрсетіңіз.\nКод әр {seconds} секунд сайын жаңарады, сондықтан оның скриншоты басқа біреуге жарамайды.\nСессия {minutes} минут бойы жүреді.",
+    "qr_session_ended": "⌛ Қатысуды белгілеу сессиясы аяқталды.",
+    "qr_counter": "✅ Белгіленгендер: {present} / {total}",
     "qr_not_recognized": "❌ QR-кодты тану сәтсіз болды. Қайта көріңіз.",
     "invalid_qr_type": "❌ QR-код түрі дұрыс емес.",
     "qr_expired": "❌ QR-код мерзімі өтіп кетті.",
@@ -199,15 +249,17 @@ ATTENDANCE_MESSAGES = {
     "attendance_saved": "✅ Сіздің қатысу белгіңіз сақталды!",
     "attendance_error": "❌ QR-коддағы деректерді тану сәтсіз болды. Қайта көріңіз.",
     "photo_error": "❌ Суретті өңдеуде қате орын алды. Қайта көріңіз.",
+    "decoder_busy": "⏳ Қазір суреттер тым көп. Бірнеше секундтан кейін суретті қайта жіберіңіз.",
+    "checkin_received": "📥 Қабылданды, өңделуде. Нәтиже осы хабарламада шығады.",
     "checkin_instructions": """Қатысуды белгілеу нұсқаулығы:
 
 1. Оқытушыдан қатысуды белгілеу үшін QR-код көрсетуін сұраңыз.
 
-2. QR-кодты суретке түсіріп, осы чатқа жіберіңіз.
+2. Телефон камерасын QR-кодқа бағыттап, ашылған сілтеме арқылы ботқа өтіңіз - қатысуыңыз бірден белгіленеді.
 
-3. QR-код суретте жақсы көрініп, бұлдыр болмағанына көз жеткізіңіз.
+3. Егер камера сілтемені ашпаса, QR-кодты суретке түсіріп, осы чатқа жіберіңіз. QR-код суретте жақсы көрініп, бұлдыр болмағанына көз жеткізіңіз.
 
-4. Жүйе суретті автоматты түрде өңдейді және сіздің сабаққа қатысуыңызды белгілейді.
+4. Жүйе сілтемені немесе суретті автоматты түрде өңдейді және сіздің сабаққа қатысуыңызды белгілейді.
 
 5. Сіз сәтті белгіленгені немесе қате туралы хабарлама аласыз.
 
@@ -217,6 +269,11 @@ ATTENDANCE_MESSAGES = {
     "approved_students_only": "Бұл функция тек расталған студенттер үшін қолжетімді.",
 }
 
+# Сообщения защиты от флуда
+THROTTLING_MESSAGES = {
+    "too_many_requests": "⏳ Сұраныстар тым жиі жіберілуде. Біраз күте тұрыңыз.",
+}
+
 # Сообщения для управления группами
 GROUP_MESSAGES = {
     "no_groups_view": "Жүйеде тіркелген топтар жоқ.",
@@ -4,5 +4,11 @@ from . import schedule
 from . import grades
 from . import notifications
 from . import attendance
+from . import announcements
+from . import quiet_hours
+from . import delivery_stats
 
-__all__ = ["registration", "schedule", "grades", "notifications", "attendance"]
+__all__ = [
+    "registration", "schedule", "grades", "notifications", "attendance",
+    "announcements", "quiet_hours", "delivery_stats"
+]
@@ -0,0 +1,193 @@
+# announcements.py
+import asyncio
+import itertools
+import logging
+
+from aiogram import types
+from aiogram.dispatcher import FSMContext
+from aiogram.dispatcher.filters.state import State, StatesGroup
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.utils.exceptions import MessageNotModified, TelegramAPIError
+
+from config import ADMIN_IDS, ANNOUNCEMENT_PROGRESS_INTERVAL
+from database.db import db
+from localization.kz_text import ANNOUNCEMENT_MESSAGES, NOTIFICATION_TYPES, BUTTONS, MESSAGES
+from modules import callbacks, shutdown
+from modules.broadcast import broadcast, DeliveryReport
+from modules.keyboards import get_menu_keyboard
+
+logger = logging.getLogger(__name__)
+
+# Определение состояний для FSM
+class AnnouncementStates(StatesGroup):
+    waiting_for_text = State()
+
+# Клавиатура с кнопкой отмены
+def get_cancel_keyboard():
+    keyboard = ReplyKeyboardMarkup(resize_keyboard=True)
+    keyboard.add(KeyboardButton(BUTTONS["cancel"]))
+    return keyboard
+
+# Номера объявлений в пределах процесса (для кнопки отмены)
+_job_ids = itertools.count(1)
+# Выполняющиеся объявления: ID -> AnnouncementJob
+_jobs = {}
+
+
+class AnnouncementJob:
+    """
+    Фоновая рассылка объявления: сохраняет уведомления, рассылает их
+    через общий механизм рассылок и периодически обновляет сообщение
+    с ходом рассылки у автора
+    """
+
+    def __init__(self, bot, author_id, recipients, text):
+        self.id = next(_job_ids)
+        self.bot = bot
+        self.author_id = author_id
+        self.recipients = recipients
+        self.text = text
+        self.report = DeliveryReport(len(recipients))
+        self.status_message = None
+        self.cancelled = False
+        self.task = None
+
+    def _keyboard(self):
+        keyboard = InlineKeyboardMarkup()
+        keyboard.add(InlineKeyboardButton(
+            ANNOUNCEMENT_MESSAGES["cancel_button"],
+            callback_data=callbacks.pack(callbacks.CANCEL_ANNOUNCEMENT, self.id)
+        ))
+        return keyboard
+
+    async def _edit_status(self, text, with_cancel=False):
+        try:
+            await self.status_message.edit_text(text, reply_markup=self._keyboard() if with_cancel else None)
+        except MessageNotModified:
+            pass
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить статус объявления {self.id}: {e}")
+
+    async def start(self):
+        self.status_message = await self.bot.send_message(
+            self.author_id,
+            ANNOUNCEMENT_MESSAGES["progress"].format(done=0, total=self.report.total),
+            reply_markup=self._keyboard()
+        )
+        _jobs[self.id] = self
+        self.task = shutdown.spawn(self.run(), f"announcement_{self.id}")
+
+    async def _report_progress(self):
+        """Обновляет сообщение с ходом рассылки не чаще раза в ANNOUNCEMENT_PROGRESS_INTERVAL"""
+        shown = 0
+        while True:
+            await asyncio.sleep(ANNOUNCEMENT_PROGRESS_INTERVAL)
+            if self.report.done != shown:
+                shown = self.report.done
+                await self._edit_status(
+                    ANNOUNCEMENT_MESSAGES["progress"].format(done=shown, total=self.report.total),
+                    with_cancel=True
+                )
+
+    async def run(self):
+        progress = asyncio.ensure_future(self._report_progress())
+        delivery_job_id = None
+        try:
+            # Объявление остается во входящих у каждого получателя
+            await db.add_notifications(self.recipients, self.text, "general")
+            delivery_job_id = await db.create_delivery_job("announcement", self.report.total, author_id=self.author_id)
+            type_prefix = NOTIFICATION_TYPES["general"]
+            await broadcast(self.bot, self.recipients, f"{type_prefix} {self.text}", report=self.report)
+        except asyncio.CancelledError:
+            if not self.cancelled:
+                # Остановка бота: объявление прерывается вместе с ним
+                raise
+        except Exception as e:
+            logger.error(f"Ошибка рассылки объявления {self.id}: {e}")
+        finally:
+            progress.cancel()
+            _jobs.pop(self.id, None)
+            if delivery_job_id is not None:
+                await self._save_receipts(delivery_job_id)
+
+        summary = self.report.summary()
+        logger.info(f"Объявление {self.id} от {self.author_id}: {summary}")
+        if self.cancelled:
+            await self._edit_status(ANNOUNCEMENT_MESSAGES["cancelled"].format(**summary))
+        else:
+            await self._edit_status(ANNOUNCEMENT_MESSAGES["finished"].format(**summary))
+
+    async def _save_receipts(self, delivery_job_id):
+        """Сохраняет квитанции о доставке для /delivery_stats"""
+        try:
+            await db.record_deliveries([
+                (delivery_job_id, chat_id, outcome, latency_ms)
+                for chat_id, outcome, latency_ms in self.report.receipts
+            ])
+        except Exception as e:
+            logger.error(f"Не удалось сохранить статистику объявления {self.id}: {e}")
+
+    def cancel(self):
+        self.cancelled = True
+        self.task.cancel()
+
+
+# Обработчик команды /announce
+async def cmd_announce(message: types.Message, state: FSMContext):
+    user = await db.get_user(message.from_user.id)
+    is_admin = message.from_user.id in ADMIN_IDS
+    is_teacher = user and user["role"] == "teacher" and user["status"] == "approved"
+
+    if not (is_admin or is_teacher):
+        await message.answer(ANNOUNCEMENT_MESSAGES["no_access"])
+        return
+
+    # Роль нужна, чтобы после ввода текста вернуть пользователю его меню
+    role = user["role"] if user and user["status"] == "approved" else None
+    await state.update_data(for_everyone=is_admin, role=role)
+    await message.answer(
+        ANNOUNCEMENT_MESSAGES["enter_text_admin" if is_admin else "enter_text_teacher"],
+        reply_markup=get_cancel_keyboard()
+    )
+    await AnnouncementStates.waiting_for_text.set()
+
+# Обработчик текста объявления
+async def process_announcement_text(message: types.Message, state: FSMContext):
+    text = message.text.strip()
+    data = await state.get_data()
+    await state.finish()
+    keyboard = get_menu_keyboard(data.get("role"))
+
+    if text.lower() == BUTTONS["cancel"].lower():
+        await message.answer(MESSAGES["action_cancelled"], reply_markup=keyboard)
+        return
+
+    # Получатели одним запросом: все пользователи или студенты всех групп преподавателя
+    teacher_id = None if data.get("for_everyone") else message.from_user.id
+    recipients = await db.get_announcement_recipients(teacher_id, exclude_id=message.from_user.id)
+    if not recipients:
+        await message.answer(ANNOUNCEMENT_MESSAGES["no_recipients"], reply_markup=keyboard)
+        return
+
+    await message.answer(
+        ANNOUNCEMENT_MESSAGES["started"].format(total=len(recipients)),
+        reply_markup=keyboard
+    )
+    job = AnnouncementJob(message.bot, message.from_user.id, recipients, text)
+    await job.start()
+
+# Обработчик кнопки отмены объявления
+async def process_cancel_announcement(callback_query: types.CallbackQuery, state: FSMContext, job_id):
+    job = _jobs.get(job_id)
+    if job is None or job.author_id != callback_query.from_user.id:
+        await callback_query.answer(ANNOUNCEMENT_MESSAGES["already_finished"])
+        return
+
+    job.cancel()
+    await callback_query.answer(ANNOUNCEMENT_MESSAGES["cancelling"])
+
+# Регистрация обработчиков в диспетчере
+def register_handlers(dp):
+    dp.register_message_handler(cmd_announce, commands=["announce"])
+    dp.register_message_handler(process_announcement_text, state=AnnouncementStates.waiting_for_text)
+    callbacks.router.register(callbacks.CANCEL_ANNOUNCEMENT, process_cancel_announcement, state="*")
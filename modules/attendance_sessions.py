@@ -0,0 +1,151 @@
+# attendance_sessions.py
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from config import QR_CODE_VALIDITY_MINUTES, ATTENDANCE_CLOSE_DELAY
+from database.db import db
+from modules import metrics, shutdown
+from modules.qr_decoder import decode_cache
+
+logger = logging.getLogger(__name__)
+
+
+class AttendanceSession:
+    """Активная сессия посещаемости: все, что нужно для проверки отметки без запросов к БД"""
+    __slots__ = ("id", "group_id", "subject", "created_at", "expires_at", "students", "present")
+
+    def __init__(self, session_id, group_id, subject, created_at, expires_at, students):
+        self.id = session_id
+        self.group_id = group_id
+        self.subject = subject
+        # Время создания в ISO формате - записывается в qr_timestamp отметок
+        self.created_at = created_at
+        # Unix-время окончания действия QR-кода
+        self.expires_at = expires_at
+        # Telegram ID студентов группы на момент создания сессии
+        self.students = students
+        # Telegram ID отметившихся студентов (для счетчика в сообщении с QR-кодом)
+        self.present = set()
+
+    def is_expired(self, now=None):
+        return (now or time.time()) > self.expires_at
+
+
+# Активные сессии: ID -> AttendanceSession. Копия в БД - таблица attendance_sessions
+_sessions = {}
+
+
+def _expire(session_id):
+    """Сессия истекла: удаляем ее и распознанные фото с ее QR-кодом, а позже закрываем ее в БД"""
+    _sessions.pop(session_id, None)
+    decode_cache.evict_tag(session_id)
+    _schedule_close(session_id, ATTENDANCE_CLOSE_DELAY)
+
+
+async def close(session_id):
+    """
+    Закрывает сессию: записывает ABSENT студентам группы без отметки и сохраняет в attendance_sessions
+    число присутствовавших и отсутствовавших (present_count, absent_count)
+    Returns:
+        tuple: (присутствовали, отсутствовали) или None, если сессия уже закрыта
+    """
+    result = await db.close_attendance_session(session_id, int(time.time()))
+    if result is not None:
+        present, absent = result
+        metrics.inc("bot_attendance_absent_total", absent)
+        logger.info(f"Сессия посещаемости {session_id} закрыта: присутствовали {present}, отсутствовали {absent}")
+    return result
+
+
+async def _close_later(session_id, delay):
+    # При остановке бота сессия останется незакрытой и закроется при следующем запуске (см. load)
+    if await shutdown.wait_closing(delay):
+        return
+    try:
+        await close(session_id)
+    except Exception as e:
+        logger.error(f"Ошибка при закрытии сессии посещаемости {session_id}: {e}")
+
+
+def _schedule_close(session_id, delay):
+    shutdown.spawn(_close_later(session_id, delay), f"attendance_close_{session_id}")
+
+
+def _track(session):
+    """Добавляет сессию в активные и планирует ее удаление в момент истечения"""
+    _sessions[session.id] = session
+    # Лишняя секунда: токены сравнивают срок с текущим временем включительно
+    delay = max(0.0, session.expires_at + 1 - time.time())
+    asyncio.get_running_loop().call_later(delay, _expire, session.id)
+
+
+async def load():
+    """
+    Загружает сессии, срок которых еще не истек, и планирует закрытие истекших,
+    но не закрытых (бот был остановлен) - при старте бота
+    """
+    _sessions.clear()
+    now = int(time.time())
+    for row in await db.get_active_attendance_sessions(now):
+        students = set(await db.get_group_student_ids(row["group_id"]))
+        _track(AttendanceSession(
+            row["id"], row["group_id"], row["subject"], row["created_at"], row["expires_at"], students
+        ))
+    if _sessions:
+        logger.info(f"Активных сессий посещаемости: {len(_sessions)}")
+
+    unclosed = await db.get_unclosed_attendance_sessions(now)
+    for row in unclosed:
+        _schedule_close(row["id"], max(0, row["expires_at"] + ATTENDANCE_CLOSE_DELAY - now))
+    if unclosed:
+        logger.info(f"Незакрытых истекших сессий посещаемости: {len(unclosed)}")
+
+
+async def create(group_id, subject, teacher_id):
+    """
+    Создает сессию посещаемости
+    Args:
+        group_id (int): ID группы
+        subject (str): Название предмета
+        teacher_id (int): Telegram ID преподавателя
+    Returns:
+        AttendanceSession: Новая сессия; токены для QR-кода выдает LiveQR на каждое окно
+    """
+    now = datetime.now()
+    expires_at = int(now.timestamp()) + QR_CODE_VALIDITY_MINUTES * 60
+    created_at = now.isoformat()
+    session_id = await db.create_attendance_session(group_id, subject, teacher_id, created_at, expires_at)
+    students = set(await db.get_group_student_ids(group_id))
+    session = AttendanceSession(session_id, group_id, subject, created_at, expires_at, students)
+    _track(session)
+    return session
+
+
+def get(session_id):
+    """Активная сессия по ID или None (сессия истекла или не существует)"""
+    session = _sessions.get(session_id)
+    if session is None or session.is_expired():
+        return None
+    return session
+
+
+def mark_present(session_id, student_id):
+    """Отметка студента записана в БД: учитываем ее в счетчике сессии"""
+    session = _sessions.get(session_id)
+    if session is not None:
+        session.present.add(student_id)
+
+
+async def is_member(session, student_id):
+    """
+    Состоит ли студент в группе сессии. Обычно это проверка по множеству;
+    в БД идем, только если студента добавили в группу уже после создания сессии
+    """
+    if student_id in session.students:
+        return True
+    if await db.get_student_group_id(student_id) == session.group_id:
+        session.students.add(student_id)
+        return True
+    return False
@@ -0,0 +1,106 @@
+# attendance_token.py
+import base64
+import binascii
+import hashlib
+import hmac
+import logging
+import secrets
+import struct
+
+from config import ATTENDANCE_SECRET
+
+logger = logging.getLogger(__name__)
+
+# Префикс отличает токен посещаемости от любого другого QR-кода
+TOKEN_PREFIX = "ATT:"
+# Параметр /start допускает только латиницу, цифры, '_' и '-', поэтому в ссылке другой префикс
+START_PREFIX = "att_"
+# ID сессии, ID группы, срок действия (Unix-время) - по 4 байта
+_PAYLOAD = struct.Struct(">III")
+# Усеченная подпись HMAC-SHA256: 64 бит достаточно для кода, живущего минуты
+SIGNATURE_SIZE = 8
+
+
+class InvalidToken(Exception):
+    """Токен поврежден или подделан"""
+
+
+def _load_key():
+    if ATTENDANCE_SECRET:
+        return ATTENDANCE_SECRET.encode("utf-8")
+    logger.warning("ATTENDANCE_SECRET не задан: QR-коды перестанут действовать после перезапуска бота")
+    return secrets.token_bytes(32)
+
+
+_key = _load_key()
+
+
+def _sign(payload):
+    return hmac.new(_key, payload, hashlib.sha256).digest()[:SIGNATURE_SIZE]
+
+
+def issue(session_id, group_id, expires_at):
+    """
+    Создает подписанный токен для QR-кода.
+    20 байт в base32 - ровно 32 символа из алфавита A-Z2-7 без дополнения '=',
+    поэтому QR-код кодируется в буквенно-цифровом режиме и получается маленьким
+    Args:
+        session_id (int): ID сессии посещаемости
+        group_id (int): ID группы
+        expires_at (int): Срок действия (Unix-время)
+    Returns:
+        str: Токен вида ATT:<32 символа>
+    """
+    payload = _PAYLOAD.pack(session_id, group_id, expires_at)
+    return TOKEN_PREFIX + base64.b32encode(payload + _sign(payload)).decode("ascii")
+
+
+def is_token(text):
+    """Похож ли текст на токен посещаемости (без проверки подписи)"""
+    return text.startswith(TOKEN_PREFIX)
+
+
+def deep_link(bot_username, token):
+    """
+    Ссылка для QR-кода: камера телефона открывает бота, и /start получает токен,
+    так что отметка проходит без отправки фото
+    """
+    return f"https://t.me/{bot_username}?start={START_PREFIX}{token[len(TOKEN_PREFIX):]}"
+
+
+def extract(text):
+    """
+    Токен из данных QR-кода или параметра /start: сам токен, ссылка на бота или att_<...>
+    Returns:
+        str: Токен вида ATT:<...> (подпись не проверяется) или None
+    """
+    if is_token(text):
+        return text
+    marker = "start=" + START_PREFIX
+    index = text.find(marker)
+    if index >= 0:
+        text = text[index + len("start="):].split("&")[0]
+    if text.startswith(START_PREFIX):
+        return TOKEN_PREFIX + text[len(START_PREFIX):]
+    return None
+
+
+def verify(token):
+    """
+    Проверяет подпись токена (за постоянное время) и возвращает его поля
+    Returns:
+        tuple: (session_id, group_id, expires_at)
+    Raises:
+        InvalidToken: Токен поврежден или подпись не совпадает
+    """
+    try:
+        raw = base64.b32decode(token[len(TOKEN_PREFIX):])
+    except (binascii.Error, ValueError):
+        raise InvalidToken()
+    if not is_token(token) or len(raw) != _PAYLOAD.size + SIGNATURE_SIZE:
+        raise InvalidToken()
+
+    payload, signature = raw[:_PAYLOAD.size], raw[_PAYLOAD.size:]
+    if not hmac.compare_digest(signature, _sign(payload)):
+        raise InvalidToken()
+    return _PAYLOAD.unpack(payload)
@@ -0,0 +1,175 @@
+# broadcast.py
+import asyncio
+import logging
+import time
+
+from aiogram.utils.exceptions import RetryAfter, NetworkError, RestartingTelegram, TelegramAPIError
+
+from config import BROADCAST_PER_CHAT_RATE, BROADCAST_CONCURRENCY, BROADCAST_MAX_RETRIES
+from modules import metrics, outgoing, reachability
+from modules.ratelimit import BucketTable
+
+logger = logging.getLogger(__name__)
+
+# Результаты доставки одного сообщения
+SENT = "sent"
+BLOCKED = "blocked"
+FAILED = "failed"
+SKIPPED = "skipped"
+# Компактные коды результатов для квитанций о доставке (delivery_receipts.outcome)
+OUTCOME_CODES = {SENT: 0, BLOCKED: 1, FAILED: 2, SKIPPED: 3}
+
+# Ошибки, после которых писать пользователю бессмысленно
+UNREACHABLE_ERRORS = reachability.UNREACHABLE_ERRORS
+# Временные ошибки, которые имеет смысл повторить
+TRANSIENT_ERRORS = (NetworkError, RestartingTelegram, asyncio.TimeoutError)
+
+# Лимит на чат общий для всех рассылок процесса.
+# Общий лимит на все запросы соблюдает планировщик в modules/outgoing.py
+_chat_buckets = BucketTable(BROADCAST_PER_CHAT_RATE, 1)
+
+
+class DeliveryReport:
+    """Итоги рассылки: кому доставлено, кто недоступен и что не удалось отправить"""
+
+    def __init__(self, total):
+        self.total = total
+        self.sent = []
+        self.blocked = []
+        self.failed = []
+        # Получатели, про которых заранее известно, что они недоступны
+        self.skipped = []
+        # Квитанции (chat_id, код результата, задержка в мс) для статистики рассылок
+        self.receipts = []
+        self.retries = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    def add(self, chat_id, outcome, error=None, latency=0.0):
+        self.receipts.append((chat_id, OUTCOME_CODES[outcome], int(latency * 1000)))
+        if outcome == SENT:
+            self.sent.append(chat_id)
+        elif outcome == BLOCKED:
+            self.blocked.append((chat_id, error))
+        elif outcome == SKIPPED:
+            self.skipped.append(chat_id)
+        else:
+            self.failed.append((chat_id, error))
+
+    @property
+    def done(self):
+        """Сколько получателей уже обработано"""
+        return len(self.sent) + len(self.blocked) + len(self.failed) + len(self.skipped)
+
+    @property
+    def duration(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def summary(self):
+        return {
+            "total": self.total,
+            "sent": len(self.sent),
+            "blocked": len(self.blocked),
+            "failed": len(self.failed),
+            "skipped": len(self.skipped),
+            "retries": self.retries,
+            "duration": round(self.duration, 3),
+        }
+
+
+async def _acquire(chat_id):
+    """Ждет, пока позволит лимит на чат"""
+    while not _chat_buckets.consume(chat_id):
+        await asyncio.sleep(_chat_buckets.delay(chat_id))
+
+
+async def send_message(bot, chat_id, text, report=None, **kwargs):
+    """
+    Отправляет одно сообщение с учетом лимитов Telegram.
+    RetryAfter выжидается, временные ошибки повторяются с экспоненциальной паузой
+    Args:
+        bot: Экземпляр бота
+        chat_id (int): Получатель
+        text (str): Текст сообщения
+        report (DeliveryReport): Отчет, в котором считаются повторы
+    Returns:
+        tuple: (результат SENT/BLOCKED/FAILED, исключение или None)
+    """
+    attempt = 0
+    while True:
+        await _acquire(chat_id)
+        started_at = time.perf_counter()
+        try:
+            await bot.send_message(chat_id, text, **kwargs)
+            metrics.observe("bot_send_latency_seconds", time.perf_counter() - started_at)
+            return SENT, None
+        except RetryAfter as e:
+            # Telegram сам говорит, сколько ждать; это не считается неудачной попыткой
+            logger.warning(f"RetryAfter {e.timeout} с при отправке в чат {chat_id}")
+            metrics.inc("bot_send_retries_total", reason="retry_after")
+            if report:
+                report.retries += 1
+            await asyncio.sleep(e.timeout)
+        except UNREACHABLE_ERRORS as e:
+            await reachability.mark_unreachable(chat_id, e)
+            return BLOCKED, e
+        except TRANSIENT_ERRORS as e:
+            attempt += 1
+            if attempt > BROADCAST_MAX_RETRIES:
+                return FAILED, e
+            metrics.inc("bot_send_retries_total", reason="transient")
+            if report:
+                report.retries += 1
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+        except TelegramAPIError as e:
+            return FAILED, e
+
+
+async def broadcast(bot, chat_ids, text, concurrency=BROADCAST_CONCURRENCY, report=None, **kwargs):
+    """
+    Параллельная рассылка одного сообщения нескольким получателям
+    Args:
+        bot: Экземпляр бота
+        chat_ids (list): Получатели
+        text (str): Текст сообщения
+        concurrency (int): Сколько сообщений отправляется одновременно
+        report (DeliveryReport): Отчет, который заполняется по ходу рассылки
+                                 (чтобы показывать прогресс); по умолчанию создается новый
+    Returns:
+        DeliveryReport: Отчет о доставке
+    """
+    chat_ids = list(chat_ids)
+    if report is None:
+        report = DeliveryReport(len(chat_ids))
+
+    # Заблокировавшим бота не пишем вовсе
+    chat_ids, unreachable = reachability.filter_reachable(chat_ids)
+    for chat_id in unreachable:
+        report.add(chat_id, SKIPPED)
+    if unreachable:
+        metrics.inc("bot_broadcast_messages_total", len(unreachable), outcome=SKIPPED)
+    pending = iter(chat_ids)
+
+    async def worker():
+        # Итератор общий: каждый воркер берет следующего получателя
+        for chat_id in pending:
+            started_at = time.perf_counter()
+            outcome, error = await send_message(bot, chat_id, text, report=report, **kwargs)
+            report.add(chat_id, outcome, error, time.perf_counter() - started_at)
+            metrics.inc("bot_broadcast_messages_total", outcome=outcome)
+
+    try:
+        # Рассылка идет через очередь с низким приоритетом, не задерживая ответы пользователям
+        with outgoing.bulk():
+            if chat_ids:
+                await asyncio.gather(*(worker() for _ in range(min(concurrency, len(chat_ids)))))
+    except asyncio.CancelledError:
+        logger.warning(
+            f"Рассылка прервана: {report.summary()}, доставлено: {report.sent}"
+        )
+        raise
+    finally:
+        report.finished_at = time.monotonic()
+
+    logger.info(f"Рассылка завершена: {report.summary()}")
+    return report
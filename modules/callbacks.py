@@ -0,0 +1,154 @@
+# callbacks.py
+import base64
+import logging
+
+from aiogram import types, Dispatcher
+from aiogram.dispatcher import FSMContext
+
+from localization.kz_text import MESSAGES
+
+logger = logging.getLogger(__name__)
+
+# Типы callback-данных. Тип - это первый символ callback_data,
+# по нему маршрут находится одним обращением к словарю
+QR_GROUP = "G"
+QR_SUBJECT = "S"
+GRADE_STUDENT = "T"
+APPROVE = "A"
+VIEW_REQUESTS = "V"
+READ_NOTIFICATION = "N"
+EDIT_SCHEDULE = "E"
+INBOX_PAGE = "I"
+INBOX_READ_PAGE = "R"
+INBOX_READ_ALL = "M"
+CANCEL_ANNOUNCEMENT = "C"
+
+# Ограничение Telegram на длину callback_data
+MAX_CALLBACK_DATA_BYTES = 64
+
+
+def pack(kind, *values):
+    """
+    Упаковывает тип и целые неотрицательные числа в короткую строку callback_data:
+    символ типа + base64url от чисел в формате varint (LEB128)
+    Args:
+        kind (str): Тип (один символ)
+        *values (int): Числовые параметры (ID группы, студента и т.п.)
+    Returns:
+        str: callback_data
+    """
+    buffer = bytearray()
+    for value in values:
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"Отрицательное значение в callback_data: {value}")
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if value:
+                buffer.append(byte | 0x80)
+            else:
+                buffer.append(byte)
+                break
+
+    data = kind + base64.urlsafe_b64encode(bytes(buffer)).decode("ascii").rstrip("=")
+    if len(data) > MAX_CALLBACK_DATA_BYTES:
+        raise ValueError(f"callback_data длиннее {MAX_CALLBACK_DATA_BYTES} байт: {data}")
+    return data
+
+
+def unpack(data):
+    """
+    Распаковывает callback_data, созданные pack()
+    Returns:
+        tuple: (тип, кортеж чисел)
+    """
+    kind, encoded = data[:1], data[1:]
+    raw = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4))
+
+    values = []
+    value = shift = 0
+    for byte in raw:
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            values.append(value)
+            value = shift = 0
+    if shift:
+        raise ValueError(f"Оборванное число в callback_data: {data}")
+
+    return kind, tuple(values)
+
+
+class CallbackRouter:
+    """
+    Единый обработчик всех callback-запросов: маршрут выбирается по типу
+    (первому символу callback_data) из таблицы, а не перебором фильтров
+    """
+
+    def __init__(self):
+        self._routes = {}
+
+    def register(self, kind, handler, state=None):
+        """
+        Регистрирует обработчик для типа callback-данных
+        Args:
+            kind (str): Тип из констант этого модуля
+            handler: Корутина handler(callback_query, state, *values)
+            state: Состояние FSM, как в aiogram: None - без состояния, "*" - любое
+        """
+        if kind in self._routes:
+            raise ValueError(f"Тип callback-данных {kind} уже зарегистрирован")
+        state_name = state if state in (None, "*") else state.state
+        self._routes[kind] = (handler, state_name)
+
+    async def match(self, callback_query: types.CallbackQuery):
+        """Фильтр aiogram: находит маршрут и распаковывает данные"""
+        data = callback_query.data
+        if not data:
+            return False
+
+        route = self._routes.get(data[0])
+        if route is None:
+            return False
+        handler, state_name = route
+
+        if state_name != "*":
+            chat_id = callback_query.message.chat.id if callback_query.message else callback_query.from_user.id
+            current_state = await Dispatcher.get_current().current_state(
+                chat=chat_id, user=callback_query.from_user.id
+            ).get_state()
+            if current_state != state_name:
+                return False
+
+        try:
+            _, values = unpack(data)
+        except ValueError as e:
+            logger.warning(f"Некорректные callback-данные {data!r}: {e}")
+            return False
+
+        # Эти ключи видят и middleware (для меток обработчика), и dispatch()
+        return {"callback_handler": handler, "callback_values": values}
+
+    async def dispatch(self, callback_query: types.CallbackQuery, state: FSMContext, callback_handler, callback_values):
+        await callback_handler(callback_query, state, *callback_values)
+
+
+router = CallbackRouter()
+
+
+async def expired_button(callback_query: types.CallbackQuery):
+    """
+    Отвечает на кнопки без маршрута: клавиатуры, отправленные до перехода на
+    короткие callback-данные ("approve_...", "qr_group_..."), и кнопки из
+    состояния, которое уже завершилось. Без ответа у клиента крутится индикатор
+    """
+    logger.info(f"Callback-данные без маршрута от {callback_query.from_user.id}: {callback_query.data!r}")
+    await callback_query.answer(MESSAGES["button_expired"], show_alert=True)
+
+
+def setup(dp):
+    """Регистрирует единый обработчик callback-запросов в диспетчере"""
+    dp.register_callback_query_handler(router.dispatch, router.match, state="*")
+    # Последним, чтобы получать только то, что не подошло под маршруты
+    dp.register_callback_query_handler(expired_button, state="*")
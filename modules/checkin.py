@@ -0,0 +1,407 @@
+# checkin.py
+import asyncio
+import logging
+import time
+from datetime import datetime
+
+from aiogram.utils.exceptions import TelegramAPIError
+
+from config import (
+    CHECKIN_MAX_PENDING, CHECKIN_ACK_THRESHOLD, CHECKIN_STAGE_QUEUE_SIZE, CHECKIN_DOWNLOAD_WORKERS,
+    CHECKIN_VALIDATE_WORKERS, CHECKIN_REPLY_WORKERS, CHECKIN_COMMIT_BATCH_SIZE
+)
+from database.db import db
+from localization.kz_text import ATTENDANCE_MESSAGES
+from modules import attendance_sessions, attendance_token, metrics, shutdown
+from modules.qr_decoder import qr_decoder, decode_cache, resolution_ladder, DecoderBusy
+
+logger = logging.getLogger(__name__)
+
+# Как студент отметился
+PHOTO = "photo"
+LINK = "link"
+
+# Этапы конвейера в порядке прохождения
+DOWNLOAD = "download"
+DECODE = "decode"
+VALIDATE = "validate"
+COMMIT = "commit"
+REPLY = "reply"
+STAGES = (DOWNLOAD, DECODE, VALIDATE, COMMIT, REPLY)
+
+# Границы корзин для размера пачки записи в БД
+BATCH_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250)
+
+
+class CheckinJob:
+    """Одна отметка, которая проходит этапы конвейера"""
+    __slots__ = ("path", "message", "started", "photo", "text", "status", "reply", "record", "ack")
+
+    def __init__(self, path, message, text=None):
+        self.path = path
+        self.message = message
+        self.started = time.perf_counter()
+        # Скачанный первый размер фото (BytesIO)
+        self.photo = None
+        # Данные QR-кода или параметр /start; None - QR-код на фото не найден
+        self.text = text
+        self.status = None
+        # Ключ ответа в ATTENDANCE_MESSAGES
+        self.reply = None
+        # Строка для таблицы attendance или None, если записывать нечего
+        self.record = None
+        # Задача отправки сообщения "принято" (только при перегрузке)
+        self.ack = None
+
+    def finish(self, status, reply, record=None):
+        self.status = status
+        self.reply = reply
+        self.record = record
+
+
+async def _is_approved_student(student_id):
+    user = await db.get_user(student_id)
+    return bool(user) and user['role'] == 'student' and user['status'] == 'approved'
+
+
+async def evaluate(student_id, text):
+    """
+    Проверяет данные QR-кода (токен, ссылку на бота или параметр /start), ничего не записывая.
+    Успешная отметка студента из состава группы не делает запросов к БД: токен
+    проверяется по подписи, сессия и состав группы хранятся в памяти. Роль
+    пользователя читается из БД только для ошибок и студентов не из состава
+    Args:
+        student_id (int): Telegram ID студента
+        text (str): Данные QR-кода или None, если код на фото не найден
+    Returns:
+        tuple: (статус, ключ ответа в ATTENDANCE_MESSAGES, строка для attendance или None)
+    """
+    now = datetime.now()
+    submitted_at = now.isoformat()
+
+    async def reject(status, reply, subject="unknown", qr_timestamp=submitted_at, group_id=None, session_id=None):
+        if not await _is_approved_student(student_id):
+            return "ERROR_NOT_STUDENT", "approved_students_only", None
+        return status, reply, (student_id, subject, qr_timestamp, submitted_at, status, group_id, session_id)
+
+    if not text:
+        return await reject("ERROR_INVALID_QR", "qr_not_recognized")
+
+    # Проверяем тип QR-кода
+    token = attendance_token.extract(text)
+    if token is None:
+        return await reject("ERROR_INVALID_QR", "invalid_qr_type")
+
+    # Проверяем подпись: подделанный или поврежденный токен не проходит
+    try:
+        session_id, group_id, expires_at = attendance_token.verify(token)
+    except attendance_token.InvalidToken:
+        logger.warning(f"Неверная подпись QR-кода от студента {student_id}")
+        return await reject("ERROR_INVALID_QR", "attendance_error")
+
+    # Проверка срока действия QR-кода: истекшей сессии нет среди активных
+    session = attendance_sessions.get(session_id)
+    if session is None or now.timestamp() > expires_at:
+        return await reject(
+            "ERROR_EXPIRED", "qr_expired", qr_timestamp=datetime.fromtimestamp(expires_at).isoformat(),
+            group_id=group_id, session_id=session_id
+        )
+
+    # Проверка группы студента
+    if student_id not in session.students:
+        if not await _is_approved_student(student_id):
+            return "ERROR_NOT_STUDENT", "approved_students_only", None
+        if not await attendance_sessions.is_member(session, student_id):
+            return "ERROR_GROUP_MISMATCH", "wrong_group", (
+                student_id, session.subject, session.created_at, submitted_at, "ERROR_GROUP_MISMATCH",
+                session.group_id, session.id
+            )
+
+    return "PRESENT", "attendance_saved", (
+        student_id, session.subject, session.created_at, submitted_at, "PRESENT", session.group_id, session.id
+    )
+
+
+def _session_tag(payloads):
+    """ID сессии из распознанного токена: по нему кэш распознавания очищается, когда сессия истекает"""
+    if payloads:
+        try:
+            token = attendance_token.extract(payloads[0].decode('utf-8', errors='replace'))
+            return attendance_token.verify(token)[0] if token else None
+        except attendance_token.InvalidToken:
+            pass
+    return None
+
+
+def _counting_download(bot):
+    """Скачивание фото с учетом байтов: их нет у отметки по ссылке"""
+    async def download(file_id):
+        photo_file = await bot.download_file_by_id(file_id)
+        metrics.inc("bot_checkin_download_bytes_total", photo_file.getbuffer().nbytes, path=PHOTO)
+        return photo_file
+    return download
+
+
+class CheckinPipeline:
+    """
+    Конвейер отметки посещаемости для пика, когда вся лекция отмечается за одну
+    минуту. Обработчик только ставит отметку в очередь, дальше она проходит этапы
+    со своими воркерами и ограниченными очередями между ними:
+    скачивание фото -> распознавание в пуле процессов -> проверка токена и группы
+    (в памяти) -> запись в БД пачками, одной транзакцией на пачку -> ответ.
+    Отметка по ссылке начинается сразу с проверки.
+    Допуск: если в работе уже max_pending отметок, новая сразу отклоняется;
+    если больше ack_threshold, студент сразу получает "принято", а итог
+    отметки потом заменяет это сообщение.
+    Пока конвейер не запущен (или уже остановлен), отметка проходит те же
+    этапы по очереди прямо в обработчике
+    """
+
+    def __init__(self, max_pending=CHECKIN_MAX_PENDING, ack_threshold=CHECKIN_ACK_THRESHOLD,
+                 queue_size=CHECKIN_STAGE_QUEUE_SIZE, download_workers=CHECKIN_DOWNLOAD_WORKERS, decode_workers=None,
+                 validate_workers=CHECKIN_VALIDATE_WORKERS, reply_workers=CHECKIN_REPLY_WORKERS,
+                 batch_size=CHECKIN_COMMIT_BATCH_SIZE, decoder=qr_decoder):
+        self.max_pending = max_pending
+        self.ack_threshold = ack_threshold
+        self.queue_size = queue_size
+        self.download_workers = download_workers
+        # По умолчанию вдвое больше процессов пула: пока один воркер ждет результат, следующее фото уже передается
+        self.decode_workers = decode_workers or decoder.workers * 2
+        self.validate_workers = validate_workers
+        self.reply_workers = reply_workers
+        self.batch_size = batch_size
+        self.decoder = decoder
+        self.in_flight = 0
+        self._queues = None
+        self._task = None
+        self._idle = None
+
+    def start(self):
+        """Запускает воркеры этапов фоновой задачей"""
+        # Входные очереди вмещают все допущенные отметки, поэтому постановка в них не ждет;
+        # остальные ограничены и придерживают предыдущий этап, если следующий не успевает
+        self._queues = {
+            stage: asyncio.Queue(self.max_pending if stage in (DOWNLOAD, VALIDATE) else self.queue_size)
+            for stage in STAGES
+        }
+        self._idle = asyncio.Event()
+        if not self.in_flight:
+            self._idle.set()
+        self._task = shutdown.spawn(self._run(), "checkin_pipeline")
+
+    def is_running(self):
+        return self._task is not None and not self._task.done()
+
+    async def stop(self):
+        """Дожидается ответа на все начатые отметки и останавливает воркеры (в боте это делает shutdown)"""
+        if self.is_running():
+            await self._idle.wait()
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _run(self):
+        workers = [
+            *(self._worker(DOWNLOAD) for _ in range(self.download_workers)),
+            *(self._worker(DECODE) for _ in range(self.decode_workers)),
+            *(self._worker(VALIDATE) for _ in range(self.validate_workers)),
+            self._committer(),
+            *(self._worker(REPLY) for _ in range(self.reply_workers)),
+        ]
+        tasks = [asyncio.ensure_future(worker) for worker in workers]
+        try:
+            await shutdown.wait_closing(None)
+            # Новые отметки больше не принимаются: доводим начатые до ответа
+            await self._idle.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def submit_photo(self, message):
+        """Принимает фото QR-кода на отметку"""
+        job = CheckinJob(PHOTO, message)
+        if not await self._admit(job):
+            return
+        # Повторно отправленное фото не скачиваем и не распознаем заново
+        payloads = decode_cache.get(message.photo[-1].file_unique_id)
+        if payloads is None:
+            await self._enter(job, DOWNLOAD)
+        else:
+            job.text = payloads[0].decode('utf-8', errors='replace') if payloads else None
+            await self._enter(job, VALIDATE)
+
+    async def submit_link(self, message, payload):
+        """Принимает отметку по ссылке из QR-кода (параметр /start)"""
+        job = CheckinJob(LINK, message, payload)
+        if await self._admit(job):
+            await self._enter(job, VALIDATE)
+
+    async def _admit(self, job):
+        """Контроль допуска. Returns: False, если отметка отклонена"""
+        if self.in_flight >= self.max_pending:
+            metrics.inc("bot_checkin_admission_total", result="rejected")
+            metrics.inc("bot_checkin_total", path=job.path, status="ERROR_BUSY")
+            await job.message.answer(ATTENDANCE_MESSAGES["decoder_busy"])
+            return False
+
+        self.in_flight += 1
+        metrics.gauge_set("bot_checkin_in_flight", self.in_flight)
+        if self._idle is not None:
+            self._idle.clear()
+        if self.in_flight > self.ack_threshold:
+            # Итог придет не скоро: сразу сообщаем, что отметка принята
+            metrics.inc("bot_checkin_admission_total", result="acknowledged")
+            job.ack = asyncio.ensure_future(job.message.answer(ATTENDANCE_MESSAGES["checkin_received"]))
+        else:
+            metrics.inc("bot_checkin_admission_total", result="accepted")
+        return True
+
+    async def _enter(self, job, stage):
+        if self.is_running():
+            await self._put(stage, job)
+        else:
+            await self.process(job, stage)
+
+    async def _put(self, stage, job):
+        queue = self._queues[stage]
+        await queue.put(job)
+        metrics.gauge_set("bot_checkin_queue", queue.qsize(), stage=stage)
+
+    async def _handle(self, stage, job):
+        """Выполняет этап для одной отметки. Returns: следующий этап"""
+        started = time.perf_counter()
+        try:
+            if stage == DOWNLOAD:
+                return await self._download(job)
+            if stage == DECODE:
+                return await self._decode(job)
+            if stage == VALIDATE:
+                return await self._validate(job)
+            if stage == COMMIT:
+                await self._commit([job])
+                return REPLY
+        except Exception as e:
+            logger.error(f"Ошибка отметки посещаемости на этапе {stage}: {e}")
+            if job.path == PHOTO:
+                job.finish("ERROR_PHOTO", "photo_error")
+            else:
+                job.finish("ERROR_INTERNAL", "attendance_error")
+            return REPLY
+        finally:
+            metrics.observe("bot_checkin_stage_seconds", time.perf_counter() - started, stage=stage)
+
+    async def process(self, job, stage=DOWNLOAD):
+        """Проводит отметку через все этапы по очереди в текущей задаче"""
+        while stage != REPLY:
+            stage = await self._handle(stage, job)
+        await self._reply(job)
+
+    async def _worker(self, stage):
+        queue = self._queues[stage]
+        while True:
+            job = await queue.get()
+            metrics.gauge_set("bot_checkin_queue", queue.qsize(), stage=stage)
+            try:
+                if stage == REPLY:
+                    await self._reply(job)
+                else:
+                    await self._put(await self._handle(stage, job), job)
+            finally:
+                # Отметка уже в очереди следующего этапа, поэтому join() этапа означает, что он пуст
+                queue.task_done()
+
+    async def _committer(self):
+        """
+        Групповая запись: пока идет одна транзакция, следующие отметки копятся
+        в очереди и записываются следующей пачкой. При малой нагрузке пачка из
+        одной отметки уходит сразу, без ожидания
+        """
+        queue = self._queues[COMMIT]
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < self.batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            metrics.gauge_set("bot_checkin_queue", queue.qsize(), stage=COMMIT)
+            started = time.perf_counter()
+            try:
+                await self._commit(batch)
+            except Exception as e:
+                logger.error(f"Ошибка записи пачки отметок ({len(batch)}): {e}")
+                for job in batch:
+                    job.finish("ERROR_INTERNAL", "attendance_error")
+            metrics.observe("bot_checkin_stage_seconds", time.perf_counter() - started, stage=COMMIT)
+            try:
+                for job in batch:
+                    await self._put(REPLY, job)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _download(self, job):
+        size = resolution_ladder(job.message.photo)[0]
+        job.photo = await _counting_download(job.message.bot)(size.file_id)
+        return DECODE
+
+    async def _decode(self, job):
+        photo = job.message.photo
+        try:
+            # Первый размер уже скачан; полный размер decode_photo докачает сам, если код не найден
+            payloads = await self.decoder.decode_photo(photo, _counting_download(job.message.bot), first=job.photo)
+        except DecoderBusy:
+            job.finish("ERROR_BUSY", "decoder_busy")
+            return REPLY
+        except asyncio.TimeoutError:
+            logger.warning(f"Распознавание фото от {job.message.from_user.id} не уложилось в отведенное время")
+            job.finish("ERROR_PHOTO", "photo_error")
+            return REPLY
+        finally:
+            job.photo = None
+        decode_cache.put(photo[-1].file_unique_id, payloads, _session_tag(payloads))
+        # Берем первый найденный QR-код
+        job.text = payloads[0].decode('utf-8', errors='replace') if payloads else None
+        return VALIDATE
+
+    async def _validate(self, job):
+        job.finish(*await evaluate(job.message.from_user.id, job.text))
+        return COMMIT if job.record is not None else REPLY
+
+    async def _commit(self, batch):
+        saved = await db.add_attendance_records([job.record for job in batch])
+        for job, ok in zip(batch, saved):
+            if not ok:
+                # Повторную отметку в той же сессии отклонил уникальный индекс
+                job.finish("ERROR_DUPLICATE", "already_checked")
+            elif job.status == "PRESENT":
+                student_id, session_id = job.record[0], job.record[6]
+                attendance_sessions.mark_present(session_id, student_id)
+        metrics.observe("bot_checkin_commit_batch", len(batch), buckets=BATCH_BUCKETS)
+
+    async def _reply(self, job):
+        text = ATTENDANCE_MESSAGES[job.reply]
+        try:
+            ack = None
+            if job.ack is not None:
+                try:
+                    ack = await job.ack
+                except TelegramAPIError:
+                    # "Принято" не дошло: итог отправим новым сообщением
+                    pass
+            if ack is not None:
+                await ack.edit_text(text)
+            else:
+                await job.message.answer(text)
+        except Exception as e:
+            logger.warning(f"Не удалось ответить на отметку {job.message.from_user.id}: {e}")
+        finally:
+            self._done(job)
+
+    def _done(self, job):
+        self.in_flight -= 1
+        metrics.gauge_set("bot_checkin_in_flight", self.in_flight)
+        metrics.inc("bot_checkin_total", path=job.path, status=job.status)
+        metrics.observe("bot_checkin_seconds", time.perf_counter() - job.started, path=job.path)
+        if not self.in_flight and self._idle is not None:
+            self._idle.set()
+
+
+checkin_pipeline = CheckinPipeline()
@@ -0,0 +1,245 @@
+# checkin_benchmark.py
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from aiogram import Bot, types
+from aiogram.bot.api import TelegramAPIServer
+from aiohttp import web
+
+from localization.kz_text import ATTENDANCE_MESSAGES
+from modules import metrics
+
+# Задержка ответа Bot API и скорость скачивания файлов (байт в секунду)
+API_LATENCY = 0.05
+DOWNLOAD_RATE = 2 * 1024 * 1024
+BOT_USERNAME = "attendance_bench_bot"
+# ID студентов в замере: 1000001, 1000002...
+STUDENT_ID_BASE = 1000000
+
+
+class FakeBotAPI:
+    """
+    Поддельный Bot API на aiohttp: отвечает с задержкой API_LATENCY, отдает
+    фото со скоростью DOWNLOAD_RATE и запоминает, когда каждый чат получил
+    сообщения бота
+    """
+
+    def __init__(self):
+        # file_id -> содержимое файла
+        self.files = {}
+        # chat_id -> [(время, текст)]
+        self.messages = defaultdict(list)
+        self.requests = defaultdict(int)
+        self._message_id = 0
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._method)
+        app.router.add_get("/file/bot{token}/{path:.*}", self._file)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", 0).start()
+        port = self._runner.addresses[0][1]
+        return TelegramAPIServer.from_base(f"http://127.0.0.1:{port}")
+
+    async def close(self):
+        await self._runner.cleanup()
+
+    def _message(self, chat_id, text):
+        self._message_id += 1
+        self.messages[chat_id].append((time.perf_counter(), text))
+        return {
+            "message_id": self._message_id, "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"}, "text": text,
+        }
+
+    async def _method(self, request):
+        method = request.match_info["method"]
+        data = await request.post()
+        self.requests[method] += 1
+        await asyncio.sleep(API_LATENCY)
+
+        if method == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": BOT_USERNAME}
+        elif method == "getFile":
+            file_id = data["file_id"]
+            result = {
+                "file_id": file_id, "file_unique_id": file_id,
+                "file_size": len(self.files[file_id]), "file_path": f"photos/{file_id}.jpg",
+            }
+        elif method in ("sendMessage", "editMessageText"):
+            result = self._message(int(data["chat_id"]), data["text"])
+        else:
+            result = True
+        return web.json_response({"ok": True, "result": result})
+
+    async def _file(self, request):
+        content = self.files[request.match_info["path"][len("photos/"):-len(".jpg")]]
+        await asyncio.sleep(API_LATENCY + len(content) / DOWNLOAD_RATE)
+        return web.Response(body=content)
+
+
+async def _make_photo(data):
+    """Снимок QR-кода в размерах, в которых его хранит Telegram: (список PhotoSize, file_id -> JPEG)"""
+    from modules.qr_benchmark import TELEGRAM_PHOTO_SIDES, _qr_image, _photograph, _jpeg
+
+    rng = random.Random(1)
+    photo = _photograph(await _qr_image(data), rng)
+    sizes, files = [], {}
+    for side in TELEGRAM_PHOTO_SIDES:
+        copy = photo.copy()
+        copy.thumbnail((side, side))
+        file_id = f"qr_{side}"
+        sizes.append({"file_id": file_id, "file_unique_id": file_id, "width": copy.width, "height": copy.height})
+        files[file_id] = _jpeg(copy, 80)
+    return sizes, files
+
+
+def _update(student_id, run, sizes=None, text=None):
+    """Сообщение студента, как его присылает Telegram"""
+    message = {
+        "message_id": student_id, "date": int(time.time()),
+        "from": {"id": student_id, "is_bot": False, "first_name": "Student"},
+        "chat": {"id": student_id, "type": "private"},
+    }
+    if sizes is not None:
+        # У каждого фото свой file_unique_id, иначе сработал бы кэш распознавания
+        message["photo"] = [dict(size, file_unique_id=f"{run}_{student_id}_{size['width']}") for size in sizes]
+    if text is not None:
+        message["text"] = text
+    return types.Message.to_object(message)
+
+
+def _commits():
+    """Сколько транзакций записи отметок уже выполнено"""
+    return sum(entry["count"] for entry in metrics.snapshot("bot_checkin_commit_batch").values())
+
+
+async def _scenario(api, pipeline, path, checkins, run):
+    from modules import attendance_sessions, attendance_token
+    from modules.qr_benchmark import percentile, _probe_lag
+
+    # Все студенты фотографируют один и тот же QR-код новой сессии
+    session = await attendance_sessions.create(1, f"Бенчмарк {run}", 1)
+    token = attendance_token.issue(session.id, session.group_id, session.expires_at)
+    link = attendance_token.deep_link(BOT_USERNAME, token)
+    payload = link.split("start=")[1]
+    sizes, api.files = await _make_photo(link) if path == "photo" else (None, {})
+    students = range(STUDENT_ID_BASE + 1, STUDENT_ID_BASE + checkins + 1)
+    api.messages.clear()
+    api.requests.clear()
+    commits = _commits()
+
+    async def check_in(student_id):
+        # Каждое обновление aiogram обрабатывает в своей задаче
+        if path == "photo":
+            await pipeline.submit_photo(_update(student_id, run, sizes=sizes))
+        else:
+            await pipeline.submit_link(_update(student_id, run, text=f"/start {payload}"), payload)
+
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(_probe_lag(stop))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(check_in(student_id) for student_id in students))
+    await pipeline.stop()
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    first, final = [], []
+    outcomes = defaultdict(int)
+    for student_id in students:
+        messages = api.messages[student_id]
+        first.append(messages[0][0] - started)
+        final.append(messages[-1][0] - started)
+        outcomes[messages[-1][1]] += 1
+
+    return {
+        "throughput": outcomes[ATTENDANCE_MESSAGES["attendance_saved"]] / elapsed,
+        "first_p50": percentile(first, 0.5), "first_p99": percentile(first, 0.99),
+        "final_p50": percentile(final, 0.5), "final_p99": percentile(final, 0.99),
+        "saved": outcomes[ATTENDANCE_MESSAGES["attendance_saved"]],
+        "rejected": outcomes[ATTENDANCE_MESSAGES["decoder_busy"]],
+        "commits": _commits() - commits,
+        "requests": api.requests["sendMessage"] + api.requests["editMessageText"],
+        "loop_lag": await lag,
+    }
+
+
+async def _benchmark(checkins, workers):
+    import aiosqlite
+    from database.db import db
+    from modules.checkin import CheckinPipeline
+    from modules.qr_decoder import QRDecoder
+
+    # Отдельная временная БД с группой из checkins студентов
+    directory = tempfile.mkdtemp(prefix="checkin_benchmark_")
+    db.db_path = os.path.join(directory, "benchmark.db")
+    await db.init()
+    await db.add_group("BENCH", 1)
+    async with aiosqlite.connect(db.db_path) as connection:
+        await connection.executemany(
+            "INSERT INTO users (telegram_id, full_name, role, group_code, status) VALUES (?, ?, 'student', 'BENCH', 'approved')",
+            [(STUDENT_ID_BASE + i, f"Студент {i}") for i in range(1, checkins + 1)]
+        )
+        await connection.commit()
+
+    api = FakeBotAPI()
+    bot = Bot(token="1:benchmark", server=await api.start())
+    Bot.set_current(bot)
+    decoder = QRDecoder(workers=workers)
+    await decoder.start()
+
+    results = []
+    try:
+        run = 0
+        for path in ("photo", "link"):
+            for mode in ("в обработчике", "конвейер"):
+                run += 1
+                if mode == "конвейер":
+                    pipeline = CheckinPipeline(decoder=decoder)
+                    pipeline.start()
+                else:
+                    # Прежнее поведение: все этапы в задаче обработчика, без допуска и "принято"
+                    pipeline = CheckinPipeline(max_pending=checkins, ack_threshold=checkins, decoder=decoder)
+                results.append((path, mode, await _scenario(api, pipeline, path, checkins, run)))
+    finally:
+        decoder.close()
+        await (await bot.get_session()).close()
+        await api.close()
+    return results
+
+
+def run_checkin_benchmark(checkins=500, workers=None):
+    """
+    Одновременные отметки посещаемости против поддельного Bot API:
+    все этапы в обработчике против конвейера с очередями, по фото и по ссылке
+    """
+    from config import QR_DECODE_WORKERS
+
+    workers = workers or QR_DECODE_WORKERS
+    results = asyncio.run(_benchmark(checkins, workers))
+
+    print(
+        f"Одновременных отметок: {checkins}, процессов распознавания: {workers}, "
+        f"задержка Bot API: {API_LATENCY * 1000:.0f} ms (лимит исходящих сообщений не применяется)"
+    )
+    print(
+        f"  {'путь':<6} {'режим':<14} {'отмечено/с':>10} {'1-й ответ p50/p99, с':>21} {'итог p50/p99, с':>16} "
+        f"{'отмечено':>9} {'отказ':>6} {'транзакций':>11} {'сообщений':>10} {'задержка цикла, ms':>19}"
+    )
+    for path, mode, result in results:
+        print(
+            f"  {path:<6} {mode:<14} {result['throughput']:10.1f} "
+            f"{result['first_p50']:10.2f} /{result['first_p99']:7.2f}   "
+            f"{result['final_p50']:7.2f} /{result['final_p99']:6.2f} "
+            f"{result['saved']:9} {result['rejected']:6} {result['commits']:11} {result['requests']:10} "
+            f"{result['loop_lag'] * 1000:19.1f}"
+        )
+    return 0
@@ -0,0 +1,105 @@
+# coalescer.py
+import asyncio
+import logging
+from collections import defaultdict
+
+from database.db import db
+from localization.kz_text import NOTIFICATION_MESSAGES, NOTIFICATION_TYPES
+from modules import metrics, quiet_hours
+from modules.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Coalescer:
+    """
+    Объединяет уведомления одного типа для пользователя в дайджест.
+    Уведомления сразу записываются в notification_outbox в состоянии 'coalescing'
+    с концом окна в next_attempt_at, поэтому падение процесса их не теряет.
+    Окно открывается первым уведомлением для ключа (пользователь, тип), и все,
+    что накопилось по ключу к его концу, воркер очереди отправки сливает
+    в одно сообщение и одну запись во входящих (см. merge_due).
+    Задержка любого уведомления не больше window секунд.
+    """
+
+    def __init__(self, window):
+        """
+        Args:
+            window (float): Длина окна в секундах
+        """
+        self.window = window
+        self._timer = None
+
+    def schedule(self, delay=None):
+        """Будит воркер очереди отправки к концу окна (по умолчанию - окна, открытого сейчас)"""
+        loop = asyncio.get_running_loop()
+        when = loop.time() + (self.window if delay is None else max(0.0, delay))
+        if self._timer is not None and self._timer.when() <= when:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = loop.call_at(when, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        outbox.wake()
+
+    @staticmethod
+    def _digest(rows):
+        """
+        Дайджест из уведомлений одного типа
+        Returns:
+            tuple: (текст для входящих, текст сообщения с префиксом типа)
+        """
+        notification_type = rows[0]["notification_type"]
+        type_prefix = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["general"])
+        message_text = "\n\n".join(
+            [NOTIFICATION_MESSAGES["digest_header"].format(count=len(rows))] + [row["message"] for row in rows]
+        )
+        return message_text, f"{type_prefix} {message_text}"
+
+    async def merge_due(self):
+        """
+        Сливает строки, окно которых закончилось, в дайджесты и ставит их в очередь.
+        Вызывается воркером очереди отправки перед выборкой каждой пачки
+        Returns:
+            int: Сколько сообщений поставлено в очередь
+        """
+        windows = defaultdict(list)
+        for row in await db.get_coalescing_outbox():
+            windows[(row["user_id"], row["notification_type"])].append(row)
+        if not windows:
+            return 0
+
+        due = []
+        next_deadline = None
+        for rows in windows.values():
+            # Окно ключа открыла его самая ранняя строка
+            remaining = min(row["remaining"] for row in rows)
+            if remaining > 0:
+                next_deadline = remaining if next_deadline is None else min(next_deadline, remaining)
+            else:
+                due.append(rows)
+
+        if due:
+            # Получателям, у которых сейчас тихие часы, дайджест уйдет после их окончания
+            deliver_at = quiet_hours.deliver_at([rows[0]["user_id"] for rows in due])
+            merges = [
+                (
+                    rows[0]["id"],
+                    rows[0]["notification_id"],
+                    *(self._digest(rows) if len(rows) > 1 else (None, None)),
+                    deliver_at.get(rows[0]["user_id"]),
+                    [(row["id"], row["job_id"], row["notification_id"]) for row in rows[1:]],
+                )
+                for rows in due
+            ]
+            await db.merge_coalesced_outbox(merges)
+            quiet_hours.deferred.push(
+                (merge[0], merge[4]) for merge in merges if merge[4]
+            )
+            metrics.inc("bot_notifications_coalesced_total", sum(len(rows) - 1 for rows in due))
+
+        if next_deadline is not None:
+            self.schedule(next_deadline)
+        return len(due)
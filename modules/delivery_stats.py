@@ -0,0 +1,82 @@
+# delivery_stats.py
+from aiogram import types
+
+from config import ADMIN_IDS
+from database.db import db
+from localization.kz_text import DELIVERY_STATS_MESSAGES, NOTIFICATION_TYPES
+
+# Сколько последних рассылок показывать
+RECENT_JOBS_LIMIT = 5
+
+
+def _average_latency(row):
+    return row["latency_ms_total"] // row["sent"] if row["sent"] else 0
+
+
+def format_job(job):
+    """Строки статистики одной рассылки"""
+    if job["kind"] == "announcement":
+        title = DELIVERY_STATS_MESSAGES["announcement"]
+    else:
+        title = NOTIFICATION_TYPES.get(job["kind"], NOTIFICATION_TYPES["general"])
+    if job["group_code"]:
+        title += f" · {job['group_code']}"
+
+    lines = [
+        f"#{job['id']} {title} · {job['created_at'][:16]}",
+        DELIVERY_STATS_MESSAGES["outcomes"].format(
+            sent=job["sent"], total=job["total"], blocked=job["blocked"],
+            failed=job["failed"], skipped=job["skipped"]
+        ),
+    ]
+    if job["sent"]:
+        # Пропускная способность: доставленные сообщения за время от создания до последней квитанции
+        duration = job["duration"] or 0
+        rate = job["sent"] / duration if duration > 0 else 0
+        lines.append(DELIVERY_STATS_MESSAGES["latency"].format(
+            average=_average_latency(job), max=job["latency_ms_max"], rate=rate
+        ))
+    return "\n".join(lines)
+
+
+def format_group(row):
+    """Строка суммарной статистики группы"""
+    return DELIVERY_STATS_MESSAGES["group_line"].format(
+        group_code=row["group_code"], jobs=row["jobs"], sent=row["sent"], total=row["total"],
+        blocked=row["blocked"], failed=row["failed"], average=_average_latency(row)
+    )
+
+
+# Обработчик команды /delivery_stats
+async def cmd_delivery_stats(message: types.Message):
+    user = await db.get_user(message.from_user.id)
+    is_admin = message.from_user.id in ADMIN_IDS
+    is_teacher = user and user["role"] == "teacher" and user["status"] == "approved"
+
+    if not (is_admin or is_teacher):
+        await message.answer(DELIVERY_STATS_MESSAGES["no_access"])
+        return
+
+    # Администратор видит все рассылки, преподаватель - по своим группам и свои объявления
+    if is_admin:
+        jobs = await db.get_delivery_jobs(limit=RECENT_JOBS_LIMIT)
+        groups = await db.get_delivery_stats_by_group()
+    else:
+        group_codes = [code for _, code in await db.get_groups_for_teacher(message.from_user.id)]
+        jobs = await db.get_delivery_jobs(group_codes, message.from_user.id, RECENT_JOBS_LIMIT)
+        groups = await db.get_delivery_stats_by_group(group_codes)
+
+    if not jobs:
+        await message.answer(DELIVERY_STATS_MESSAGES["no_jobs"])
+        return
+
+    parts = [DELIVERY_STATS_MESSAGES["recent_jobs"]]
+    parts.extend(format_job(job) for job in jobs)
+    if groups:
+        parts.append(DELIVERY_STATS_MESSAGES["by_group"] + "\n" + "\n".join(format_group(row) for row in groups))
+
+    await message.answer("\n\n".join(parts))
+
+# Регистрация обработчиков в диспетчере
+def register_handlers(dp):
+    dp.register_message_handler(cmd_delivery_stats, commands=["delivery_stats"])
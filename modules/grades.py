@@ -10,6 +10,8 @@ from config import SUBJECTS
 from localization.kz_text import GRADES_MESSAGES, BUTTONS, GRADE_EMOJIS
 from modules.notifications import send_personal_notification
 from modules.keyboards import get_student_keyboard, get_teacher_keyboard
+from modules.throttling import rate_limit
+from modules import callbacks
 
 # Определение состояний для FSM
 class GradeStates(StatesGroup):
@@ -248,6 +250,7 @@ async def process_grades_action(message: types.Message, state: FSMContext):
         await GradeStates.select_group.set()
 
 # Обработчик выбора группы для выставления оценок
+@rate_limit(1, burst=3)
 async def process_select_group(message: types.Message, state: FSMContext):
     group_code = message.text.strip()
     
@@ -279,7 +282,7 @@ async def process_select_group(message: types.Message, state: FSMContext):
     keyboard = InlineKeyboardMarkup(row_width=1)
     for student in students:
         button_text = f"{student['full_name']}"
-        callback_data = f"grade_student_{student['telegram_id']}"
+        callback_data = callbacks.pack(callbacks.GRADE_STUDENT, student['telegram_id'])
         keyboard.add(InlineKeyboardButton(button_text, callback_data=callback_data))
     
     # Сохраняем выбранную группу в состоянии
@@ -292,10 +295,7 @@ async def process_select_group(message: types.Message, state: FSMContext):
     await GradeStates.select_student.set()
 
 # Обработчик выбора студента для выставления оценки
-async def process_select_student(callback_query: types.CallbackQuery, state: FSMContext):
-    # Извлекаем ID студента из callback_data
-    student_id = int(callback_query.data.split("_")[2])
-    
+async def process_select_student(callback_query: types.CallbackQuery, state: FSMContext, student_id):
     # Получаем информацию о студенте
     student = await db.get_user(student_id)
     
@@ -397,11 +397,14 @@ async def process_input_comment(message: types.Message, state: FSMContext):
     subject = data["subject"]
     grade = data["grade"]
     
+    # Сбрасываем состояние сразу, чтобы повторная отправка комментария не выставила оценку еще раз
+    await state.finish()
+    
     # Текущая дата в формате ДД.ММ.ГГГГ
     today = datetime.now().strftime("%d.%m.%Y")
     
     # Выставляем оценку
-    await db.add_grade(student_id, subject, today, grade, comment)
+    grade_id = await db.add_grade(student_id, subject, today, grade, comment)
     
     keyboard = get_teacher_keyboard()
     
@@ -423,28 +426,27 @@ async def process_input_comment(message: types.Message, state: FSMContext):
         grade=grade
     ) + (f"\nТүсініктеме: {comment}" if comment else "")
     
-    # Используем функцию отправки персонального уведомления с типом "grade"
+    # Используем функцию отправки персонального уведомления с типом "grade";
+    # ключ - ID выставленной оценки
     notification_sent = await send_personal_notification(
         message.bot,
         student_id,
         notification_text,
-        notification_type="grade"
+        notification_type="grade",
+        dedup_key=f"grade:{grade_id}"
     )
     
     if not notification_sent:
         await message.answer(GRADES_MESSAGES["notification_failed"])
-    
-    # Сбрасываем состояние
-    await state.finish()
 
 # Регистрация обработчиков в диспетчере
 def register_handlers(dp):
     dp.register_message_handler(cmd_grades, commands=["grades"], state="*")
     dp.register_message_handler(process_grades_action, state=GradeStates.waiting_for_action)
     dp.register_message_handler(process_select_group, state=GradeStates.select_group)
-    dp.register_callback_query_handler(
+    callbacks.router.register(
+        callbacks.GRADE_STUDENT,
         process_select_student,
-        lambda c: c.data.startswith("grade_student_"),
         state=GradeStates.select_student
     )
     dp.register_message_handler(process_select_subject, state=GradeStates.select_subject)
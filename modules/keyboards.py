@@ -1,5 +1,5 @@
 # keyboards.py
-from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from localization.kz_text import BUTTONS
 
 def get_student_keyboard():
@@ -26,6 +26,21 @@ def get_teacher_keyboard():
     keyboard.add(KeyboardButton(BUTTONS["manage_groups"]), KeyboardButton(BUTTONS["create_qr"]))
     return keyboard
 
+def get_menu_keyboard(role):
+    """
+    Возвращает клавиатуру меню для роли пользователя
+    Args:
+        role (str): Роль подтвержденного пользователя или None
+    Returns:
+        ReplyKeyboardMarkup: Клавиатура студента или преподавателя; для остальных
+        (например, администратора без профиля) - ReplyKeyboardRemove
+    """
+    if role == "student":
+        return get_student_keyboard()
+    if role == "teacher":
+        return get_teacher_keyboard()
+    return ReplyKeyboardRemove()
+
 # Словарь соответствия текстовых команд и команд бота
 BUTTON_COMMANDS = {
     BUTTONS["schedule"]: "/schedule",
@@ -0,0 +1,210 @@
+# live_qr.py
+import asyncio
+import io
+import logging
+import time
+
+from aiogram import types
+from aiogram.utils.exceptions import MessageNotModified, RetryAfter, TelegramAPIError
+
+from config import QR_CODE_VALIDITY_MINUTES, QR_ROTATION_SECONDS, QR_ROTATION_GRACE, LIVE_COUNTER_INTERVAL
+from localization.kz_text import ATTENDANCE_MESSAGES
+from modules import attendance_token, metrics, shutdown
+
+logger = logging.getLogger(__name__)
+
+# Размер модуля QR-кода в пикселях и ширина белого поля в модулях
+QR_BOX_SIZE = 10
+QR_BORDER = 4
+# Фиксированная маска: подбор лучшей из восьми масок - самая дорогая часть построения QR-кода,
+# а любая маска допустима по стандарту и распознается одинаково
+QR_MASK_PATTERN = 0
+
+
+def render_qr(data):
+    """
+    Рисует QR-код в PNG: матрица модулей переводится в изображение напрямую,
+    без отрисовки каждого модуля средствами qrcode
+    Args:
+        data (str): Данные для QR-кода
+    Returns:
+        bytes: Содержимое PNG-файла
+    """
+    import qrcode
+    from PIL import Image
+
+    qr = qrcode.QRCode(
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=QR_BORDER,
+        mask_pattern=QR_MASK_PATTERN,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    matrix = qr.get_matrix()
+    size = len(matrix)
+    pixels = bytes(0 if module else 255 for row in matrix for module in row)
+    image = Image.frombytes("L", (size, size), pixels)
+    image = image.resize((size * QR_BOX_SIZE, size * QR_BOX_SIZE), Image.NEAREST).convert("1")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def render_qr_async(data):
+    """render_qr в пуле потоков, чтобы не задерживать цикл событий"""
+    return await asyncio.get_running_loop().run_in_executor(None, render_qr, data)
+
+
+# Живые QR-коды: ID сессии -> LiveQR
+_live = {}
+
+
+class LiveQR:
+    """
+    Живой QR-код сессии: каждые interval секунд сообщение преподавателя
+    заменяется новым QR-кодом (edit_message_media). Токен каждого кода
+    действует только до конца своего окна плюс grace секунд на отправку фото,
+    поэтому пересланный скриншот быстро перестает работать.
+    Код следующего окна рисуется заранее, пока действует текущий.
+    При interval=0 код один на всю сессию.
+    В подписи - счетчик "отметились X / Y" из состояния сессии в памяти.
+    Подпись меняется не чаще раза в counter_interval секунд, сколько бы
+    отметок ни пришло: все отметки за это время попадают в одно изменение,
+    а смена кода обновляет и счетчик
+    """
+
+    def __init__(self, bot, session, chat_id, interval=QR_ROTATION_SECONDS, grace=QR_ROTATION_GRACE,
+                 counter_interval=LIVE_COUNTER_INTERVAL):
+        self.bot = bot
+        self.session = session
+        self.chat_id = chat_id
+        self.interval = interval
+        self.grace = grace
+        self.counter_interval = counter_interval
+        self.message_id = None
+        self.started_at = None
+        self.bot_username = None
+        # Счетчик, который сейчас показан в подписи
+        self.shown_counter = None
+
+    def _window_token(self, window):
+        """
+        Ссылка с токеном окна window: токен действует до конца окна плюс grace, но не дольше сессии
+        """
+        if self.interval:
+            window_end = self.started_at + (window + 1) * self.interval
+            expires_at = min(int(window_end) + self.grace, self.session.expires_at)
+        else:
+            expires_at = self.session.expires_at
+        token = attendance_token.issue(self.session.id, self.session.group_id, expires_at)
+        return attendance_token.deep_link(self.bot_username, token)
+
+    def counter(self):
+        return len(self.session.present), len(self.session.students)
+
+    def caption(self, header=None):
+        """Подпись с текущим счетчиком; запоминает показанный счетчик"""
+        if header is None:
+            if self.interval:
+                header = ATTENDANCE_MESSAGES["qr_live"].format(seconds=self.interval, minutes=QR_CODE_VALIDITY_MINUTES)
+            else:
+                header = ATTENDANCE_MESSAGES["qr_generated"].format(minutes=QR_CODE_VALIDITY_MINUTES)
+        self.shown_counter = self.counter()
+        present, total = self.shown_counter
+        return header + "\n\n" + ATTENDANCE_MESSAGES["qr_counter"].format(present=present, total=total)
+
+    async def send(self, message):
+        """Отправляет первый QR-код в ответ на message и запускает обновление"""
+        self.started_at = time.time()
+        self.bot_username = (await self.bot.me).username
+        photo = await render_qr_async(self._window_token(0))
+        sent = await message.answer_photo(types.InputFile(io.BytesIO(photo), filename="qr.png"), caption=self.caption())
+        self.message_id = sent.message_id
+        _live[self.session.id] = self
+        shutdown.spawn(self.run(), f"live_qr_{self.session.id}")
+
+    async def _edit(self, photo=None, header=None):
+        """
+        Заменяет QR-код в сообщении (или только подпись, если photo=None)
+        Returns:
+            bool: True - сообщение обновлено; False - сообщение больше нельзя менять;
+                  None - Telegram попросил подождать: после паузы сообщение не меняется,
+                  потому что за это время код мог устареть, и повтор решает run()
+        """
+        try:
+            if photo is None:
+                await self.bot.edit_message_caption(
+                    chat_id=self.chat_id, message_id=self.message_id, caption=self.caption(header)
+                )
+                metrics.inc("bot_live_qr_edits_total", kind="caption")
+            else:
+                media = types.InputMediaPhoto(
+                    types.InputFile(io.BytesIO(photo), filename="qr.png"), caption=self.caption(header)
+                )
+                await self.bot.edit_message_media(media, chat_id=self.chat_id, message_id=self.message_id)
+                metrics.inc("bot_live_qr_edits_total", kind="media")
+            return True
+        except MessageNotModified:
+            return True
+        except RetryAfter as e:
+            # Превышен лимит Telegram: ждем, но не отправляем заготовленный код.
+            # Счетчик в подпись не попал, поэтому run() его снова покажет
+            self.shown_counter = None
+            if await shutdown.wait_closing(e.timeout):
+                return False
+            return None
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось обновить QR-код сессии {self.session.id}: {e}")
+            return False
+
+    def _next_rotation(self, window):
+        if not self.interval:
+            return self.session.expires_at
+        return self.started_at + window * self.interval
+
+    async def run(self):
+        window = 1
+        next_photo = await render_qr_async(self._window_token(window)) if self.interval else None
+        last_edit = time.time()
+        try:
+            while not self.session.is_expired():
+                # Просыпаемся к смене кода или, если счетчик изменился, к ближайшему разрешенному изменению подписи
+                wake_at = min(self._next_rotation(window), self.session.expires_at + 1)
+                if self.counter() != self.shown_counter:
+                    wake_at = min(wake_at, last_edit + self.counter_interval)
+                else:
+                    wake_at = min(wake_at, time.time() + self.counter_interval)
+                if await shutdown.wait_closing(max(0.0, wake_at - time.time())):
+                    return
+                if self.session.is_expired():
+                    break
+
+                if self.interval and time.time() >= self._next_rotation(window):
+                    current = int((time.time() - self.started_at) // self.interval)
+                    if current != window:
+                        # Опоздали (например, из-за RetryAfter): заготовленный код уже устарел
+                        window = current
+                        next_photo = await render_qr_async(self._window_token(window))
+                    edited = await self._edit(next_photo)
+                    if edited is None:
+                        # После паузы заново проверяем окно и при необходимости рисуем новый код
+                        continue
+                    if not edited:
+                        break
+                    last_edit = time.time()
+                    window = int((time.time() - self.started_at) // self.interval) + 1
+                    next_photo = await render_qr_async(self._window_token(window))
+                elif self.counter() != self.shown_counter and time.time() >= last_edit + self.counter_interval:
+                    edited = await self._edit()
+                    if edited is False:
+                        break
+                    if edited:
+                        last_edit = time.time()
+
+            # Сессия закончилась: последний код перестанет действовать сам, в подписи остается итог
+            while await self._edit(header=ATTENDANCE_MESSAGES["qr_session_ended"]) is None:
+                pass
+        finally:
+            _live.pop(self.session.id, None)
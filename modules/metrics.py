@@ -0,0 +1,203 @@
+# metrics.py
+import bisect
+import logging
+import sys
+import time
+from contextvars import ContextVar
+
+from aiogram import types, Dispatcher
+from aiogram.dispatcher.handler import current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм (в секундах)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как в Prometheus"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        # Последняя корзина - все, что больше самой большой границы (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Оценка квантиля линейной интерполяцией внутри корзины"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i >= len(self.buckets):
+                    return lower
+                upper = self.buckets[i]
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+# Хранилище метрик: ключ - (имя, отсортированные метки)
+_counters = {}
+_gauges = {}
+_histograms = {}
+
+# Замер текущего обработчика. Каждое обновление обрабатывается в своей задаче,
+# поэтому ContextVar не смешивает замеры параллельных обновлений
+_pending = ContextVar("metrics_pending", default=None)
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Увеличивает счетчик"""
+    key = _key(name, labels)
+    _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge_add(name, delta, **labels):
+    """Изменяет значение датчика на delta"""
+    key = _key(name, labels)
+    _gauges[key] = _gauges.get(key, 0) + delta
+
+
+def gauge_set(name, value, **labels):
+    """Устанавливает значение датчика"""
+    _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, buckets=DEFAULT_BUCKETS, **labels):
+    """Добавляет наблюдение в гистограмму"""
+    key = _key(name, labels)
+    histogram = _histograms.get(key)
+    if histogram is None:
+        histogram = _histograms[key] = Histogram(buckets)
+    histogram.observe(value)
+
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+
+def render():
+    """Формирует текст метрик в формате Prometheus"""
+    lines = []
+    for (name, labels), value in sorted(_counters.items()):
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), value in sorted(_gauges.items()):
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), histogram in sorted(_histograms.items(), key=lambda item: item[0]):
+        cumulative = 0
+        for bound, bucket_count in zip(histogram.buckets, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {histogram.count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f"{name}_quantile{_format_labels(labels, [('quantile', q)])} {histogram.quantile(q):.6f}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot(name):
+    """Возвращает p50/p95/p99 и количество наблюдений гистограммы по всем меткам"""
+    result = {}
+    for (hist_name, labels), histogram in _histograms.items():
+        if hist_name != name:
+            continue
+        result[labels] = {
+            "count": histogram.count,
+            "p50": histogram.quantile(0.5),
+            "p95": histogram.quantile(0.95),
+            "p99": histogram.quantile(0.99),
+        }
+    return result
+
+
+def handler_labels(handler):
+    """Имя обработчика и модуль, который его зарегистрировал"""
+    if handler is None:
+        return "unknown", "unknown"
+    module = (handler.__module__ or "unknown").rsplit(".", 1)[-1]
+    return handler.__name__, module
+
+
+class MetricsMiddleware(BaseMiddleware):
+    """
+    Замеряет время работы каждого обработчика, количество ошибок,
+    количество одновременно выполняемых обработчиков и задержку обновлений
+    """
+
+    async def _start(self, update_type, user_id, chat_id, data):
+        # Предыдущий обработчик мог пропустить обновление дальше (SkipHandler)
+        self._finish()
+        # Для callback-запросов настоящий обработчик выбирает CallbackRouter
+        handler, module = handler_labels(data.get("callback_handler") or current_handler.get(None))
+        state = await Dispatcher.get_current().current_state(chat=chat_id, user=user_id).get_state()
+        labels = {"handler": handler, "module": module, "state": state or "none", "type": update_type}
+        _pending.set((time.perf_counter(), labels))
+        gauge_add("bot_handlers_in_flight", 1, handler=handler, module=module)
+
+    def _finish(self):
+        measurement = _pending.get()
+        if measurement is None:
+            return
+        _pending.set(None)
+        started_at, labels = measurement
+        observe("bot_handler_latency_seconds", time.perf_counter() - started_at, **labels)
+        gauge_add("bot_handlers_in_flight", -1, handler=labels["handler"], module=labels["module"])
+        # aiogram вызывает post_process в finally до обработчиков ошибок,
+        # поэтому исключение обработчика видно здесь через sys.exc_info()
+        if sys.exc_info()[1] is not None:
+            inc("bot_handler_errors_total", **labels)
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        # Сколько обновление ждало в очереди Telegram и у нас до обработки
+        if message.date:
+            observe("bot_update_lag_seconds", max(0.0, time.time() - message.date.timestamp()), type="message")
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        await self._start("message", message.from_user.id, message.chat.id, data)
+
+    async def on_post_process_message(self, message: types.Message, results, data: dict):
+        self._finish()
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        chat_id = callback_query.message.chat.id if callback_query.message else callback_query.from_user.id
+        await self._start("callback_query", callback_query.from_user.id, chat_id, data)
+
+    async def on_post_process_callback_query(self, callback_query: types.CallbackQuery, results, data: dict):
+        self._finish()
+
+
+async def start_metrics_server(host, port):
+    """Запускает HTTP-сервер с эндпоинтом /metrics для сбора метрик"""
+    from aiohttp import web
+
+    async def metrics_view(request):
+        return web.Response(text=render(), content_type="text/plain")
+
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_view)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
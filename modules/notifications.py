@@ -1,10 +1,90 @@
 # notifications.py
+import logging
+from collections import OrderedDict
 from aiogram import types
 from aiogram.dispatcher import FSMContext
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.utils.exceptions import MessageNotModified
 
+from config import (
+    NOTIFICATION_COALESCE_SECONDS, NOTIFICATION_COALESCE_TYPES, NOTIFICATION_DEDUP_CACHE_SIZE,
+    INBOX_PAGE_SIZE, INBOX_ITEM_MAX_LENGTH
+)
 from database.db import db
 from localization.kz_text import NOTIFICATION_MESSAGES, NOTIFICATION_TYPES, SCHEDULE_NOTIFICATIONS, GROUP_MESSAGES
+from modules import callbacks, metrics, quiet_hours
+from modules.coalescer import Coalescer
+from modules.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+# Формирование одной страницы входящих
+async def render_inbox(user_id, anchor_id=None, newer=False):
+    """
+    Возвращает текст и клавиатуру страницы непрочитанных уведомлений
+    Returns:
+        tuple: (текст, клавиатура или None)
+    """
+    count = await db.count_unread_notifications(user_id)
+    if not count:
+        return NOTIFICATION_MESSAGES["no_notifications"], None
+
+    notifications, has_more = await db.get_unread_notifications_page(
+        user_id, INBOX_PAGE_SIZE, anchor_id, newer
+    )
+    if not notifications and anchor_id is not None:
+        # Листать дальше некуда (например, все уведомления страницы прочитаны) - показываем начало
+        notifications, has_more = await db.get_unread_notifications_page(user_id, INBOX_PAGE_SIZE)
+        anchor_id, newer = None, False
+
+    # Есть ли страницы в обе стороны от текущей
+    has_newer = has_more if newer else anchor_id is not None
+    has_older = True if newer else has_more
+
+    lines = [NOTIFICATION_MESSAGES["inbox_header"].format(count=count)]
+    for notification in notifications:
+        # Определяем тип уведомления для вывода соответствующей иконки
+        notification_type = notification["notification_type"] if "notification_type" in notification.keys() else "general"
+        type_prefix = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["general"])
+        text = notification["message"]
+        if len(text) > INBOX_ITEM_MAX_LENGTH:
+            text = text[:INBOX_ITEM_MAX_LENGTH] + "…"
+        lines.append(
+            f"{type_prefix} {text}\n"
+            f"{NOTIFICATION_MESSAGES['notification_from'].format(date=notification['created_at'])}"
+        )
+
+    first_id, last_id = notifications[0]["id"], notifications[-1]["id"]
+    keyboard = InlineKeyboardMarkup()
+    navigation = []
+    if has_newer:
+        navigation.append(InlineKeyboardButton(
+            NOTIFICATION_MESSAGES["newer"], callback_data=callbacks.pack(callbacks.INBOX_PAGE, 1, first_id)
+        ))
+    if has_older:
+        navigation.append(InlineKeyboardButton(
+            NOTIFICATION_MESSAGES["older"], callback_data=callbacks.pack(callbacks.INBOX_PAGE, 0, last_id)
+        ))
+    if navigation:
+        keyboard.row(*navigation)
+    keyboard.add(InlineKeyboardButton(
+        NOTIFICATION_MESSAGES["mark_page_as_read"],
+        callback_data=callbacks.pack(callbacks.INBOX_READ_PAGE, first_id, last_id)
+    ))
+    keyboard.add(InlineKeyboardButton(
+        NOTIFICATION_MESSAGES["mark_all_as_read"],
+        callback_data=callbacks.pack(callbacks.INBOX_READ_ALL)
+    ))
+
+    return "\n\n".join(lines), keyboard
+
+# Обновление страницы входящих в том же сообщении
+async def show_inbox_page(callback_query: types.CallbackQuery, anchor_id=None, newer=False):
+    text, keyboard = await render_inbox(callback_query.from_user.id, anchor_id, newer)
+    try:
+        await callback_query.message.edit_text(text, reply_markup=keyboard)
+    except MessageNotModified:
+        pass
 
 # Обработчик команды /notifications
 async def cmd_notifications(message: types.Message):
@@ -14,38 +94,30 @@ async def cmd_notifications(message: types.Message):
         await message.answer(NOTIFICATION_MESSAGES["not_registered"])
         return
     
-    # Получаем непрочитанные уведомления пользователя
-    notifications = await db.get_unread_notifications(message.from_user.id)
-    
-    if not notifications:
-        await message.answer(NOTIFICATION_MESSAGES["no_notifications"])
-        return
-    
-    # Создаем инлайн-клавиатуру с кнопками для отметки уведомлений как прочитанных
-    for notification in notifications:
-        # Определяем тип уведомления для вывода соответствующей иконки
-        notification_type = notification["notification_type"] if "notification_type" in notification.keys() else "general"
-        type_prefix = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["general"])
-        
-        # Для каждого уведомления создаем отдельное сообщение с кнопкой
-        keyboard = InlineKeyboardMarkup()
-        keyboard.add(InlineKeyboardButton(
-            NOTIFICATION_MESSAGES["mark_as_read"],
-            callback_data=f"read_notification_{notification['id']}"
-        ))
-        
-        # Отправляем уведомление с кнопкой
-        await message.answer(
-            f"{type_prefix} {notification['message']}\n\n"
-            f"{NOTIFICATION_MESSAGES['notification_from'].format(date=notification['created_at'])}",
-            reply_markup=keyboard
-        )
+    # Все непрочитанные уведомления в одном сообщении, которое дальше редактируется
+    text, keyboard = await render_inbox(message.from_user.id)
+    await message.answer(text, reply_markup=keyboard)
 
-# Обработчик нажатия на кнопку "Отметить как прочитанное"
-async def process_read_notification(callback_query: types.CallbackQuery):
-    # Извлекаем ID уведомления из callback_data
-    notification_id = int(callback_query.data.split("_")[2])
-    
+# Переход на другую страницу входящих
+async def process_inbox_page(callback_query: types.CallbackQuery, state: FSMContext, newer, anchor_id):
+    await show_inbox_page(callback_query, anchor_id, bool(newer))
+    await callback_query.answer()
+
+# Отметка страницы как прочитанной
+async def process_inbox_read_page(callback_query: types.CallbackQuery, state: FSMContext, first_id, last_id):
+    await db.mark_notifications_range_as_read(callback_query.from_user.id, first_id, last_id)
+    # Показываем следующую (более старую) страницу
+    await show_inbox_page(callback_query, last_id)
+    await callback_query.answer(NOTIFICATION_MESSAGES["marked_as_read"])
+
+# Отметка всех уведомлений как прочитанных
+async def process_inbox_read_all(callback_query: types.CallbackQuery, state: FSMContext):
+    await db.mark_all_notifications_as_read(callback_query.from_user.id)
+    await show_inbox_page(callback_query)
+    await callback_query.answer(NOTIFICATION_MESSAGES["all_marked_as_read"])
+
+# Обработчик кнопки "Отметить как прочитанное" в сообщениях, отправленных до появления постраничных входящих
+async def process_read_notification(callback_query: types.CallbackQuery, state: FSMContext, notification_id):
     # Отмечаем уведомление как прочитанное
     await db.mark_notification_as_read(notification_id)
     
@@ -59,30 +131,112 @@ async def process_read_notification(callback_query: types.CallbackQuery):
     # Отвечаем на callback
     await callback_query.answer(NOTIFICATION_MESSAGES["marked_as_read"])
 
+# Уведомления, которые объединяются в дайджесты
+coalescer = Coalescer(NOTIFICATION_COALESCE_SECONDS)
+
+# Постановка уведомления в очередь отправки
+async def _enqueue(user_ids, message_text, notification_type, dedup_key=None, group_code=None):
+    """
+    Сохраняет уведомление и ставит его в очередь
+    Args:
+        group_code (str): Группа, если это рассылка по группе (для статистики доставки)
+    """
+    # Определяем префикс уведомления
+    type_prefix = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["general"])
+    text = f"{type_prefix} {message_text}"
+
+    if NOTIFICATION_COALESCE_SECONDS > 0 and notification_type in NOTIFICATION_COALESCE_TYPES:
+        # Строки ждут в очереди конца окна, тихие часы учитываются при слиянии в дайджест
+        queued = await db.enqueue_notifications(
+            user_ids, message_text, notification_type, text, dedup_key,
+            group_code=group_code, coalesce_window=NOTIFICATION_COALESCE_SECONDS
+        )
+        coalescer.schedule()
+    else:
+        # Получателям, у которых сейчас тихие часы, сообщение уйдет после их окончания
+        deliver_at = quiet_hours.deliver_at(user_ids)
+        queued = await db.enqueue_notifications(
+            user_ids, message_text, notification_type, text, dedup_key, deliver_at, group_code
+        )
+        if deliver_at:
+            quiet_hours.deferred.push(
+                (outbox_id, deliver_at[user_id]) for outbox_id, user_id in queued if user_id in deliver_at
+            )
+        outbox.wake()
+
+    if len(queued) < len(user_ids):
+        metrics.inc("bot_notifications_deduplicated_total", len(user_ids) - len(queued), stage="database")
+    return len(queued)
+
+# Недавно поставленные в очередь (пользователь, ключ идемпотентности):
+# повторы отбрасываются без обращения к БД и Telegram
+_recent_keys = OrderedDict()
+
+def _drop_recent(user_ids, dedup_key):
+    """Убирает получателей, которым уведомление с этим ключом уже ставилось в очередь"""
+    fresh = []
+    for user_id in user_ids:
+        key = (user_id, dedup_key)
+        if key in _recent_keys:
+            _recent_keys.move_to_end(key)
+            continue
+        fresh.append(user_id)
+
+    if len(fresh) < len(user_ids):
+        metrics.inc("bot_notifications_deduplicated_total", len(user_ids) - len(fresh), stage="cache")
+    return fresh
+
+def _remember(user_ids, dedup_key):
+    """
+    Запоминает получателей уведомления с этим ключом. Вызывается только после
+    записи в БД, чтобы неудачная попытка не отбросила повтор
+    """
+    for user_id in user_ids:
+        _recent_keys[(user_id, dedup_key)] = None
+    while len(_recent_keys) > NOTIFICATION_DEDUP_CACHE_SIZE:
+        _recent_keys.popitem(last=False)
+
+async def enqueue_notification(user_ids, message_text, notification_type="general", dedup_key=None, group_code=None):
+    """
+    Сохраняет уведомление и ставит его в очередь отправки.
+    Уведомления типов из NOTIFICATION_COALESCE_TYPES ждут в очереди конца окна
+    и уходят одним дайджестом на пользователя.
+    Доставкой занимается фоновый воркер (см. modules/outbox.py)
+    Args:
+        dedup_key (str): Ключ идемпотентности события-источника, например "grade:15".
+                         Повторное уведомление с тем же ключом не сохраняется и не отправляется
+        group_code (str): Группа, если это рассылка по группе: по ней ведется статистика доставки
+    Returns:
+        int: Количество получателей
+    """
+    if dedup_key is None:
+        return await _enqueue(user_ids, message_text, notification_type, dedup_key, group_code)
+
+    user_ids = _drop_recent(user_ids, dedup_key)
+    if not user_ids:
+        return 0
+    queued = await _enqueue(user_ids, message_text, notification_type, dedup_key, group_code)
+    # Транзакция завершилась: у всех этих получателей уведомление с ключом есть в БД
+    _remember(user_ids, dedup_key)
+    return queued
+
 # Отправка уведомления всем студентам группы
-async def send_group_notification(bot, group_code, message_text, notification_type="general"):
+async def send_group_notification(bot, group_code, message_text, notification_type="general", dedup_key=None):
+    """
+    Ставит уведомление в очередь для всех студентов группы
+    Returns:
+        int: Количество студентов, которым уведомление поставлено в очередь
+    """
     # Получаем всех студентов группы
     students = await db.get_students_by_group(group_code)
-    
-    # Отправляем уведомление каждому студенту
-    for student in students:
-        try:
-            # Добавляем уведомление в базу
-            await db.add_notification(student["telegram_id"], message_text, notification_type)
-            
-            # Определяем префикс уведомления
-            type_prefix = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["general"])
-            
-            # Отправляем сообщение
-            await bot.send_message(student["telegram_id"], f"{type_prefix} {message_text}")
-        except Exception:
-            # Если не удалось отправить сообщение студенту
-            pass
-    
-    return len(students)
+    student_ids = [student["telegram_id"] for student in students]
+
+    queued = await enqueue_notification(student_ids, message_text, notification_type, dedup_key, group_code)
+    logger.info(f"Уведомление группе {group_code} для {queued} студентов")
+    return queued
 
 # Отправка уведомления об изменении расписания студентам группы
-async def send_schedule_notification(bot, group_code, change_type, weekday, time, subject):
+async def send_schedule_notification(bot, group_code, change_type, weekday, time, subject, dedup_key=None):
     message = None
     
     # Формируем сообщение в зависимости от типа изменения
@@ -109,35 +263,23 @@ async def send_schedule_notification(bot, group_code, change_type, weekday, time
         )
     
     if message:
-        # Отправляем уведомления всем студентам группы
-        return await send_group_notification(bot, group_code, message, "schedule")
+        # Ставим уведомления в очередь для всех студентов группы
+        return await send_group_notification(bot, group_code, message, "schedule", dedup_key)
     
-    return 0
+    return None
 
 # Отправка персонального уведомления студенту
-async def send_personal_notification(bot, student_id, message_text, notification_type="general"):
-    # Добавляем уведомление в базу данных в любом случае
-    try:
-        await db.add_notification(student_id, message_text, notification_type)
-    except Exception as e:
-        print(f"[ҚАТЕ] Хабарламаны дерекқорға қосу сәтсіз болды: {e}")
-        return False
-    
-    # Определяем префикс уведомления
-    type_prefix = NOTIFICATION_TYPES.get(notification_type, NOTIFICATION_TYPES["general"])
-    
-    # Пытаемся отправить сообщение
+async def send_personal_notification(bot, student_id, message_text, notification_type="general", dedup_key=None):
+    """
+    Ставит персональное уведомление в очередь отправки
+    Returns:
+        bool: True, если уведомление сохранено и будет доставлено
+    """
     try:
-        await bot.send_message(student_id, f"{type_prefix} {message_text}")
+        await enqueue_notification([student_id], message_text, notification_type, dedup_key)
         return True
     except Exception as e:
-        error_message = str(e)
-        if "bot was blocked by the user" in error_message:
-            print(f"[ҚАТЕ] Студент (ID: {student_id}) ботты бұғаттады")
-        elif "chat not found" in error_message:
-            print(f"[ҚАТЕ] Студентпен чат (ID: {student_id}) табылмады. Студент ботпен сөйлесуді бастамаған шығар")
-        else:
-            print(f"[ҚАТЕ] Студентке хабарлама жіберу сәтсіз болды (ID: {student_id}): {e}")
+        logger.error(f"Хабарламаны дерекқорға қосу сәтсіз болды (ID: {student_id}): {e}")
         return False
 
 # Отправка уведомления о переводе в другую группу
@@ -151,7 +293,9 @@ async def send_group_change_notification(bot, student_id, old_group, new_group):
 # Регистрация обработчиков в диспетчере
 def register_handlers(dp):
     dp.register_message_handler(cmd_notifications, commands=["notifications"])
-    dp.register_callback_query_handler(
-        process_read_notification,
-        lambda c: c.data.startswith("read_notification_")
-    )
+    callbacks.router.register(callbacks.READ_NOTIFICATION, process_read_notification)
+    callbacks.router.register(callbacks.INBOX_PAGE, process_inbox_page)
+    callbacks.router.register(callbacks.INBOX_READ_PAGE, process_inbox_read_page)
+    callbacks.router.register(callbacks.INBOX_READ_ALL, process_inbox_read_all)
+    # Воркер очереди отправки сливает уведомления, окно которых закончилось, в дайджесты
+    outbox.register_merge(coalescer.merge_due)
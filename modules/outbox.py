@@ -0,0 +1,144 @@
+# outbox.py
+import asyncio
+import logging
+import time
+
+from config import OUTBOX_WORKERS, OUTBOX_BATCH_SIZE, OUTBOX_POLL_INTERVAL, OUTBOX_MAX_ATTEMPTS
+from database.db import db
+from modules import metrics, outgoing, shutdown, reachability
+from modules.broadcast import send_message, SENT, BLOCKED, FAILED, SKIPPED, OUTCOME_CODES
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxWorker:
+    """
+    Фоновая доставка уведомлений из таблицы notification_outbox.
+    Обработчики только добавляют строки в очередь (см. db.enqueue_notifications)
+    и вызывают wake(); воркер забирает сообщения пачками и отправляет их
+    пулом корутин. Строки, зависшие в 'sending' после падения процесса,
+    при старте возвращаются в очередь, поэтому уведомления не теряются.
+    """
+
+    def __init__(self, workers=OUTBOX_WORKERS, batch_size=OUTBOX_BATCH_SIZE,
+                 poll_interval=OUTBOX_POLL_INTERVAL, max_attempts=OUTBOX_MAX_ATTEMPTS):
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.bot = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+        # Функции, которые перед выборкой пачки переводят в очередь накопленные строки
+        self._merge_hooks = []
+
+    async def start(self, bot):
+        """Возвращает зависшие сообщения в очередь и запускает фоновую задачу"""
+        self.bot = bot
+        requeued = await db.requeue_outbox()
+        if requeued:
+            logger.info(f"Возвращено в очередь отправки после перезапуска: {requeued}")
+        self._task = shutdown.spawn(self._run(), "outbox")
+
+    def register_merge(self, callback):
+        """
+        Регистрирует асинхронную функцию, которую воркер вызывает перед выборкой
+        каждой пачки (например, слияние уведомлений в дайджесты, см. modules/coalescer.py)
+        """
+        self._merge_hooks.append(callback)
+
+    def wake(self):
+        """Сообщает воркеру, что в очереди появились новые сообщения"""
+        self._wakeup.set()
+
+    async def _idle(self):
+        """Ждет новых сообщений или истечения интервала опроса"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.poll_interval
+        # Ждем короткими отрезками, чтобы быстро заметить начало остановки
+        while not shutdown.is_closing():
+            timeout = min(1.0, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+                return
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self):
+        # Вся доставка из очереди - низкоприоритетный трафик
+        outgoing.current_lane.set(outgoing.BULK)
+        while True:
+            # Сбрасываем флаг до чтения очереди, чтобы не потерять wake() во время запроса
+            self._wakeup.clear()
+            for merge in self._merge_hooks:
+                try:
+                    await merge()
+                except Exception as e:
+                    logger.error(f"Ошибка подготовки очереди отправки: {e}")
+            try:
+                batch = await db.claim_outbox_batch(self.batch_size)
+            except Exception as e:
+                logger.error(f"Ошибка чтения очереди отправки: {e}")
+                batch = []
+
+            if batch:
+                await self._deliver(batch)
+                continue
+
+            # При остановке доделываем очередь до конца и выходим
+            if shutdown.is_closing():
+                return
+            await self._idle()
+
+    async def _deliver(self, batch):
+        """Отправляет пачку сообщений и записывает результаты одним запросом"""
+        results = []
+        # Квитанции для статистики рассылок (только окончательные результаты)
+        receipts = []
+        pending = iter(batch)
+
+        def record(row, outcome, result, latency=0.0):
+            results.append(result)
+            metrics.inc("bot_outbox_messages_total", outcome=outcome)
+            if row["job_id"] is not None and result[3] is None:
+                receipts.append((row["job_id"], row["user_id"], OUTCOME_CODES[outcome], int(latency * 1000)))
+
+        async def worker():
+            for row in pending:
+                if not reachability.is_reachable(row["user_id"]):
+                    # Пользователь заблокировал бота: не тратим запрос к Telegram.
+                    # Состояние то же, что и в квитанции, чтобы очередь и /delivery_stats совпадали
+                    record(row, SKIPPED, (row["id"], SKIPPED, "unreachable", None))
+                    continue
+                started_at = time.perf_counter()
+                outcome, error = await send_message(self.bot, row["user_id"], row["message"])
+                record(row, outcome, self._result(row, outcome, error), time.perf_counter() - started_at)
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.workers, len(batch)))))
+        except asyncio.CancelledError:
+            # Фиксируем то, что успели отправить, остальное возвращаем в очередь
+            done = {result[0] for result in results}
+            await db.complete_outbox(results, receipts)
+            await db.requeue_outbox([row["id"] for row in batch if row["id"] not in done])
+            raise
+
+        await db.complete_outbox(results, receipts)
+
+    def _result(self, row, outcome, error):
+        """Кортеж (id, состояние, ошибка, через сколько секунд повторить) для complete_outbox"""
+        if outcome == SENT:
+            return row["id"], SENT, None, None
+        if outcome == BLOCKED:
+            return row["id"], BLOCKED, str(error), None
+
+        if row["attempts"] < self.max_attempts:
+            # Повтор с растущей паузой: 30 с, 60 с, 120 с...
+            return row["id"], FAILED, str(error), 30 * 2 ** (row["attempts"] - 1)
+        logger.error(f"Не удалось доставить уведомление {row['id']} пользователю {row['user_id']}: {error}")
+        return row["id"], FAILED, str(error), None
+
+
+outbox = OutboxWorker()
@@ -0,0 +1,141 @@
+# outgoing.py
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from contextvars import ContextVar
+
+from aiogram import Bot
+
+from config import OUTGOING_RATE, OUTGOING_LANE_WEIGHTS
+from modules import metrics
+from modules.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Очереди исходящих запросов
+INTERACTIVE = "interactive"
+BULK = "bulk"
+
+# Очередь для запросов текущей задачи. По умолчанию запросы считаются ответами
+# пользователю; рассылки и фоновые задачи переключаются на BULK через bulk()
+current_lane = ContextVar("outgoing_lane", default=INTERACTIVE)
+
+# Методы, которые не расходуют лимит на сообщения и не должны стоять в очереди
+# (getUpdates - long polling, который висит до прихода обновлений)
+UNSCHEDULED_METHODS = frozenset({"getUpdates", "getMe", "getFile", "deleteWebhook", "setMyCommands"})
+
+
+@contextlib.contextmanager
+def lane(name):
+    """Запросы внутри блока with идут через очередь name"""
+    token = current_lane.set(name)
+    try:
+        yield
+    finally:
+        current_lane.reset(token)
+
+
+def bulk():
+    """Запросы внутри блока with идут через очередь рассылок"""
+    return lane(BULK)
+
+
+class _Lane:
+    __slots__ = ("name", "weight", "queue", "finish_tag")
+
+    def __init__(self, name, weight):
+        self.name = name
+        self.weight = weight
+        # Элементы: (метка завершения, future, время постановки в очередь)
+        self.queue = deque()
+        self.finish_tag = 0.0
+
+
+class OutgoingScheduler:
+    """
+    Общий для процесса планировщик исходящих запросов.
+    Скорость ограничена одним token bucket, а очередность выбирается
+    взвешенной справедливой очередью (WFQ): каждый запрос получает метку
+    max(виртуальное время, метка предыдущего запроса очереди) + 1 / вес,
+    и первым проходит запрос с наименьшей меткой. Поэтому при любой длине
+    рассылки ответы пользователям проходят со своей долей пропускной способности.
+    """
+
+    def __init__(self, rate=OUTGOING_RATE, weights=OUTGOING_LANE_WEIGHTS):
+        self._bucket = TokenBucket(rate, rate)
+        self._lanes = {name: _Lane(name, weight) for name, weight in weights.items()}
+        self._virtual_time = 0.0
+        self._queued = 0
+        self._pump = None
+
+    def queue_sizes(self):
+        return {name: len(lane.queue) for name, lane in self._lanes.items()}
+
+    async def acquire(self, lane_name=None):
+        """Ждет разрешения на один запрос к Telegram"""
+        lane = self._lanes[lane_name or current_lane.get()]
+
+        # Быстрый путь: очередей нет и лимит позволяет
+        if not self._queued and self._bucket.consume():
+            metrics.observe("bot_outgoing_queue_wait_seconds", 0.0, lane=lane.name)
+            return
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        lane.finish_tag = max(self._virtual_time, lane.finish_tag) + 1.0 / lane.weight
+        lane.queue.append((lane.finish_tag, future, loop.time()))
+        self._queued += 1
+        metrics.gauge_set("bot_outgoing_queue_size", len(lane.queue), lane=lane.name)
+
+        if self._pump is None:
+            self._pump = loop.create_task(self._run())
+        await future
+
+    def _next_lane(self):
+        """Очередь с наименьшей меткой у первого элемента (отмененные запросы выбрасываются)"""
+        best = None
+        for lane in self._lanes.values():
+            while lane.queue and lane.queue[0][1].cancelled():
+                lane.queue.popleft()
+                self._queued -= 1
+            if lane.queue and (best is None or lane.queue[0][0] < best.queue[0][0]):
+                best = lane
+        return best
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                delay = self._bucket.delay()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    continue
+
+                # Очередь выбирается после ожидания: за это время мог прийти более срочный запрос
+                lane = self._next_lane()
+                if lane is None:
+                    return
+                self._bucket.consume()
+
+                tag, future, enqueued_at = lane.queue.popleft()
+                self._queued -= 1
+                self._virtual_time = tag
+                future.set_result(None)
+
+                metrics.observe("bot_outgoing_queue_wait_seconds", loop.time() - enqueued_at, lane=lane.name)
+                metrics.gauge_set("bot_outgoing_queue_size", len(lane.queue), lane=lane.name)
+        finally:
+            self._pump = None
+
+
+scheduler = OutgoingScheduler()
+
+
+class ScheduledBot(Bot):
+    """Bot, у которого все исходящие запросы проходят через общий планировщик"""
+
+    async def request(self, method, data=None, files=None, **kwargs):
+        if method not in UNSCHEDULED_METHODS:
+            await scheduler.acquire()
+        return await super().request(method, data, files, **kwargs)
@@ -0,0 +1,350 @@
+# qr_benchmark.py
+import asyncio
+import io
+import random
+import time
+from collections import Counter, namedtuple
+
+from modules.qr_decoder import QRDecoder, DecoderBusy, _decode
+
+# Размер кадра с камеры телефона (12 Мп)
+PHOTO_SIZE = (3024, 4032)
+# Как часто "другой пользователь" проверяет отзывчивость цикла событий
+LAG_PROBE_INTERVAL = 0.01
+# Размеры, в которых Telegram хранит отправленное фото (по большей стороне)
+TELEGRAM_PHOTO_SIDES = (90, 320, 800, 1280)
+
+# Аналог types.PhotoSize для корпуса
+PhotoSize = namedtuple("PhotoSize", "file_id width height")
+
+
+def _token():
+    from modules import attendance_token
+
+    return attendance_token.issue(1, 1, int(time.time()) + 600)
+
+
+def _legacy_payload():
+    """JSON, который раньше кодировался в QR-код посещаемости"""
+    import json
+    from datetime import datetime
+
+    return json.dumps({
+        "type": "attendance", "group_id": 1, "subject": "Математика", "timestamp": datetime.now().isoformat()
+    })
+
+
+async def generate_qr_code(data):
+    """
+    Генерирует изображение QR-кода (в пуле потоков)
+    Args:
+        data (str): Данные для QR-кода
+    Returns:
+        BytesIO: Изображение QR-кода в байтовом формате
+    """
+    from modules.live_qr import render_qr_async
+
+    return io.BytesIO(await render_qr_async(data))
+
+
+async def _qr_image(data=None):
+    from PIL import Image
+
+    return Image.open(await generate_qr_code(data or _token())).convert("L")
+
+
+def _jpeg(image, quality=85):
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+async def make_photo():
+    """
+    Снимок QR-кода, похожий на фото с телефона: код на сером шумном фоне,
+    сохраненный в JPEG
+    Returns:
+        bytes: Содержимое JPEG-файла
+    """
+    from PIL import Image
+
+    qr_image = await _qr_image()
+    photo = Image.effect_noise(PHOTO_SIZE, 24).point(lambda value: value // 2 + 96)
+    side = PHOTO_SIZE[0] // 2
+    qr_image = qr_image.resize((side, side))
+    photo.paste(qr_image, ((PHOTO_SIZE[0] - side) // 2, (PHOTO_SIZE[1] - side) // 2))
+    return _jpeg(photo)
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def _probe_lag(stop):
+    """Максимальное опоздание периодической задачи - столько ждали бы остальные пользователи"""
+    worst = 0.0
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + LAG_PROBE_INTERVAL
+        await asyncio.sleep(LAG_PROBE_INTERVAL)
+        worst = max(worst, loop.time() - expected)
+    return worst
+
+
+async def run_scenario(decode, photo, uploads):
+    """
+    Одновременно отправляет uploads фото на распознавание
+    Returns:
+        dict: Пропускная способность, задержки отметки и опоздание цикла событий
+    """
+    latencies = []
+    rejected = 0
+
+    async def check_in():
+        nonlocal rejected
+        started = time.perf_counter()
+        try:
+            result = await decode(photo)
+        except DecoderBusy:
+            rejected += 1
+            return
+        latencies.append(time.perf_counter() - started)
+        return result
+
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(_probe_lag(stop))
+    await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(check_in() for _ in range(uploads)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    return {
+        "throughput": len(latencies) / elapsed,
+        "p50": percentile(latencies, 0.5) if latencies else 0.0,
+        "p99": percentile(latencies, 0.99) if latencies else 0.0,
+        "loop_lag": await lag,
+        "rejected": rejected,
+    }
+
+
+async def _benchmark(uploads, workers):
+    photo = await make_photo()
+    if not _decode(photo, PHOTO_SIZE[1])[0]:
+        raise RuntimeError("Тестовое фото не распознается")
+
+    async def inline(image_bytes):
+        # Прежнее поведение: pyzbar прямо в корутине
+        await asyncio.sleep(0)
+        return _decode(image_bytes, PHOTO_SIZE[1])
+
+    results = [("в цикле событий", await run_scenario(inline, photo, uploads))]
+
+    decoder = QRDecoder(workers=workers, max_pending=uploads)
+    await decoder.start()
+    try:
+        results.append((f"пул, {workers} проц.", await run_scenario(decoder.decode, photo, uploads)))
+    finally:
+        decoder.close()
+    return photo, results
+
+
+def run_qr_benchmark(uploads=100, workers=None):
+    """
+    Замеряет отметку посещаемости при uploads одновременных фото:
+    распознавание в цикле событий против пула процессов
+    """
+    from config import QR_DECODE_WORKERS
+
+    workers = workers or QR_DECODE_WORKERS
+    photo, results = asyncio.run(_benchmark(uploads, workers))
+
+    print(f"Одновременных фото: {uploads}, размер фото: {PHOTO_SIZE[0]}x{PHOTO_SIZE[1]}, {len(photo) // 1024} KB")
+    print(f"  {'режим':<20} {'фото/с':>8} {'p50, ms':>9} {'p99, ms':>9} {'задержка цикла, ms':>19} {'отклонено':>10}")
+    for name, result in results:
+        print(
+            f"  {name:<20} {result['throughput']:8.1f} {result['p50'] * 1000:9.1f} {result['p99'] * 1000:9.1f} "
+            f"{result['loop_lag'] * 1000:19.1f} {result['rejected']:10}"
+        )
+    return 0
+
+
+def _photograph(qr_image, rng):
+    """
+    Синтетический снимок экрана с QR-кодом: случайные масштаб, положение и
+    поворот, неравномерное освещение, низкий контраст, размытие, шум и JPEG
+    """
+    from PIL import Image, ImageChops, ImageFilter
+
+    width, height = TELEGRAM_PHOTO_SIDES[-1], TELEGRAM_PHOTO_SIDES[-1] * 3 // 4
+    background = rng.randint(90, 200)
+    photo = Image.new("L", (width, height), background)
+
+    side = int(height * rng.uniform(0.2, 0.8))
+    code = qr_image.resize((side, side)).rotate(rng.uniform(-20, 20), expand=True, fillcolor=255)
+    photo.paste(code, (rng.randint(0, width - code.width), rng.randint(0, max(0, height - code.height))))
+
+    # Освещение: яркость плавно падает к одному из краев
+    gradient = Image.linear_gradient("L").resize((width, height)).rotate(rng.choice((0, 90, 180, 270)))
+    light = gradient.point(lambda value: 255 - int(value * rng.uniform(0.2, 0.6)))
+    photo = ImageChops.multiply(photo, light)
+
+    contrast = rng.uniform(0.4, 1.0)
+    photo = photo.point(lambda value: int(128 + (value - 128) * contrast))
+    photo = photo.filter(ImageFilter.GaussianBlur(rng.uniform(0, 2.5)))
+    noise = Image.effect_noise((width, height), rng.uniform(5, 40))
+    photo = ImageChops.add(photo, noise, scale=2, offset=-64)
+    return photo
+
+
+async def make_corpus(count, seed=1):
+    """
+    Корпус фото, как их хранит Telegram: каждое фото в нескольких размерах
+    Returns:
+        list: Для каждого фото - (список PhotoSize, словарь file_id -> JPEG)
+    """
+    rng = random.Random(seed)
+    qr_image = await _qr_image()
+    corpus = []
+    for index in range(count):
+        photo = _photograph(qr_image, rng)
+        quality = rng.randint(50, 90)
+        sizes, files = [], {}
+        for side in TELEGRAM_PHOTO_SIDES:
+            copy = photo.copy()
+            copy.thumbnail((side, side))
+            file_id = f"{index}_{side}"
+            sizes.append(PhotoSize(file_id, copy.width, copy.height))
+            files[file_id] = _jpeg(copy, quality)
+        corpus.append((sizes, files))
+    return corpus
+
+
+async def _corpus_benchmark(count, workers):
+    corpus = await make_corpus(count)
+    decoder = QRDecoder(workers=workers, max_pending=count)
+    await decoder.start()
+
+    async def run(strategy):
+        downloaded = 0
+        recognized = 0
+        resolutions = Counter()
+        started = time.perf_counter()
+
+        async def one(sizes, files):
+            nonlocal downloaded, recognized
+            tried = []
+
+            async def download(file_id):
+                nonlocal downloaded
+                downloaded += len(files[file_id])
+                tried.append(file_id)
+                return io.BytesIO(files[file_id])
+
+            payloads = await strategy(sizes, download)
+            if payloads:
+                recognized += 1
+                resolutions[tried[-1].split("_")[1]] += 1
+
+        await asyncio.gather(*(one(sizes, files) for sizes, files in corpus))
+        return {
+            "recognized": recognized,
+            "seconds": time.perf_counter() - started,
+            "downloaded": downloaded,
+            "resolutions": resolutions,
+        }
+
+    async def largest_only(sizes, download):
+        # Прежнее поведение: всегда самый большой размер
+        photo_file = await download(sizes[-1].file_id)
+        payloads, _ = await decoder.decode(photo_file.getvalue())
+        return payloads
+
+    try:
+        return [
+            ("только большой", await run(largest_only)),
+            ("прогрессивно", await run(decoder.decode_photo)),
+        ]
+    finally:
+        decoder.close()
+
+
+def run_qr_corpus_benchmark(count=200, workers=None):
+    """
+    Сравнивает распознавание корпуса синтетических снимков QR-кода:
+    всегда самый большой размер против прогрессивного выбора размера
+    """
+    from config import QR_DECODE_WORKERS
+
+    workers = workers or QR_DECODE_WORKERS
+    results = asyncio.run(_corpus_benchmark(count, workers))
+
+    print(f"Корпус: {count} синтетических снимков, размеры {', '.join(map(str, TELEGRAM_PHOTO_SIDES))}")
+    print(f"  {'стратегия':<16} {'распознано':>11} {'время, с':>9} {'скачано, KB/фото':>17}  успешный размер")
+    for name, result in results:
+        by_resolution = ", ".join(f"{side}: {hits}" for side, hits in sorted(result["resolutions"].items()))
+        print(
+            f"  {name:<16} {result['recognized'] / count:10.1%} {result['seconds']:9.2f} "
+            f"{result['downloaded'] / count / 1024:17.1f}  {by_resolution}"
+        )
+    return 0
+
+
+async def _payload_benchmark(rounds):
+    import qrcode
+    from PIL import Image
+
+    results = []
+    from modules import attendance_token
+
+    token = _token()
+    for name, data in (
+        ("JSON (прежний)", _legacy_payload()),
+        ("токен", token),
+        ("ссылка", attendance_token.deep_link("attendance_bot", token)),
+    ):
+        qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L)
+        qr.add_data(data)
+        qr.make(fit=True)
+
+        # Одинаковый кадр для обоих вариантов: код занимает половину высоты снимка
+        photo = Image.effect_noise((1280, 960), 24).point(lambda value: value // 2 + 96)
+        code = (await _qr_image(data)).resize((480, 480))
+        photo.paste(code, (400, 240))
+        photo_bytes = _jpeg(photo)
+
+        timings = []
+        for _ in range(rounds):
+            started = time.perf_counter()
+            payloads, _ = _decode(photo_bytes, 1280)
+            timings.append(time.perf_counter() - started)
+        if not payloads or payloads[0].decode("utf-8") != data:
+            raise RuntimeError(f"{name}: QR-код не распознан")
+
+        results.append((name, {
+            "length": len(data),
+            "version": qr.version,
+            "modules": qr.modules_count,
+            "p50": percentile(timings, 0.5),
+            "p99": percentile(timings, 0.99),
+        }))
+    return results
+
+
+def run_qr_payload_benchmark(rounds=50):
+    """
+    Сравнивает прежний JSON в QR-коде, подписанный токен и ссылку с токеном:
+    длина данных, версия QR-кода и время распознавания одинакового снимка
+    """
+    results = asyncio.run(_payload_benchmark(rounds))
+
+    print(f"Распознавание одинакового снимка 1280x960, {rounds} повторов")
+    print(f"  {'данные':<16} {'символов':>9} {'версия':>7} {'модулей':>8} {'p50, ms':>9} {'p99, ms':>9}")
+    for name, result in results:
+        print(
+            f"  {name:<16} {result['length']:9} {result['version']:7} {result['modules']:8} "
+            f"{result['p50'] * 1000:9.1f} {result['p99'] * 1000:9.1f}"
+        )
+    return 0
@@ -0,0 +1,332 @@
+# qr_decoder.py
+import asyncio
+import logging
+import multiprocessing
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from config import (
+    QR_DECODE_WORKERS, QR_DECODE_TIMEOUT, QR_DECODE_MAX_PENDING, QR_DECODE_MIN_SIDE, QR_DECODE_MAX_SIDE,
+    QR_DECODE_CACHE_SIZE
+)
+from modules import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class DecoderBusy(Exception):
+    """Очередь распознавания переполнена: фото нужно отправить позже"""
+
+
+# Функции ниже выполняются в процессах пула, поэтому они на уровне модуля
+def _init_worker():
+    """Загружает PIL и pyzbar (вместе с libzbar) один раз при старте процесса"""
+    from PIL import Image
+    from pyzbar.pyzbar import decode
+
+
+def _ping():
+    return True
+
+
+def _otsu_threshold(histogram):
+    """Порог бинаризации методом Оцу по гистограмме яркости (256 значений)"""
+    total = sum(histogram)
+    weighted_total = sum(value * count for value, count in enumerate(histogram))
+    background = weighted_background = 0
+    best_threshold, best_variance = 127, 0.0
+    for value, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted_background += value * count
+        mean_background = weighted_background / background
+        mean_foreground = (weighted_total - weighted_background) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = value, variance
+    return best_threshold
+
+
+def _crop_to_code(image):
+    """
+    Обрезает изображение до области QR-кода: ищет участок с наибольшей
+    плотностью контрастных границ. Границы ищутся на уменьшенной копии,
+    где шум матрицы камеры уже усреднен и не дает ложных границ
+    """
+    from PIL import Image, ImageFilter
+
+    small = image.copy()
+    small.thumbnail((256, 256), Image.BOX)
+    cell = 8
+    grid = (max(1, small.width // cell), max(1, small.height // cell))
+    density = small.filter(ImageFilter.FIND_EDGES).resize(grid, resample=Image.BOX)
+    _, peak = density.getextrema()
+    if peak == 0:
+        return image
+    box = density.point(lambda value: 255 if value * 2 >= peak else 0).getbbox()
+    if box is None:
+        return image
+
+    # Запас в две клетки карты, чтобы не срезать поле вокруг кода
+    left, top, right, bottom = box
+    scale = cell * image.width / small.width
+    return image.crop((
+        max(0, int((left - 2) * scale)), max(0, int((top - 2) * scale)),
+        min(image.width, int((right + 2) * scale)), min(image.height, int((bottom + 2) * scale))
+    ))
+
+
+def _qr_symbols():
+    """Ищем только QR-коды: остальные типы штрихкодов zbar не проверяет"""
+    from pyzbar.pyzbar import ZBarSymbol
+    return [ZBarSymbol.QRCODE]
+
+
+def _decode(image_bytes, max_side):
+    """
+    Распознает QR-коды на изображении. Сначала изображение переводится
+    в оттенки серого, уменьшается до max_side, обрезается до области кода
+    и бинаризуется; если так код не найден - распознается просто уменьшенное
+    серое изображение (обрезка могла ошибиться)
+    Args:
+        image_bytes (bytes): Содержимое файла изображения
+        max_side (int): Максимальная сторона изображения перед распознаванием
+    Returns:
+        tuple: (данные найденных QR-кодов (bytes), этап - "prepared", "plain" или None)
+    """
+    import io
+    from PIL import Image
+    from pyzbar.pyzbar import decode
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        gray = image.convert("L")
+    if max(gray.size) > max_side:
+        gray.thumbnail((max_side, max_side))
+
+    prepared = _crop_to_code(gray)
+    threshold = _otsu_threshold(prepared.histogram())
+    prepared = prepared.point(lambda value: 255 if value > threshold else 0)
+    symbols = decode(prepared, symbols=_qr_symbols())
+    if symbols:
+        return [symbol.data for symbol in symbols], "prepared"
+
+    symbols = decode(gray, symbols=_qr_symbols())
+    if symbols:
+        return [symbol.data for symbol in symbols], "plain"
+    return [], None
+
+
+def resolution_ladder(photo_sizes, min_side=QR_DECODE_MIN_SIDE):
+    """
+    Размеры фото, которые пробуются по очереди: сначала самый маленький,
+    на котором код еще различим (сторона не меньше min_side), затем самый большой
+    Args:
+        photo_sizes: PhotoSize сообщения (Telegram сортирует их по возрастанию)
+    Returns:
+        list: Один или два PhotoSize
+    """
+    largest = photo_sizes[-1]
+    for size in photo_sizes:
+        if max(size.width, size.height) >= min_side:
+            return [size] if size is largest else [size, largest]
+    return [largest]
+
+
+class DecodeCache:
+    """
+    Результаты распознавания по file_unique_id фото: студенты часто отправляют
+    то же фото повторно, не дождавшись ответа. Хранит не больше max_size записей
+    с вытеснением давно не использованных (LRU). Запись можно пометить тегом
+    (ID сессии посещаемости), чтобы удалить все записи сессии, когда она истечет
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        # file_unique_id -> (данные QR-кодов, тег)
+        self._entries = OrderedDict()
+        # тег -> множество file_unique_id
+        self._tags = defaultdict(set)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Данные QR-кодов из кэша или None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            metrics.inc("bot_qr_decode_cache_total", result="miss")
+            return None
+        self._entries.move_to_end(key)
+        metrics.inc("bot_qr_decode_cache_total", result="hit")
+        return entry[0]
+
+    def put(self, key, payloads, tag=None):
+        self._remove(key)
+        self._entries[key] = (payloads, tag)
+        if tag is not None:
+            self._tags[tag].add(key)
+        while len(self._entries) > self.max_size:
+            self._remove(next(iter(self._entries)))
+            metrics.inc("bot_qr_decode_cache_evictions_total", reason="lru")
+        metrics.gauge_set("bot_qr_decode_cache_size", len(self._entries))
+
+    def evict_tag(self, tag):
+        """Удаляет все записи с тегом (например, истекшей сессии)"""
+        keys = self._tags.pop(tag, ())
+        for key in keys:
+            self._entries.pop(key, None)
+        if keys:
+            metrics.inc("bot_qr_decode_cache_evictions_total", len(keys), reason="session")
+            metrics.gauge_set("bot_qr_decode_cache_size", len(self._entries))
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[1] is not None:
+            keys = self._tags[entry[1]]
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry[1]]
+
+
+class QRDecoder:
+    """
+    Распознавание QR-кодов в отдельных процессах, чтобы pyzbar не блокировал
+    цикл событий. Одновременно в пул отдается не больше workers задач,
+    остальные ждут своей очереди в боте; если ждущих больше max_pending,
+    новое фото сразу отклоняется (DecoderBusy), а не копится в памяти.
+    """
+
+    def __init__(self, workers=QR_DECODE_WORKERS, timeout=QR_DECODE_TIMEOUT, max_pending=QR_DECODE_MAX_PENDING,
+                 max_side=QR_DECODE_MAX_SIDE):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.max_side = max_side
+        self._executor = None
+        self._slots = None
+        self._waiting = 0
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn, а не fork: копировать процесс бота вместе с потоками aiosqlite небезопасно
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    def _get_slots(self):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._slots
+
+    async def start(self):
+        """Заранее запускает процессы пула, чтобы первая отметка не ждала их старта"""
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            await asyncio.gather(*(loop.run_in_executor(executor, _ping) for _ in range(self.workers)))
+        except Exception as e:
+            logger.warning(f"Не удалось запустить процессы распознавания QR-кодов: {e}")
+
+    def _queue_changed(self):
+        metrics.gauge_set("bot_qr_decode_queue", self._waiting)
+
+    async def decode(self, image_bytes):
+        """
+        Распознает QR-коды на изображении в процессе пула
+        Args:
+            image_bytes (bytes): Содержимое файла изображения
+        Returns:
+            tuple: (данные найденных QR-кодов (bytes), этап распознавания)
+        Raises:
+            DecoderBusy: Очередь переполнена
+            asyncio.TimeoutError: Распознавание не уложилось в timeout
+        """
+        if self._waiting >= self.max_pending:
+            metrics.inc("bot_qr_decode_rejected_total")
+            raise DecoderBusy()
+
+        slots = self._get_slots()
+        queued_at = time.perf_counter()
+        self._waiting += 1
+        self._queue_changed()
+        try:
+            await slots.acquire()
+        finally:
+            self._waiting -= 1
+            self._queue_changed()
+        metrics.observe("bot_qr_decode_wait_seconds", time.perf_counter() - queued_at)
+
+        started = time.perf_counter()
+        executor = self._get_executor()
+        try:
+            future = asyncio.get_running_loop().run_in_executor(executor, _decode, image_bytes, self.max_side)
+        except BaseException as e:
+            slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._on_broken(executor)
+            raise
+        # Место освобождается, когда процесс действительно закончил работу:
+        # задача, по которой истек timeout, продолжает занимать процесс
+        future.add_done_callback(lambda _: slots.release())
+
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            metrics.inc("bot_qr_decode_timeouts_total")
+            raise
+        except BrokenProcessPool:
+            self._on_broken(executor)
+            raise
+        metrics.observe("bot_qr_decode_seconds", time.perf_counter() - started)
+        return result
+
+    async def decode_photo(self, photo_sizes, download, first=None):
+        """
+        Прогрессивное распознавание фото из сообщения: скачивает уменьшенную
+        копию и переходит к полному размеру, только если код не найден
+        Args:
+            photo_sizes: PhotoSize сообщения
+            download: Корутина download(file_id) -> BytesIO
+            first: Уже скачанный первый размер из resolution_ladder (BytesIO) или None
+        Returns:
+            list: Данные найденных QR-кодов (bytes)
+        """
+        for size in resolution_ladder(photo_sizes):
+            # Telegram хранит фото в фиксированном наборе размеров, поэтому метка не разрастается
+            resolution = str(max(size.width, size.height))
+            photo_file = first if first is not None else await download(size.file_id)
+            first = None
+            payloads, stage = await self.decode(photo_file.getvalue())
+            if payloads:
+                metrics.inc("bot_qr_decode_success_total", resolution=resolution, stage=stage)
+                return payloads
+            metrics.inc("bot_qr_decode_miss_total", resolution=resolution)
+        metrics.inc("bot_qr_decode_not_found_total")
+        return []
+
+    def _on_broken(self, executor):
+        """Процесс пула упал (например, не хватило памяти на огромное фото): следующее фото создаст новый пул"""
+        metrics.inc("bot_qr_decode_errors_total")
+        if self._executor is executor:
+            logger.error("Пул распознавания QR-кодов поврежден, создается новый")
+            executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def close(self):
+        """Останавливает процессы пула, не дожидаясь незавершенных задач"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+qr_decoder = QRDecoder()
+decode_cache = DecodeCache(QR_DECODE_CACHE_SIZE)
@@ -0,0 +1,194 @@
+# quiet_hours.py
+import asyncio
+import heapq
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+
+from aiogram import types
+
+from config import QUIET_RELEASE_BATCH_SIZE, QUIET_RELEASE_INTERVAL
+from database.db import db
+from localization.kz_text import QUIET_HOURS_MESSAGES, NOTIFICATION_MESSAGES
+from modules import metrics, shutdown
+from modules.outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+# Формат времени SQLite CURRENT_TIMESTAMP (UTC)
+_DB_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Кэш тихих часов: telegram_id -> (начало, конец) в часах по местному времени сервера
+_quiet_hours = {}
+
+
+def _to_db_time(moment):
+    return moment.astimezone(timezone.utc).strftime(_DB_TIME_FORMAT)
+
+
+def _from_db_time(value):
+    return datetime.strptime(value, _DB_TIME_FORMAT).replace(tzinfo=timezone.utc).timestamp()
+
+
+def is_quiet(start, end, hour):
+    """Попадает ли час в интервал тихих часов (интервал может переходить через полночь)"""
+    if start < end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def deliver_at(user_ids, now=None):
+    """
+    Для получателей, у которых сейчас тихие часы, возвращает время окончания тихих часов
+    Returns:
+        dict: user_id -> время UTC в формате БД
+    """
+    if not _quiet_hours:
+        return {}
+    now = now or datetime.now()
+    result = {}
+    for user_id in user_ids:
+        hours = _quiet_hours.get(user_id)
+        if hours is None or not is_quiet(hours[0], hours[1], now.hour):
+            continue
+        end = now.replace(hour=hours[1], minute=0, second=0, microsecond=0)
+        if end <= now:
+            end += timedelta(days=1)
+        result[user_id] = _to_db_time(end)
+    return result
+
+
+class DeferredQueue:
+    """
+    Отложенные до конца тихих часов сообщения очереди отправки.
+    В памяти - куча (время, ID), копия в БД - строки notification_outbox
+    в состоянии 'deferred'. Фоновая задача спит ровно до ближайшего срока
+    (без опроса БД) и переводит созревшие сообщения в обычную очередь
+    пачками не больше QUIET_RELEASE_BATCH_SIZE с паузой QUIET_RELEASE_INTERVAL,
+    чтобы утром все отложенное не уходило одним всплеском.
+    """
+
+    def __init__(self, batch_size=QUIET_RELEASE_BATCH_SIZE, interval=QUIET_RELEASE_INTERVAL):
+        self.batch_size = batch_size
+        self.interval = interval
+        self._heap = []
+        self._wakeup = asyncio.Event()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def push(self, items):
+        """
+        Добавляет отложенные сообщения
+        Args:
+            items: Пары (ID в очереди, время UTC в формате БД)
+        """
+        earliest = self._heap[0][0] if self._heap else None
+        for outbox_id, due in items:
+            heapq.heappush(self._heap, (_from_db_time(due), outbox_id))
+        metrics.gauge_set("bot_deferred_notifications", len(self._heap))
+        # Будим задачу, только если появился срок раньше того, до которого она спит
+        if self._heap and (earliest is None or self._heap[0][0] < earliest):
+            self._wakeup.set()
+
+    async def start(self):
+        """Загружает отложенные сообщения из БД и запускает фоновую задачу"""
+        self._heap = []
+        self.push(await db.get_deferred_outbox())
+        if self._heap:
+            logger.info(f"Отложенных до конца тихих часов сообщений: {len(self._heap)}")
+        shutdown.spawn(self._run(), "quiet_hours")
+
+    async def _sleep(self, timeout):
+        """Спит до срока, до нового более раннего сообщения или до остановки бота"""
+        waiter = asyncio.ensure_future(self._wakeup.wait())
+        closing = asyncio.ensure_future(shutdown.wait_closing(timeout))
+        await asyncio.wait({waiter, closing}, return_when=asyncio.FIRST_COMPLETED)
+        waiter.cancel()
+        closing.cancel()
+
+    async def _run(self):
+        while not shutdown.is_closing():
+            self._wakeup.clear()
+            now = time.time()
+
+            if not self._heap or self._heap[0][0] > now:
+                # Отложенные сообщения лежат в БД и после перезапуска загрузятся снова
+                await self._sleep(self._heap[0][0] - now if self._heap else None)
+                continue
+
+            batch = []
+            while self._heap and self._heap[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._heap)[1])
+            try:
+                await db.release_deferred_outbox(batch)
+            except Exception as e:
+                logger.error(f"Ошибка переноса отложенных сообщений в очередь: {e}")
+                for outbox_id in batch:
+                    heapq.heappush(self._heap, (now + self.interval, outbox_id))
+            metrics.gauge_set("bot_deferred_notifications", len(self._heap))
+            outbox.wake()
+
+            if self._heap and self._heap[0][0] <= now:
+                await shutdown.wait_closing(self.interval)
+
+
+deferred = DeferredQueue()
+
+
+async def load():
+    """Загружает тихие часы пользователей и отложенные сообщения (при старте бота)"""
+    _quiet_hours.clear()
+    for telegram_id, start, end in await db.get_quiet_hours():
+        _quiet_hours[telegram_id] = (start, end)
+    await deferred.start()
+
+
+def _parse_hours(text):
+    """'22-7' -> (22, 7); None, если формат неверный"""
+    try:
+        start, end = (int(part) for part in text.replace(":00", "").split("-"))
+    except ValueError:
+        return None
+    if not (0 <= start <= 23 and 0 <= end <= 23) or start == end:
+        return None
+    return start, end
+
+
+# Обработчик команды /quiet_hours
+async def cmd_quiet_hours(message: types.Message):
+    user = await db.get_user(message.from_user.id)
+    if not user or user["status"] != "approved":
+        await message.answer(NOTIFICATION_MESSAGES["not_registered"])
+        return
+
+    argument = message.get_args().strip().lower()
+
+    # Без аргумента показываем текущие настройки
+    if not argument:
+        hours = _quiet_hours.get(message.from_user.id)
+        if hours:
+            text = QUIET_HOURS_MESSAGES["current"].format(start=hours[0], end=hours[1])
+        else:
+            text = QUIET_HOURS_MESSAGES["not_set"]
+        await message.answer(f"{text}\n\n{QUIET_HOURS_MESSAGES['usage']}")
+        return
+
+    if argument == "off":
+        await db.set_quiet_hours(message.from_user.id, None, None)
+        _quiet_hours.pop(message.from_user.id, None)
+        await message.answer(QUIET_HOURS_MESSAGES["disabled"])
+        return
+
+    hours = _parse_hours(argument)
+    if hours is None:
+        await message.answer(QUIET_HOURS_MESSAGES["invalid"])
+        return
+
+    await db.set_quiet_hours(message.from_user.id, *hours)
+    _quiet_hours[message.from_user.id] = hours
+    await message.answer(QUIET_HOURS_MESSAGES["saved"].format(start=hours[0], end=hours[1]))
+
+# Регистрация обработчиков в диспетчере
+def register_handlers(dp):
+    dp.register_message_handler(cmd_quiet_hours, commands=["quiet_hours"])
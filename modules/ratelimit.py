@@ -0,0 +1,89 @@
+# ratelimit.py
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """
+    Классический token bucket: пополняется со скоростью rate токенов в секунду,
+    вмещает не более capacity токенов
+    """
+    __slots__ = ("rate", "capacity", "tokens", "updated_at")
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now):
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated_at = now
+
+    def consume(self, amount=1):
+        """Забирает токены, если они есть. Возвращает True при успехе"""
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            self.tokens -= amount
+            return True
+        return False
+
+    def delay(self, amount=1):
+        """Через сколько секунд в ведре будет amount токенов"""
+        self._refill(time.monotonic())
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class BucketTable:
+    """
+    Набор token bucket'ов по ключу (например, по пользователю).
+    Каждое ведро хранится как кортеж (tokens, updated_at), а вся таблица
+    ограничена max_size записями с вытеснением давно не использованных (LRU).
+    Вытеснение безопасно: ведро, которое долго не трогали, и так уже полное.
+    """
+
+    def __init__(self, rate, capacity, max_size=10000):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.max_size = max_size
+        self._buckets = OrderedDict()
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def consume(self, key, amount=1):
+        """Забирает токены из ведра key. Возвращает True при успехе"""
+        now = time.monotonic()
+        state = self._buckets.get(key)
+
+        if state is None:
+            tokens = self.capacity
+        else:
+            tokens, updated_at = state
+            tokens = min(self.capacity, tokens + (now - updated_at) * self.rate)
+            self._buckets.move_to_end(key)
+
+        allowed = tokens >= amount
+        if allowed:
+            tokens -= amount
+
+        self._buckets[key] = (tokens, now)
+        if state is None and len(self._buckets) > self.max_size:
+            self._buckets.popitem(last=False)
+
+        return allowed
+
+    def delay(self, key, amount=1):
+        """Через сколько секунд в ведре key будет amount токенов"""
+        state = self._buckets.get(key)
+        if state is None:
+            return 0.0
+        tokens, updated_at = state
+        tokens = min(self.capacity, tokens + (time.monotonic() - updated_at) * self.rate)
+        if tokens >= amount:
+            return 0.0
+        return (amount - tokens) / self.rate
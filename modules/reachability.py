@@ -0,0 +1,116 @@
+# reachability.py
+import logging
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+from aiogram.utils.exceptions import (
+    BotBlocked, BotKicked, UserDeactivated, CantInitiateConversation,
+    CantTalkWithBots, ChatNotFound, TelegramAPIError
+)
+
+from config import REACHABILITY_PROBE_INTERVAL, REACHABILITY_PROBE_RATE
+from database.db import db
+from modules import metrics, outgoing, shutdown
+from modules.ratelimit import TokenBucket
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, после которых писать пользователю бессмысленно
+UNREACHABLE_ERRORS = (BotBlocked, BotKicked, UserDeactivated, CantInitiateConversation, CantTalkWithBots, ChatNotFound)
+
+# Кэш недоступных пользователей: telegram_id -> класс ошибки.
+# Источник истины - столбцы reachable/unreachable_* таблицы users
+_unreachable = {}
+
+
+async def load():
+    """Загружает недоступных пользователей из БД (при старте бота)"""
+    _unreachable.clear()
+    for telegram_id, reason in await db.get_unreachable_users():
+        _unreachable[telegram_id] = reason
+    metrics.gauge_set("bot_unreachable_users", len(_unreachable))
+    logger.info(f"Недоступных пользователей: {len(_unreachable)}")
+
+
+def is_reachable(user_id):
+    """Может ли бот писать пользователю (по кэшу, без обращения к БД)"""
+    return user_id not in _unreachable
+
+
+def filter_reachable(user_ids):
+    """Возвращает (доступные, недоступные) получатели"""
+    reachable, unreachable = [], []
+    for user_id in user_ids:
+        (unreachable if user_id in _unreachable else reachable).append(user_id)
+    return reachable, unreachable
+
+
+async def mark_unreachable(user_id, error):
+    """Запоминает, что пользователь заблокировал бота или удалил аккаунт"""
+    reason = type(error).__name__
+    if _unreachable.get(user_id) == reason:
+        return
+    _unreachable[user_id] = reason
+    metrics.gauge_set("bot_unreachable_users", len(_unreachable))
+    logger.warning(f"Пользователь {user_id} недоступен: {reason}")
+    await db.set_user_reachable(user_id, False, reason)
+
+
+async def mark_reachable(user_id):
+    """Снимает отметку о недоступности"""
+    if _unreachable.pop(user_id, None) is None:
+        return
+    metrics.gauge_set("bot_unreachable_users", len(_unreachable))
+    logger.info(f"Пользователь {user_id} снова доступен")
+    await db.set_user_reachable(user_id, True)
+
+
+class ReachabilityMiddleware(BaseMiddleware):
+    """Пользователь, который написал боту, точно снова доступен"""
+
+    async def on_pre_process_message(self, message: types.Message, data: dict):
+        if message.from_user and message.from_user.id in _unreachable:
+            await mark_reachable(message.from_user.id)
+
+    async def on_pre_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        if callback_query.from_user.id in _unreachable:
+            await mark_reachable(callback_query.from_user.id)
+
+
+async def probe(bot):
+    """
+    Проверяет недоступных пользователей через send_chat_action:
+    это ничего не показывает пользователю, но падает, если бот заблокирован
+    Returns:
+        int: Сколько пользователей снова доступны
+    """
+    bucket = TokenBucket(REACHABILITY_PROBE_RATE, 1)
+    restored = 0
+    for user_id in list(_unreachable):
+        if shutdown.is_closing():
+            break
+        while not bucket.consume():
+            await shutdown.wait_closing(bucket.delay())
+        try:
+            with outgoing.bulk():
+                await bot.send_chat_action(user_id, types.ChatActions.TYPING)
+        except UNREACHABLE_ERRORS:
+            continue
+        except TelegramAPIError as e:
+            logger.warning(f"Не удалось проверить пользователя {user_id}: {e}")
+            continue
+        await mark_reachable(user_id)
+        restored += 1
+    return restored
+
+
+async def run_probes(bot):
+    """Фоновая задача: периодически проверяет недоступных пользователей"""
+    while not await shutdown.wait_closing(REACHABILITY_PROBE_INTERVAL):
+        if not _unreachable:
+            continue
+        try:
+            restored = await probe(bot)
+            logger.info(f"Проверка недоступных пользователей: снова доступны {restored}")
+        except Exception as e:
+            logger.error(f"Ошибка проверки недоступных пользователей: {e}")
@@ -10,6 +10,9 @@ from config import TEACHER_CODE
 from localization.kz_text import MESSAGES, BUTTONS, ROLES, REQUEST_MESSAGES, GROUP_MESSAGES, DELETE_PROFILE_MESSAGES
 from modules.keyboards import get_student_keyboard, get_teacher_keyboard
 from modules.notifications import send_group_change_notification
+from modules.throttling import rate_limit
+from modules import attendance_token, callbacks
+from modules.attendance import process_start_token
 
 logger = logging.getLogger(__name__)
 
@@ -49,6 +52,14 @@ def get_role_keyboard():
 # Обработчик команды /start
 async def cmd_start(message: types.Message, state: FSMContext):
     logger.info(f"Команда /start от пользователя {message.from_user.id}")
+    
+    # Ссылка из QR-кода посещаемости: отмечаем студента без фото
+    payload = message.get_args()
+    if payload.startswith(attendance_token.START_PREFIX):
+        await state.finish()
+        await process_start_token(message, payload)
+        return
+    
     user = await db.get_user(message.from_user.id)
     
     if user:
@@ -235,7 +246,7 @@ async def process_existing_group_selection(message: types.Message, state: FSMCon
             keyboard = types.InlineKeyboardMarkup()
             keyboard.add(types.InlineKeyboardButton(
                 "Өтініштерді қарау",
-                callback_data="view_requests"
+                callback_data=callbacks.pack(callbacks.VIEW_REQUESTS)
             ))
             
             # Отправляем уведомление преподавателю используя существующий бот
@@ -296,11 +307,11 @@ async def get_pending_students_keyboard():
         # Создаем кнопки для каждого студента
         approve_button = InlineKeyboardButton(
             f"✅ {student['full_name']} - {student['group_code']}",
-            callback_data=f"approve_{student['telegram_id']}_accept"
+            callback_data=callbacks.pack(callbacks.APPROVE, student['telegram_id'], 1)
         )
         reject_button = InlineKeyboardButton(
             f"❌ {student['full_name']} - {student['group_code']}",
-            callback_data=f"approve_{student['telegram_id']}_reject"
+            callback_data=callbacks.pack(callbacks.APPROVE, student['telegram_id'], 0)
         )
         keyboard.add(approve_button)
         keyboard.add(reject_button)
@@ -335,7 +346,7 @@ async def cmd_requests(message: types.Message, state: FSMContext = None):
     await cmd_pending_requests(message)
 
 # Обработчик кнопки "Просмотреть заявки"
-async def process_view_requests_button(callback_query: types.CallbackQuery):
+async def process_view_requests_button(callback_query: types.CallbackQuery, state: FSMContext):
     """Обработчик кнопки 'Просмотреть заявки'"""
     logger.info(f"Нажата кнопка 'Просмотреть заявки' пользователем {callback_query.from_user.id}")
     user = await db.get_user(callback_query.from_user.id)
@@ -364,12 +375,9 @@ async def process_view_requests_button(callback_query: types.CallbackQuery):
         )
 
 # Обработчик нажатия на кнопку подтверждения регистрации
-async def process_approve_button(callback_query: types.CallbackQuery):
-    logger.info(f"Нажата кнопка подтверждения: {callback_query.data}")
-    # Извлекаем ID студента и действие из callback_data
-    callback_data_parts = callback_query.data.split("_")
-    student_id = int(callback_data_parts[1])
-    action = callback_data_parts[2] if len(callback_data_parts) > 2 else "accept"
+async def process_approve_button(callback_query: types.CallbackQuery, state: FSMContext, student_id, accept=1):
+    logger.info(f"Нажата кнопка подтверждения: студент {student_id}, принять={accept}")
+    action = "accept" if accept else "reject"
     
     # Получаем данные студента и учителя
     student = await db.get_user(student_id)
@@ -596,6 +604,7 @@ async def process_new_group_code(message: types.Message, state: FSMContext):
     )
     await state.finish()
 
+@rate_limit(1, burst=3)
 async def process_select_source_group(message: types.Message, state: FSMContext):
     """Обработчик выбора исходной группы для перевода студента"""
     logger.info(f"Выбрана исходная группа для перевода: {message.text}")
@@ -947,14 +956,8 @@ def register_handlers(dp):
     dp.register_message_handler(process_reregister, lambda message: message.text == MESSAGES["repeat_registration"], state="*")
     
     # Обработчики для inline кнопок
-    dp.register_callback_query_handler(
-        process_view_requests_button, 
-        lambda c: c.data == "view_requests"
-    )
-    dp.register_callback_query_handler(
-        process_approve_button, 
-        lambda c: c.data.startswith("approve_")
-    )
+    callbacks.router.register(callbacks.VIEW_REQUESTS, process_view_requests_button)
+    callbacks.router.register(callbacks.APPROVE, process_approve_button)
     
     # Регистрация обработчиков для управления группами
     dp.register_message_handler(cmd_manage_groups, commands=["manage_groups"])
@@ -8,9 +8,11 @@ import aiosqlite
 
 from database.db import db
 from config import WEEKDAYS, SUBJECTS
-from localization.kz_text import SCHEDULE_MESSAGES, BUTTONS, SCHEDULE_NOTIFICATIONS
+from localization.kz_text import SCHEDULE_MESSAGES, BUTTONS, SCHEDULE_NOTIFICATIONS, MESSAGES
 from modules.notifications import send_schedule_notification
 from modules.keyboards import get_teacher_keyboard
+from modules.throttling import rate_limit
+from modules import callbacks
 
 logger = logging.getLogger(__name__)
 
@@ -158,6 +160,7 @@ async def process_schedule_action(message: types.Message, state: FSMContext):
     await ScheduleStates.selecting_group.set()
 
 # Обработчик выбора группы для работы с расписанием
+@rate_limit(1, burst=3)
 async def process_select_group(message: types.Message, state: FSMContext):
     logger.info(f"Выбрана группа для расписания: {message.text}")
     group_code = message.text.strip()
@@ -211,7 +214,7 @@ async def process_select_group(message: types.Message, state: FSMContext):
         keyboard = InlineKeyboardMarkup(row_width=1)
         for item in schedule_items:
             button_text = f"{item['weekday']} {item['time']} - {item['subject']}"
-            callback_data = f"edit_schedule_{item['id']}"
+            callback_data = callbacks.pack(callbacks.EDIT_SCHEDULE, item['id'])
             keyboard.add(InlineKeyboardButton(button_text, callback_data=callback_data))
         
         await message.answer(
@@ -220,6 +223,26 @@ async def process_select_group(message: types.Message, state: FSMContext):
         )
         await ScheduleStates.edit_schedule_item.set()
 
+# Обработчик выбора урока для редактирования: дальше те же шаги, что и при добавлении
+async def process_edit_schedule_item(callback_query: types.CallbackQuery, state: FSMContext, schedule_id):
+    data = await state.get_data()
+    schedule_items = await db.get_schedule(data["group_code"])
+    item = next((item for item in schedule_items if item["id"] == schedule_id), None)
+    if item is None:
+        # Урок уже удален или относится к другой группе
+        await callback_query.answer(MESSAGES["button_expired"], show_alert=True)
+        return
+    
+    await state.update_data(edit_id=schedule_id)
+    await callback_query.answer()
+    await callback_query.message.answer(
+        SCHEDULE_MESSAGES["choose_weekday_edit"].format(
+            lesson=f"{item['weekday']} {item['time']} - {item['subject']}"
+        ),
+        reply_markup=get_weekday_keyboard()
+    )
+    await ScheduleStates.add_schedule_weekday.set()
+
 # ДОБАВЛЯЕМ НЕДОСТАЮЩИЕ ОБРАБОТЧИКИ
 
 # Обработчик выбора дня недели для добавления сабака
@@ -318,8 +341,9 @@ async def process_add_subject(message: types.Message, state: FSMContext):
     time = data["time"]
     
     # Показываем подтверждение
+    confirm_text = "confirm_edit_lesson" if data.get("edit_id") else "confirm_add_lesson"
     await message.answer(
-        SCHEDULE_MESSAGES["confirm_add_lesson"].format(
+        SCHEDULE_MESSAGES[confirm_text].format(
             group_code=group_code,
             weekday=weekday,
             time=time,
@@ -349,14 +373,37 @@ async def process_confirm_add_lesson(message: types.Message, state: FSMContext):
         weekday = data["weekday"]
         time = data["time"]
         subject = data["subject"]
+        edit_id = data.get("edit_id")
+        
+        # Сбрасываем состояние сразу, чтобы повторное нажатие "Растау" не добавило урок еще раз
+        await state.finish()
+        
+        if edit_id:
+            # Изменяем выбранный урок; ключ - ID записи в истории изменений
+            change_id = await db.update_schedule_item(edit_id, weekday, time, subject)
+            students_count = 0
+            if change_id:
+                students_count = await send_schedule_notification(
+                    message.bot, group_code, "update", weekday, time, subject,
+                    dedup_key=f"schedule:update:{change_id}"
+                ) or 0
+            await message.answer(
+                SCHEDULE_MESSAGES["schedule_updated"].format(
+                    group_code=group_code,
+                    students_count=students_count
+                ),
+                reply_markup=get_teacher_keyboard()
+            )
+            return
         
         # Добавляем урок в расписание
-        await db.add_schedule_item(group_code, weekday, time, subject)
+        schedule_id = await db.add_schedule_item(group_code, weekday, time, subject)
         
-        # Отправляем уведомления студентам
+        # Отправляем уведомления студентам; ключ - ID добавленного урока
         students_count = await send_schedule_notification(
-            message.bot, group_code, "add", weekday, time, subject
-        )
+            message.bot, group_code, "add", weekday, time, subject,
+            dedup_key=f"schedule:add:{schedule_id}"
+        ) or 0
         
         keyboard = get_teacher_keyboard()
         await message.answer(
@@ -366,7 +413,6 @@ async def process_confirm_add_lesson(message: types.Message, state: FSMContext):
             ),
             reply_markup=keyboard
         )
-        await state.finish()
     else:
         # Неправильный ответ
         await message.answer(
@@ -387,5 +433,8 @@ def register_handlers(dp):
     dp.register_message_handler(process_add_time, state=ScheduleStates.add_schedule_time)
     dp.register_message_handler(process_add_subject, state=ScheduleStates.add_schedule_subject)
     dp.register_message_handler(process_confirm_add_lesson, state=ScheduleStates.confirm_schedule_change)
+    callbacks.router.register(
+        callbacks.EDIT_SCHEDULE, process_edit_schedule_item, state=ScheduleStates.edit_schedule_item
+    )
     
     logger.info("Все обработчики schedule.py зарегистрированы")
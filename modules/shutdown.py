@@ -0,0 +1,174 @@
+# shutdown.py
+import asyncio
+import logging
+import signal
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+# Флаг остановки: после него новые обновления не принимаются
+_closing = False
+# Событие остановки для фоновых задач, которые подолгу спят
+_closing_event = None
+# Задачи, в которых сейчас обрабатываются обновления
+_update_tasks = set()
+# Фоновые задачи (очереди отправки, воркеры и т.п.)
+_background_tasks = set()
+# Функции сброса буферов в БД, вызываются перед выходом
+_flush_hooks = []
+
+
+def is_closing():
+    """Возвращает True, если бот начал останавливаться"""
+    return _closing
+
+
+def _get_closing_event():
+    global _closing_event
+    if _closing_event is None:
+        _closing_event = asyncio.Event()
+        if _closing:
+            _closing_event.set()
+    return _closing_event
+
+
+async def wait_closing(timeout):
+    """
+    Спит timeout секунд, но просыпается сразу, как только бот начал останавливаться
+    Returns:
+        bool: True, если бот останавливается
+    """
+    try:
+        await asyncio.wait_for(_get_closing_event().wait(), timeout)
+    except asyncio.TimeoutError:
+        pass
+    return _closing
+
+
+def _track(task, tasks):
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+def spawn(coro, name=None):
+    """
+    Запускает фоновую задачу, которую нужно дождаться при остановке бота
+    Args:
+        coro: Корутина или другой awaitable (например, Future из run_in_executor)
+        name (str): Имя задачи для отчета
+    Returns:
+        asyncio.Task: Запущенная задача
+    """
+    # У Future нет имени, а drain() называет задачи в отчете, поэтому
+    # все, что не корутина, оборачиваем в Task
+    if not asyncio.iscoroutine(coro):
+        coro = _await(coro)
+    task = asyncio.get_running_loop().create_task(coro)
+    if name:
+        task.set_name(name)
+    _track(task, _background_tasks)
+    return task
+
+
+def register_flush(name, callback):
+    """
+    Регистрирует асинхронную функцию, которая сбрасывает буферизованные записи
+    Args:
+        name (str): Имя для отчета
+        callback: Асинхронная функция без аргументов
+    """
+    _flush_hooks.append((name, callback))
+
+
+class DrainMiddleware(BaseMiddleware):
+    """Отслеживает обрабатываемые обновления и отклоняет новые после начала остановки"""
+
+    async def on_pre_process_update(self, update: types.Update, data: dict):
+        if _closing:
+            raise CancelHandler()
+        task = asyncio.current_task()
+        if task is not None and task not in _update_tasks:
+            _track(task, _update_tasks)
+
+
+def install_signal_handlers():
+    """
+    По SIGTERM/SIGINT останавливает цикл событий, после чего executor
+    вызывает on_shutdown, где и выполняется drain()
+    """
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, loop.stop)
+        except (NotImplementedError, RuntimeError):
+            # На Windows обработчики сигналов в цикле событий не поддерживаются
+            pass
+
+
+async def _wait(tasks, deadline):
+    """Ждет задачи до дедлайна, возвращает (завершенные, незавершенные)"""
+    if not tasks:
+        return set(), set()
+    timeout = max(0.0, deadline - asyncio.get_running_loop().time())
+    return await asyncio.wait(tasks, timeout=timeout)
+
+
+async def drain(dispatcher, timeout):
+    """
+    Корректная остановка бота:
+    1. прекращает прием новых обновлений;
+    2. ждет обработчики, которые уже выполняются;
+    3. ждет фоновые очереди отправки;
+    4. сбрасывает буферизованные записи в БД.
+    Сессию Telegram и хранилище FSM после этого закрывает executor.
+    Args:
+        dispatcher: Диспетчер бота
+        timeout (float): Сколько секунд всего можно ждать
+    Returns:
+        dict: Отчет о том, что удалось завершить
+    """
+    global _closing
+    _closing = True
+    _get_closing_event().set()
+    dispatcher.stop_polling()
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    report = {}
+
+    # Обработчики, которые уже выполняются
+    current = asyncio.current_task()
+    done, pending = await _wait({t for t in _update_tasks if t is not current}, deadline)
+    report["updates_drained"] = len(done)
+    report["updates_cancelled"] = len(pending)
+
+    # Фоновые задачи сами видят is_closing() и дорабатывают свои очереди
+    done, pending = await _wait(set(_background_tasks), deadline)
+    report["background_drained"] = sorted(t.get_name() for t in done)
+    report["background_cancelled"] = sorted(t.get_name() for t in pending)
+
+    # То, что не успело завершиться, отменяем и даем обработать отмену
+    leftovers = [t for t in list(_update_tasks) + list(_background_tasks) if t is not current and not t.done()]
+    for task in leftovers:
+        task.cancel()
+    if leftovers:
+        await asyncio.gather(*leftovers, return_exceptions=True)
+
+    # Сбрасываем буферы, даже если время вышло: это быстрые записи в БД
+    report["flushed"] = {}
+    for name, callback in _flush_hooks:
+        try:
+            report["flushed"][name] = await callback()
+        except Exception as e:
+            logger.error(f"Ошибка при сбросе буфера {name}: {e}")
+            report["flushed"][name] = f"error: {e}"
+
+    logger.info(f"Бот остановлен: {report}")
+    return report
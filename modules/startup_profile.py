@@ -0,0 +1,114 @@
+# startup_profile.py
+import asyncio
+import logging
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from config import STARTUP_BUDGET_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Библиотеки, которые не должны загружаться при старте (см. attendance.warm_up)
+LAZY_MODULES = ("qrcode", "PIL", "pyzbar")
+
+
+def measure_imports():
+    """
+    Замеряет импорт bot.py в чистом процессе через `python -X importtime`
+    Returns:
+        tuple: (время импорта bot.py в секундах, список (модуль, секунды) для его прямых импортов,
+               множество загруженных пакетов)
+    """
+    project_dir = Path(__file__).resolve().parent.parent
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        cwd=project_dir, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать bot.py:\n{result.stderr[-2000:]}")
+
+    children = []
+    imported = set()
+    total = 0.0
+    breakdown = []
+    for line in result.stderr.splitlines():
+        # Формат: "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        module = name.rstrip()[1:]
+        # Отступ в имени показывает глубину вложенности импорта (по два пробела)
+        depth = (len(module) - len(module.lstrip())) // 2
+        module = module.strip()
+        imported.add(module.split(".")[0])
+        seconds = int(cumulative) / 1_000_000
+
+        if depth == 1:
+            children.append((module, seconds))
+        elif depth == 0:
+            # Дочерние импорты печатаются перед родителем
+            if module == "bot":
+                total = seconds
+                breakdown = sorted(children, key=lambda item: item[1], reverse=True)
+            children = []
+
+    return total, breakdown, imported
+
+
+def measure_init():
+    """
+    Замеряет этапы инициализации, которые не требуют сети
+    Returns:
+        list: Список (этап, секунды)
+    """
+    from bot import setup_bot
+    from database.db import db
+
+    stages = []
+
+    started = time.perf_counter()
+    setup_bot()
+    stages.append(("setup_bot", time.perf_counter() - started))
+
+    started = time.perf_counter()
+    asyncio.run(db.init())
+    stages.append(("db.init", time.perf_counter() - started))
+
+    return stages
+
+
+def run_startup_profile():
+    """
+    Печатает разбивку времени холодного старта и проверяет бюджет.
+    Возвращает код выхода: 0 - в бюджете, 1 - бюджет превышен или
+    при старте загрузились библиотеки, которые должны грузиться лениво
+    """
+    import_total, breakdown, imported = measure_imports()
+    init_stages = measure_init()
+    init_total = sum(seconds for _, seconds in init_stages)
+    total = import_total + init_total
+
+    print("Импорт модулей (cumulative):")
+    for package, seconds in breakdown:
+        print(f"  {package:<36} {seconds * 1000:8.1f} ms")
+    print(f"  {'итого':<36} {import_total * 1000:8.1f} ms")
+
+    print("Инициализация:")
+    for stage, seconds in init_stages:
+        print(f"  {stage:<36} {seconds * 1000:8.1f} ms")
+    print(f"  {'итого':<36} {init_total * 1000:8.1f} ms")
+
+    print(f"Холодный старт: {total * 1000:.1f} ms (бюджет {STARTUP_BUDGET_SECONDS * 1000:.0f} ms)")
+
+    exit_code = 0
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"ОШИБКА: при старте загружены библиотеки, которые должны грузиться лениво: {', '.join(eager)}")
+        exit_code = 1
+    if total > STARTUP_BUDGET_SECONDS:
+        print("ОШИБКА: бюджет холодного старта превышен")
+        exit_code = 1
+
+    return exit_code
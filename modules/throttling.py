@@ -0,0 +1,107 @@
+# throttling.py
+import logging
+from collections import Counter
+
+from aiogram import types
+from aiogram.dispatcher.handler import CancelHandler, current_handler
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from config import (
+    THROTTLE_USER_RATE, THROTTLE_USER_BURST,
+    THROTTLE_HANDLER_RATE, THROTTLE_HANDLER_BURST,
+    THROTTLE_NOTICE_INTERVAL, THROTTLE_MAX_TRACKED_USERS
+)
+from localization.kz_text import THROTTLING_MESSAGES
+from modules import metrics
+from modules.ratelimit import BucketTable
+
+logger = logging.getLogger(__name__)
+
+
+def rate_limit(rate, burst=1):
+    """
+    Декоратор для задания собственного лимита обработчику
+    Args:
+        rate (float): Сколько вызовов в секунду разрешено в среднем
+        burst (int): Сколько вызовов подряд разрешено без ожидания
+    """
+    def decorator(handler):
+        handler.throttling_rate = rate
+        handler.throttling_burst = burst
+        return handler
+    return decorator
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Защита от флуда: ограничивает частоту обновлений от одного пользователя
+    в целом и для каждого обработчика отдельно
+    """
+
+    def __init__(self):
+        super().__init__()
+        # Общий лимит на пользователя
+        self.user_buckets = BucketTable(THROTTLE_USER_RATE, THROTTLE_USER_BURST, THROTTLE_MAX_TRACKED_USERS)
+        # Лимиты на пару (пользователь, обработчик), по таблице на каждый лимит
+        self.handler_buckets = {}
+        # Не отвечаем на каждое отклоненное сообщение, чтобы не флудить самим
+        self.notice_buckets = BucketTable(1 / THROTTLE_NOTICE_INTERVAL, 1, THROTTLE_MAX_TRACKED_USERS)
+        # Счетчики отклоненных обновлений по обработчикам
+        self.throttled = Counter()
+
+    def _get_handler_table(self, handler):
+        rate = getattr(handler, "throttling_rate", THROTTLE_HANDLER_RATE)
+        burst = getattr(handler, "throttling_burst", THROTTLE_HANDLER_BURST)
+        table = self.handler_buckets.get((rate, burst))
+        if table is None:
+            table = BucketTable(rate, burst, THROTTLE_MAX_TRACKED_USERS)
+            self.handler_buckets[(rate, burst)] = table
+        return table
+
+    def _allow(self, user_id, data):
+        """Проверяет лимиты и возвращает имя обработчика, если обновление нужно отклонить"""
+        # Для callback-запросов настоящий обработчик выбирает CallbackRouter
+        handler = data.get("callback_handler") or current_handler.get(None)
+        handler_name = handler.__name__ if handler else "unknown"
+
+        if not self.user_buckets.consume(user_id):
+            return handler_name
+
+        if handler and not self._get_handler_table(handler).consume((user_id, handler_name)):
+            return handler_name
+
+        return None
+
+    def _count(self, handler_name, update_type):
+        self.throttled[handler_name] += 1
+        metrics.inc("bot_throttled_total", handler=handler_name, type=update_type)
+
+    async def on_process_message(self, message: types.Message, data: dict):
+        handler_name = self._allow(message.from_user.id, data)
+        if handler_name is None:
+            return
+
+        self._count(handler_name, "message")
+        logger.debug(f"Сообщение от {message.from_user.id} отклонено лимитом ({handler_name})")
+        if self.notice_buckets.consume(message.from_user.id):
+            await message.answer(THROTTLING_MESSAGES["too_many_requests"])
+        raise CancelHandler()
+
+    async def on_process_callback_query(self, callback_query: types.CallbackQuery, data: dict):
+        handler_name = self._allow(callback_query.from_user.id, data)
+        if handler_name is None:
+            return
+
+        self._count(handler_name, "callback_query")
+        logger.debug(f"Callback от {callback_query.from_user.id} отклонен лимитом ({handler_name})")
+        # Ответ на callback обязателен, иначе у пользователя будут висеть часы загрузки
+        await callback_query.answer(THROTTLING_MESSAGES["too_many_requests"])
+        raise CancelHandler()
+
+    def get_stats(self):
+        """Возвращает счетчики отклоненных обновлений"""
+        return {
+            "throttled_total": sum(self.throttled.values()),
+            "throttled_by_handler": dict(self.throttled),
+            "tracked_users": len(self.user_buckets),
+        }
@@ -0,0 +1,6 @@
+# conftest.py
+import os
+import sys
+
+# Тесты импортируют модули бота из корня репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,37 @@
+# test_coalescer.py
+import asyncio
+
+import aiosqlite
+
+from database.db import db
+from modules.coalescer import Coalescer
+
+
+def test_merge_leaves_one_notification(tmp_path, monkeypatch):
+    monkeypatch.setattr(db, "db_path", str(tmp_path / "school.db"))
+
+    async def run():
+        await db.init()
+        for grade in ("5", "4"):
+            await db.enqueue_notifications(
+                [1], f"Математика: {grade}", "grade", f"📊 Математика: {grade}",
+                dedup_key=f"grade:{grade}", coalesce_window=0
+            )
+        merged = await Coalescer(window=0).merge_due()
+
+        async with aiosqlite.connect(db.db_path) as conn:
+            conn.row_factory = aiosqlite.Row
+            async with conn.execute("SELECT * FROM notification_outbox") as cursor:
+                outbox_rows = await cursor.fetchall()
+        return merged, outbox_rows, await db.get_unread_notifications(1), await db.count_unread_notifications(1)
+
+    merged, outbox_rows, notifications, unread = asyncio.run(run())
+
+    assert merged == 1
+    assert len(outbox_rows) == 1
+    assert unread == 1
+    assert len(notifications) == 1
+    assert outbox_rows[0]["notification_id"] == notifications[0]["id"]
+    assert "Математика: 5" in notifications[0]["message"]
+    assert "Математика: 4" in notifications[0]["message"]
+    assert notifications[0]["message"] in outbox_rows[0]["message"]
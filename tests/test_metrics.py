@@ -0,0 +1,70 @@
+# test_metrics.py
+import asyncio
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.contrib.fsm_storage.memory import MemoryStorage
+
+from modules import metrics
+from modules.metrics import MetricsMiddleware
+
+
+def _message_update(text):
+    return types.Update.to_object({
+        "update_id": 1,
+        "message": {
+            "message_id": 1, "date": 0, "text": text,
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "chat": {"id": 1, "type": "private"},
+        },
+    })
+
+
+def _errors(handler):
+    return sum(
+        value for (name, labels), value in metrics._counters.items()
+        if name == "bot_handler_errors_total" and ("handler", handler) in labels
+    )
+
+
+def _observations(handler):
+    return sum(
+        entry["count"] for labels, entry in metrics.snapshot("bot_handler_latency_seconds").items()
+        if ("handler", handler) in labels
+    )
+
+
+def test_handler_error_is_counted():
+    async def failing_handler(message: types.Message):
+        raise RuntimeError("сбой обработчика")
+
+    async def passing_handler(message: types.Message):
+        pass
+
+    async def run():
+        bot = Bot(token="1:test")
+        dp = Dispatcher(bot, storage=MemoryStorage())
+        Bot.set_current(bot)
+        Dispatcher.set_current(dp)
+        dp.middleware.setup(MetricsMiddleware())
+        dp.register_message_handler(failing_handler, text="fail")
+        dp.register_message_handler(passing_handler)
+
+        caught = []
+
+        async def errors_handler(update, exception):
+            caught.append(exception)
+            return True
+
+        dp.register_errors_handler(errors_handler)
+        await dp.process_update(_message_update("fail"))
+        await dp.process_update(_message_update("ok"))
+        await (await bot.get_session()).close()
+        return caught
+
+    caught = asyncio.run(run())
+
+    assert len(caught) == 1
+    assert _errors("failing_handler") == 1
+    assert _observations("failing_handler") == 1
+    assert _errors("passing_handler") == 0
+    assert _observations("passing_handler") == 1
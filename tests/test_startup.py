@@ -0,0 +1,15 @@
+# test_startup.py
+from config import STARTUP_BUDGET_SECONDS
+from modules.startup_profile import LAZY_MODULES, measure_imports
+
+
+def test_cold_start_imports():
+    import_total, breakdown, imported = measure_imports()
+
+    # Библиотеки для QR-кодов загружаются в фоне после старта (attendance.warm_up)
+    eager = [name for name in LAZY_MODULES if name in imported]
+    assert not eager, f"при импорте bot.py загружены: {', '.join(eager)}"
+    assert import_total <= STARTUP_BUDGET_SECONDS, (
+        f"импорт bot.py занял {import_total * 1000:.0f} ms при бюджете {STARTUP_BUDGET_SECONDS * 1000:.0f} ms: "
+        + ", ".join(f"{module} {seconds * 1000:.0f} ms" for module, seconds in breakdown[:5])
+    )
@@ -2,6 +2,7 @@ import asyncio
 import aiosqlite
 import sys
 from config import DATABASE_PATH
+from database.db import add_missing_columns
 
 # Устанавливаем кодировку для вывода в консоль
 sys.stdout.reconfigure(encoding='utf-8')
@@ -14,19 +15,12 @@ async def update_database():
     try:
         # Подключаемся к базе данных
         async with aiosqlite.connect(DATABASE_PATH) as db:
-            # Проверяем, есть ли столбец notification_type в таблице notifications
-            db.row_factory = aiosqlite.Row
-            async with db.execute("PRAGMA table_info(notifications)") as cursor:
-                columns = await cursor.fetchall()
-                column_names = [column['name'] for column in columns]
-                
-                if 'notification_type' not in column_names:
-                    print("Столбец notification_type отсутствует в таблице notifications. Добавляю...")
-                    await db.execute("ALTER TABLE notifications ADD COLUMN notification_type TEXT DEFAULT 'general'")
-                    await db.commit()
-                    print("Столбец notification_type успешно добавлен!")
-                else:
-                    print("Столбец notification_type уже существует в таблице notifications.")
+            # Список столбцов общий с db.init(), который выполняет те же миграции при запуске бота
+            added = await add_missing_columns(db)
+            for column in added:
+                print(f"Столбец {column} успешно добавлен!")
+            if not added:
+                print("Все столбцы уже существуют.")
             
             print("\nОбновление базы данных завершено успешно!")
             